@@ -0,0 +1,13 @@
+"""
+ASGI entry point: the async JSON endpoints (flask_app/async_api.py) in front of the Flask app.
+
+    uvicorn asgi:app --port 8000 --workers 4
+
+Needs asgiref, an ASGI server and the async driver of the database (asyncpg or aiosqlite).
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from flask_app import app as flask_app
+from flask_app.async_api import create_asgi_app
+
+app = create_asgi_app(flask_app, WsgiToAsgi(flask_app))
@@ -1,14 +1,40 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import MetaData
 
 from flask_app.config import Config
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 app.config.from_object(Config)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
 
+from flask_app.replica import RoutingSession
+# Named constraints, so migrations can alter them on SQLite too, where batch mode recreates the table.
+NAMING_CONVENTION = {
+    'ix': 'ix_%(table_name)s_%(column_0_N_name)s',
+    'uq': 'uq_%(table_name)s_%(column_0_N_name)s',
+    'ck': 'ck_%(table_name)s_%(constraint_name)s',
+    'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s',
+    'pk': 'pk_%(table_name)s',
+}
+db = SQLAlchemy(app, metadata=MetaData(naming_convention=NAMING_CONVENTION),
+                session_options={'class_': RoutingSession})
+migrate = Migrate(app, db, render_as_batch=True, compare_type=True)
+
+from flask_app import dialects
+from flask_app import owners
+from flask_app import changelog
+from flask_app import versioning
+from flask_app import live
+from flask_app import health
+from flask_app import interaction_levels
+from flask_app import search
+from flask_app import archive
+from flask_app import benchmark
+from flask_app import demo_data
+from flask_app import loadtest
+from flask_app import dedup
+from flask_app import bulk
 from flask_app.routes import main
 from flask_app.routes import api
 from flask_app.routes import events
@@ -16,4 +42,6 @@ from flask_app.routes import interactions
 from flask_app.routes import connection_types
 from flask_app.routes import relationships
 from flask_app.routes import platforms
+from flask_app.routes import analytics
+from flask_app.routes import duplicates
 from flask_app import models
\ No newline at end of file
@@ -0,0 +1,397 @@
+"""
+Date partitioning and archival of interaction history.
+
+On Postgres, interaction_history is range partitioned by month on date: one
+partition per month (interaction_history_pYYYY_MM) and
+interaction_history_default for rows of months without one. Queries that bound
+date, such as archival's month by month reads, are planned against the matching
+partitions only, and a month is removed by dropping its partition rather than
+deleting its rows. `flask maintain-interaction-partitions` creates the
+partitions of the coming INTERACTION_PARTITION_MONTHS_AHEAD months; run it from
+cron. A partitioned table's primary key must include date, so search_documents
+can't reference interactions with a foreign key there; a trigger deletes an
+interaction's search document instead.
+
+`flask archive-interactions` moves interactions older than
+INTERACTION_ARCHIVE_AFTER_DAYS, counted back to the start of a month, into
+interaction_archive: one row per relationship and month holding the
+interactions as zlib-compressed JSON. It works a month at a time, one
+transaction each, and on Postgres drops the partitions every owner's rows have
+left. Archived interactions still count in the rollups, interaction levels and
+health scores; the relationship page reads them a page at a time with
+archived_page().
+"""
+import json
+import re
+import zlib
+from datetime import datetime, UTC, timedelta
+from typing import NamedTuple
+
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, select, text, tuple_
+
+from flask_app import app, db
+from flask_app.models.models import InteractionArchive, InteractionHistory, SearchDocument
+from flask_app.owners import per_owner
+from flask_app.search import index_interactions
+
+PARTITION_PREFIX = 'interaction_history_p'
+DEFAULT_PARTITION = 'interaction_history_default'
+# Set while rows move out of the default partition, so the trigger keeps their search documents.
+MOVING_SETTING = 'app.moving_interactions'
+
+# Converts a plain interaction_history (as created by the baseline migration or create_all) to the partitioned
+# layout. Month partitions are created between _BEFORE_COPY and _COPY, so the rows are written once.
+_BEFORE_COPY = [
+    # search_documents doesn't exist yet when create_all() converts the new table.
+    "ALTER TABLE IF EXISTS search_documents "
+    "DROP CONSTRAINT IF EXISTS fk_search_documents_interaction_id_interaction_history",
+    "ALTER TABLE interaction_history RENAME TO interaction_history_unpartitioned",
+    # Owner policies would hide every row from the copy (see flask_app/owners.py).
+    "ALTER TABLE interaction_history_unpartitioned DISABLE ROW LEVEL SECURITY",
+    """CREATE TABLE interaction_history (LIKE interaction_history_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE (date)""",
+    f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF interaction_history DEFAULT",
+]
+_COPY = [
+    "INSERT INTO interaction_history SELECT * FROM interaction_history_unpartitioned",
+    # The id sequence belongs to the old table and would be dropped with it.
+    """DO $$ BEGIN
+        EXECUTE 'ALTER SEQUENCE ' || pg_get_serial_sequence('interaction_history_unpartitioned', 'id') || ' OWNED BY interaction_history.id';
+    END $$""",
+    "DROP TABLE interaction_history_unpartitioned",
+]
+_AFTER_COPY = [
+    "ALTER TABLE interaction_history ADD CONSTRAINT pk_interaction_history PRIMARY KEY (id, date)",
+    "CREATE INDEX ix_interaction_history_relationship_id_date ON interaction_history (relationship_id, date)",
+    "CREATE INDEX ix_interaction_history_owner_id_date ON interaction_history (owner_id, date)",
+    """ALTER TABLE interaction_history ADD CONSTRAINT fk_interaction_history_relationship_id_relationships
+        FOREIGN KEY (relationship_id) REFERENCES relationships (id) ON DELETE CASCADE""",
+    """ALTER TABLE interaction_history ADD CONSTRAINT fk_interaction_history_owner_id_users
+        FOREIGN KEY (owner_id) REFERENCES users (id) ON DELETE CASCADE""",
+    f"""CREATE OR REPLACE FUNCTION interaction_history_delete_search_document() RETURNS trigger AS $$
+    BEGIN
+        -- An UPDATE of date can move a row to another partition, which deletes and inserts it.
+        IF coalesce(current_setting('{MOVING_SETTING}', true), '') <> 'on'
+                AND NOT EXISTS (SELECT 1 FROM interaction_history WHERE id = OLD.id) THEN
+            DELETE FROM search_documents WHERE interaction_id = OLD.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER interaction_history_search_document AFTER DELETE ON interaction_history
+        FOR EACH ROW EXECUTE FUNCTION interaction_history_delete_search_document()""",
+]
+PARTITION_DDL = _BEFORE_COPY + _COPY + _AFTER_COPY
+
+
+class ArchivedInteraction(NamedTuple):
+    id: int
+    relationship_id: object
+    date: datetime
+    title: str
+    details: str
+    platform: str
+    type: str
+
+
+def month_start(value):
+    """Midnight UTC on the first of the month containing `value`."""
+    value = value.astimezone(UTC)
+    return datetime(value.year, value.month, 1, tzinfo=UTC)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=UTC)
+
+
+def pack(interactions):
+    """The compressed payload of an archive row."""
+    rows = [[i.id, i.date.isoformat(), i.title, i.details, i.platform, i.type] for i in interactions]
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode(), 9)
+
+
+def unpack(relationship_id, payload):
+    """The ArchivedInteractions of an archive row's payload, newest first."""
+    return [
+        ArchivedInteraction(id_, relationship_id, datetime.fromisoformat(date), title, details, platform, type_)
+        for id_, date, title, details, platform, type_ in json.loads(zlib.decompress(payload))
+    ]
+
+
+def iter_archived(*columns, criteria=(), batch_size=100):
+    """
+    Yields (interaction, *columns) for every archived interaction in the
+    archive rows matching `criteria`, decompressing batch_size rows at a time.
+    """
+    result = db.session.execute(
+        select(InteractionArchive.relationship_id, InteractionArchive.payload, *columns).where(*criteria)
+        .execution_options(yield_per=batch_size)
+    )
+    for relationship_id, payload, *values in result:
+        for interaction in unpack(relationship_id, payload):
+            yield (interaction, *values)
+
+
+def archived_page(relationship_id, before=None, page_size=None):
+    """
+    (interactions, cursor) for one page of a relationship's archived
+    interactions, newest first, starting after the page whose cursor is
+    `before`. Pages hold whole archive rows; cursor is None on the last one.
+    """
+    page_size = page_size or current_app.config.get('INTERACTION_ARCHIVE_PAGE_SIZE', 50)
+    query = select(InteractionArchive.id, InteractionArchive.period_start, InteractionArchive.interaction_count) \
+        .where(InteractionArchive.relationship_id == relationship_id) \
+        .order_by(InteractionArchive.period_start.desc(), InteractionArchive.id.desc())
+    if before:
+        period_start, _, archive_id = before.partition('~')
+        query = query.where(tuple_(InteractionArchive.period_start, InteractionArchive.id)
+                            < tuple_(datetime.fromisoformat(period_start).date(), int(archive_id)))
+    # Every row holds at least one interaction, so page_size + 1 rows are enough to fill a page and see the next.
+    heads = db.session.execute(query.limit(page_size + 1)).all()
+    taken, count = [], 0
+    for head in heads:
+        if count >= page_size:
+            break
+        taken.append(head)
+        count += head.interaction_count
+    payloads = dict(db.session.execute(
+        select(InteractionArchive.id, InteractionArchive.payload)
+        .where(InteractionArchive.id.in_([head.id for head in taken]))
+    ).all()) if taken else {}
+    interactions = sorted(
+        (interaction for head in taken for interaction in unpack(relationship_id, payloads[head.id])),
+        key=lambda interaction: (interaction.date, interaction.id), reverse=True
+    )
+    cursor = f"{taken[-1].period_start.isoformat()}~{taken[-1].id}" if len(taken) < len(heads) else None
+    return interactions, cursor
+
+
+# --- Postgres partitions ---
+
+def is_partitioned(connection):
+    return connection.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('interaction_history'))"
+    ))
+
+
+def _partition_month(name):
+    match = re.fullmatch(rf'{PARTITION_PREFIX}(\d{{4}})_(\d{{2}})', name)
+    return datetime(int(match[1]), int(match[2]), 1, tzinfo=UTC) if match else None
+
+
+def partitions(connection):
+    """{partition name: month start, or None for the default partition}."""
+    names = connection.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'interaction_history'::regclass"
+    ))
+    return {name: _partition_month(name) for name in names}
+
+
+def create_partition(connection, month):
+    """
+    Creates the partition of `month`, moving its rows out of the default
+    partition first, since ATTACH fails while the default holds any.
+    """
+    name = f'{PARTITION_PREFIX}{month:%Y_%m}'
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    connection.exec_driver_sql(
+        f'CREATE TABLE "{name}" (LIKE interaction_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    )
+    connection.execute(select(func.set_config(MOVING_SETTING, 'on', True)))
+    connection.exec_driver_sql(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= '{start}' AND date < '{end}' RETURNING *) "
+        f'INSERT INTO "{name}" SELECT * FROM moved'
+    )
+    connection.execute(select(func.set_config(MOVING_SETTING, 'off', True)))
+    connection.exec_driver_sql(
+        f"ALTER TABLE interaction_history ATTACH PARTITION \"{name}\" FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+    return name
+
+
+def ensure_partitions(connection, now=None, months_ahead=None):
+    """
+    Creates the missing partitions from the month of the oldest row in the
+    default partition up to months_ahead months from now. Returns their names.
+    """
+    if months_ahead is None:
+        months_ahead = current_app.config.get('INTERACTION_PARTITION_MONTHS_AHEAD', 3)
+    current = month_start(now or datetime.now(UTC))
+    oldest = connection.scalar(text(f"SELECT min(date) FROM {DEFAULT_PARTITION}"))
+    month = min(current, month_start(oldest)) if oldest is not None else current
+    existing = set(partitions(connection).values())
+    created = []
+    while month <= add_months(current, months_ahead):
+        if month not in existing:
+            created.append(create_partition(connection, month))
+        month = add_months(month, 1)
+    return created
+
+
+def drop_empty_partitions(connection, before):
+    """Drops the month partitions ending by `before` that hold no rows. Returns their names."""
+    dropped = []
+    for name, month in sorted(partitions(connection).items()):
+        if month is None or add_months(month, 1) > before:
+            continue
+        if connection.scalar(text(f'SELECT NOT EXISTS (SELECT 1 FROM "{name}")')):
+            connection.exec_driver_sql(f'DROP TABLE "{name}"')
+            dropped.append(name)
+    return dropped
+
+
+def partition_interaction_history(connection, now=None, months_ahead=3):
+    """
+    Converts a plain interaction_history to the partitioned layout, with a
+    partition for every month from its oldest row to months_ahead months from
+    now. Does nothing (and returns False) if it is partitioned already.
+    """
+    if is_partitioned(connection):
+        return False
+    row_level_security = connection.scalar(text(
+        "SELECT relrowsecurity FROM pg_class WHERE oid = 'interaction_history'::regclass"
+    ))
+    for statement in _BEFORE_COPY:
+        connection.exec_driver_sql(statement)
+    now = now or datetime.now(UTC)
+    oldest = connection.scalar(text("SELECT min(date) FROM interaction_history_unpartitioned"))
+    month, last = month_start(oldest or now), add_months(month_start(now), months_ahead)
+    while month <= last:
+        create_partition(connection, month)
+        month = add_months(month, 1)
+    for statement in _COPY + _AFTER_COPY:
+        connection.exec_driver_sql(statement)
+    if row_level_security:
+        print("interaction_history was recreated; run `flask enable-row-level-security` again.")
+    return True
+
+
+def _partition_after_create(target, connection, **kw):
+    if connection.dialect.name == 'postgresql':
+        partition_interaction_history(connection)
+
+
+event.listen(InteractionHistory.__table__, 'after_create', _partition_after_create)
+
+
+def maintain_interaction_partitions_logic(now=None):
+    """Creates the coming months' partitions and drops emptied old ones (Postgres only)."""
+    if db.engine.dialect.name != 'postgresql':
+        print("interaction_history is only partitioned on Postgres; nothing to do.")
+        return
+    with db.engine.begin() as connection:
+        if partition_interaction_history(connection, now):
+            print("  Partitioned interaction_history")
+        for name in ensure_partitions(connection, now):
+            print(f"  Created {name}")
+        for name in drop_empty_partitions(connection, archive_cutoff(now)):
+            print(f"  Dropped {name}")
+
+
+@app.cli.command("maintain-interaction-partitions")
+def maintain_interaction_partitions_command():
+    """CLI wrapper for the partition maintenance."""
+    maintain_interaction_partitions_logic()
+
+
+# --- Archival ---
+
+def archive_cutoff(now=None):
+    """
+    Interactions dated before this are archived: INTERACTION_ARCHIVE_AFTER_DAYS
+    back, but never inside the interaction level windows, and on a month start.
+    """
+    config = current_app.config
+    days = max(config.get('INTERACTION_ARCHIVE_AFTER_DAYS', 730), config.get('INTERACTION_LEVEL_NEW_DAYS', 30),
+               config.get('INTERACTION_LEVEL_ACTIVE_DAYS', 90))
+    return month_start((now or datetime.now(UTC)) - timedelta(days=days))
+
+
+def _archive_month(start, end):
+    """Moves the current owner's interactions dated in [start, end) to the archive. Returns how many."""
+    in_month = (InteractionHistory.date >= start, InteractionHistory.date < end)
+    rows = db.session.execute(
+        select(InteractionHistory.relationship_id, InteractionHistory.id, InteractionHistory.date,
+               InteractionHistory.title, InteractionHistory.details, InteractionHistory.platform,
+               InteractionHistory.type)
+        .where(*in_month)
+        .order_by(InteractionHistory.relationship_id, InteractionHistory.date.desc(), InteractionHistory.id.desc())
+    ).all()
+    if not rows:
+        return 0
+    by_relationship = {}
+    for relationship_id, id_, date, title, details, platform, type_ in rows:
+        by_relationship.setdefault(relationship_id, []).append(
+            ArchivedInteraction(id_, relationship_id, date, title, details, platform, type_)
+        )
+    db.session.execute(insert(InteractionArchive), [
+        {'relationship_id': relationship_id, 'period_start': start.date(), 'first_date': interactions[-1].date,
+         'last_date': interactions[0].date, 'interaction_count': len(interactions), 'payload': pack(interactions)}
+        for relationship_id, interactions in by_relationship.items()
+    ])
+    # Partition drops don't fire the search document trigger, so the documents go first.
+    month_ids = select(InteractionHistory.id).where(*in_month)
+    db.session.execute(delete(SearchDocument).where(SearchDocument.interaction_id.in_(month_ids)))
+    db.session.execute(delete(InteractionHistory).where(*in_month).execution_options(synchronize_session=False))
+    return len(rows)
+
+
+def archive_interactions_logic(now=None):
+    """Archives the current owner's interactions older than archive_cutoff(). Returns how many."""
+    cutoff = archive_cutoff(now)
+    print(f"Archiving interactions dated before {cutoff:%Y-%m-%d}...")
+    oldest_before = select(func.min(InteractionHistory.date)).where(InteractionHistory.date < cutoff)
+    archived = 0
+    # Month by month from the oldest, skipping empty months.
+    while (oldest := db.session.scalar(oldest_before)) is not None:
+        month = month_start(oldest)
+        count = _archive_month(month, add_months(month, 1))
+        db.session.commit()
+        print(f"  {month:%Y-%m}: {count} interaction(s)")
+        archived += count
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as connection:
+            for name in drop_empty_partitions(connection, cutoff):
+                print(f"  Dropped {name}")
+    print(f"Archival complete: {archived} interaction(s) archived.")
+    return archived
+
+
+def restore_archived_interactions_logic():
+    """Moves all of the current owner's archived interactions back into interaction_history. Returns how many."""
+    print("Restoring archived interactions...")
+    restored = 0
+    while True:
+        archive_ids = db.session.scalars(select(InteractionArchive.id).order_by(InteractionArchive.id).limit(100)).all()
+        if not archive_ids:
+            break
+        criteria = [InteractionArchive.id.in_(archive_ids)]
+        rows = [
+            {'id': i.id, 'relationship_id': i.relationship_id, 'date': i.date, 'title': i.title,
+             'details': i.details, 'platform': i.platform, 'type': i.type}
+            for i, in iter_archived(criteria=criteria)
+        ]
+        db.session.execute(insert(InteractionHistory), rows)
+        db.session.execute(delete(InteractionArchive).where(*criteria))
+        index_interactions([row['id'] for row in rows])
+        db.session.commit()
+        restored += len(rows)
+    print(f"Restore complete: {restored} interaction(s) restored.")
+    return restored
+
+
+@app.cli.command("archive-interactions")
+@per_owner
+def archive_interactions_command():
+    """CLI wrapper for the interaction archival."""
+    archive_interactions_logic()
+
+
+@app.cli.command("restore-archived-interactions")
+@per_owner
+def restore_archived_interactions_command():
+    """CLI wrapper for moving archived interactions back, e.g. before downgrading."""
+    restore_archived_interactions_logic()
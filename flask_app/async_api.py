@@ -0,0 +1,185 @@
+"""
+Async serving path for the read-only JSON endpoints that the participant picker,
+tag pickers and calendar call several times per page.
+
+create_asgi_app() wraps the Flask app. The paths in ROUTES are answered by
+coroutines on an async engine (asyncpg on Postgres, aiosqlite on SQLite) with
+its own connection pool, so a request waiting on the database no longer holds
+a worker. Every other path goes to Flask. The handlers run the same statements
+as the sync views (see flask_app/read_models.py) and answer with the same
+ETags and bodies, so a client can be served by either path. Requests act for
+the owner named by OWNER_HEADER, as in flask_app/owners.py, and every
+statement is scoped to them. See asgi.py for the entry point and
+flask_app/benchmark.py for the comparison with the sync views.
+"""
+from urllib.parse import parse_qs
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.http import parse_etags
+
+from flask_app.dialects import configure_sqlite_connection
+from flask_app.models.models import DataVersion, Event, User
+from flask_app.owners import scoped
+from flask_app.read_models import (
+    EventCard, calendar_event, event_cards_statement, popular_tags, recent_tags, relationship_search
+)
+from flask_app.versioning import etag_for, read_stamp, stamp_path
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_url(url):
+    """`url` with its driver swapped for the async driver of the same backend."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+async def _recent_tags(connection, args, url_for):
+    return [{'name': name} for name in (await connection.execute(recent_tags())).scalars()]
+
+
+async def _popular_tags(connection, args, url_for):
+    return [{'name': name} for name in (await connection.execute(popular_tags())).scalars()]
+
+
+async def _search_relationships(connection, args, url_for):
+    rows = await connection.execute(relationship_search(
+        search_term=args.get('q'), priority=args.get('priority'), tag_id=args.get('tag_id'),
+        ctype_id=args.get('ctype_id')
+    ))
+    return [{'id': str(rel.id), 'name': rel.name} for rel in rows]
+
+
+async def _calendar_events(connection, args, url_for):
+    rows = await connection.execute(event_cards_statement(order_by=Event.id))
+    return [calendar_event(event, url_for('get_event', event_id=event.id)) for event in map(EventCard._make, rows)]
+
+
+# path -> (data version kinds, handler); the kinds match the sync views' conditional_get.
+ROUTES = {
+    '/api/tags/recent': (('tags',), _recent_tags),
+    '/api/tags/popular': (('tags',), _popular_tags),
+    '/api/relationships/search': (('relationships', 'events'), _search_relationships),
+    '/api/calendar-events': (('events',), _calendar_events),
+}
+
+
+class _OwnerConnection:
+    """An AsyncConnection whose execute() scopes every statement to one owner."""
+
+    def __init__(self, connection, owner_id):
+        self._connection = connection
+        self._owner_id = owner_id
+
+    async def execute(self, statement):
+        return await self._connection.execute(scoped(statement, self._owner_id))
+
+
+class AsyncAPI:
+    """ASGI app answering ROUTES itself and passing everything else to `fallback`."""
+
+    def __init__(self, flask_app, fallback):
+        self.flask_app = flask_app
+        self.fallback = fallback
+        self.engine = None
+        self._versions = (None, {})  # (stamp, {owner id: versions}), as in flask_app/versioning.py
+        self._owner_ids = {}  # user name -> id
+        with flask_app.app_context():
+            self._stamp_path = stamp_path()
+            # As Flask-SQLAlchemy resolved it: relative SQLite paths are inside the instance folder.
+            self._database_url = flask_app.extensions['sqlalchemy'].engine.url
+
+    def _engine(self):
+        if self.engine is None:
+            config = self.flask_app.config
+            url = config.get('ASYNC_DATABASE_URI') or async_database_url(self._database_url)
+            options = {}
+            sqlite = make_url(url).get_backend_name() == 'sqlite'
+            if not sqlite:
+                options = {'pool_size': config.get('ASYNC_POOL_SIZE', 10),
+                           'max_overflow': config.get('ASYNC_MAX_OVERFLOW', 10)}
+            self.engine = create_async_engine(url, pool_pre_ping=True, **options)
+            if sqlite:
+                event.listen(self.engine.sync_engine, 'connect', configure_sqlite_connection)
+        return self.engine
+
+    async def owner_id(self, headers):
+        """The id of the request's owner, or None when the request names no known user."""
+        config = self.flask_app.config
+        header = config.get('OWNER_HEADER')
+        name = headers.get(header.lower().encode(), b'').decode('latin-1').strip() if header \
+            else config.get('DEFAULT_OWNER', 'default')
+        if name and name not in self._owner_ids:
+            # Users are only created by the Flask side (see owners.owner_id_for); unknown ones go there.
+            async with self._engine().connect() as connection:
+                owner_id = await connection.scalar(select(User.id).where(User.name == name))
+            if owner_id is None:
+                return None
+            self._owner_ids[name] = owner_id
+        return self._owner_ids.get(name)
+
+    async def current_versions(self, owner_id):
+        """{kind: version} of `owner_id`, read from the database only when the stamp file has changed."""
+        stamp = read_stamp(self._stamp_path)  # One stat() call; cheaper inline than on a thread.
+        cached_stamp, by_owner = self._versions
+        versions = by_owner.get(owner_id) if stamp is not None and stamp == cached_stamp else None
+        if versions is None:
+            async with self._engine().connect() as connection:
+                versions = dict((await connection.execute(
+                    select(DataVersion.kind, DataVersion.version).where(DataVersion.owner_id == owner_id)
+                )).all())
+            if stamp is not None:
+                self._versions = (stamp, {**(by_owner if stamp == cached_stamp else {}), owner_id: versions})
+        return versions
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        route = ROUTES.get(scope['path']) if scope['type'] == 'http' else None
+        if route is None or scope['method'] not in ('GET', 'HEAD'):
+            return await self.fallback(scope, receive, send)
+
+        kinds, handler = route
+        query_string = scope['query_string'].decode()
+        headers = dict(scope['headers'])
+        owner_id = await self.owner_id(headers)
+        if owner_id is None:
+            return await self.fallback(scope, receive, send)
+        etag = etag_for(f"{scope['path']}?{query_string}", owner_id, await self.current_versions(owner_id), kinds)
+        if parse_etags(headers.get(b'if-none-match', b'').decode('latin-1')).contains_weak(etag):
+            return await self._respond(send, 304, etag)
+
+        args = {key: values[0] for key, values in parse_qs(query_string, keep_blank_values=True).items()}
+        adapter = self.flask_app.url_map.bind('localhost', script_name=scope.get('root_path') or '/')
+        async with self._engine().connect() as connection:
+            payload = await handler(_OwnerConnection(connection, owner_id), args,
+                                    lambda endpoint, **values: adapter.build(endpoint, values))
+        body = (self.flask_app.json.dumps(payload, separators=(',', ':')) + '\n').encode()
+        await self._respond(send, 200, etag, body if scope['method'] == 'GET' else b'', len(body))
+
+    @staticmethod
+    async def _respond(send, status, etag, body=b'', length=0):
+        headers = [(b'etag', f'W/"{etag}"'.encode()), (b'cache-control', b'no-cache')]
+        if status == 200:
+            headers += [(b'content-type', b'application/json'), (b'content-length', str(length).encode())]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._engine()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(flask_app, fallback):
+    """The async endpoints mounted in front of `fallback`, the Flask app wrapped for ASGI."""
+    return AsyncAPI(flask_app, fallback)
@@ -0,0 +1,83 @@
+"""
+Throughput benchmark of the JSON endpoints: sync Flask views against the async path.
+
+Start both servers against the same database, for example
+
+    gunicorn -w 4 -b :5001 run:app
+    uvicorn asgi:app --port 8000 --workers 4
+
+then run `flask benchmark-api --sync-url http://localhost:5001 --async-url http://localhost:8000`.
+Every request is a cold one (no If-None-Match), so each of them runs its queries.
+"""
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import urlopen
+
+import click
+
+from flask_app import app
+
+DEFAULT_PATHS = ('/api/relationships/search', '/api/relationships/search?priority=High', '/api/calendar-events',
+                 '/api/tags/recent', '/api/tags/popular')
+
+
+def _timed_get(url):
+    started = time.perf_counter()
+    try:
+        with urlopen(url, timeout=30) as response:
+            response.read()
+            ok = response.status == 200
+    except (URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def run_benchmark(base_url, paths, requests, concurrency):
+    """Sends `requests` GETs cycling through `paths`, `concurrency` at a time. Returns the statistics."""
+    urls = [base_url.rstrip('/') + paths[i % len(paths)] for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_timed_get, urls))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests_per_second': len(results) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'errors': sum(1 for _, ok in results if not ok),
+    }
+
+
+def benchmark_api_logic(targets, paths, requests, concurrency):
+    print(f"Benchmarking {len(paths)} endpoint(s): {requests} requests per target, {concurrency} concurrent...")
+    results = {}
+    for name, base_url in targets:
+        run_benchmark(base_url, paths, min(requests, concurrency * 2), concurrency)  # Warm up pools and caches.
+        results[name] = stats = run_benchmark(base_url, paths, requests, concurrency)
+        print(f"  {name:<6} {stats['requests_per_second']:>9.1f} req/s   p50 {stats['p50_ms']:>7.1f} ms   "
+              f"p95 {stats['p95_ms']:>7.1f} ms   {stats['errors']} error(s)")
+    print("Benchmark complete.")
+    return results
+
+
+@app.cli.command("benchmark-api")
+@click.option('--sync-url', help="Base URL of the Flask (WSGI) server.")
+@click.option('--async-url', help="Base URL of the ASGI server (asgi.py).")
+@click.option('--path', 'paths', multiple=True, help="Endpoint to request, repeatable. Defaults to all async ones.")
+@click.option('--requests', default=2000, show_default=True)
+@click.option('--concurrency', default=50, show_default=True)
+def benchmark_api_command(sync_url, async_url, paths, requests, concurrency):
+    """CLI wrapper for the sync vs async API benchmark."""
+    # The async path is optional (it needs greenlet and an async driver), so the app doesn't import it.
+    from flask_app.async_api import ROUTES
+
+    targets = [(name, url) for name, url in (('sync', sync_url), ('async', async_url)) if url]
+    if not targets:
+        raise click.UsageError("Give --sync-url, --async-url or both.")
+    paths = paths or DEFAULT_PATHS
+    unknown = [path for path in paths if path.split('?')[0] not in ROUTES]
+    if unknown:
+        raise click.UsageError(f"Not served by the async path: {', '.join(unknown)}")
+    benchmark_api_logic(targets, list(paths), requests, concurrency)
@@ -0,0 +1,454 @@
+"""
+Set-based operations over many relationships at once.
+
+A selection is a SELECT of relationship ids built by relationship_filter();
+every statement works on it inside the database, so nothing is loaded into
+the session per relationship. Derived values (platform, connection type and
+tag ratings, event importance, interaction rollups) are adjusted by the
+contribution of the affected relationships instead of being recomputed.
+"""
+import uuid
+from collections import Counter
+from datetime import datetime, UTC
+
+import click
+from flask import current_app
+from sqlalchemy import (
+    Column, MetaData, Table, Uuid, bindparam, case, delete, exists, false, func, insert, literal, select, update
+)
+
+from flask_app import app, db
+from flask_app.interaction_levels import classify_interaction_levels
+from flask_app.live import LIVE_ROWS
+from flask_app.owners import per_owner
+from flask_app.models.models import (
+    Relationship, SocialMedia, Tag, Platform, ConnectionType, Event, InteractionHistory, FollowUp,
+    RelationshipConnectionType, RelationshipTag, RelationshipEdit, UTCDateTime, event_participants,
+    priority_level_enum, interaction_level_enum, interaction_type_enum
+)
+from flask_app.rollups import add_interaction_delta, apply_rollup_deltas, move_relationships_priority, \
+    uncount_relationships
+from flask_app.routes.main import _automated_follow_up_values, _priority_score
+from flask_app.search import index_interactions
+
+FILTER_KEYS = ('ids', 'q', 'priority', 'interaction_level', 'tag', 'tag_id', 'connection_type_id')
+PATCH_KEYS = ('priority', 'interaction_level', 'follow_up_frequency', 'add_tags', 'remove_tags',
+              'add_connection_types', 'remove_connection_types')
+
+# Per-connection snapshot of a selection, so statements that change what a filter matches
+# (e.g. "priority=Low -> High") keep working on the same rows.
+_selection_table = Table(
+    'bulk_selection', MetaData(), Column('id', Uuid(as_uuid=True), primary_key=True), prefixes=['TEMPORARY']
+)
+
+# (rated model, association model, association column pointing at the rated model)
+RATED_ASSOCIATIONS = (
+    (Platform, SocialMedia, SocialMedia.platform_id),
+    (ConnectionType, RelationshipConnectionType, RelationshipConnectionType.connection_type_id),
+    (Tag, RelationshipTag, RelationshipTag.tag_id),
+)
+
+
+def relationship_filter(criteria):
+    """
+    A SELECT of the ids of the relationships matching every given criterion:
+    ids, q (name contains), priority, interaction_level, tag (name), tag_id,
+    connection_type_id. Raises ValueError for unknown or missing criteria.
+    """
+    unknown = set(criteria) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}.")
+    if not any(criteria.get(key) for key in FILTER_KEYS):
+        raise ValueError("Give a list of ids or at least one filter.")
+
+    selection = select(Relationship.id)
+    if criteria.get('ids'):
+        try:
+            ids = [uuid.UUID(str(rel_id)) for rel_id in criteria['ids']]
+        except ValueError:
+            raise ValueError("ids must be relationship UUIDs.")
+        selection = selection.where(Relationship.id.in_(ids))
+    if criteria.get('q'):
+        selection = selection.where(Relationship.name.ilike(f"%{criteria['q']}%"))
+    if criteria.get('priority'):
+        selection = selection.where(Relationship.priority == criteria['priority'])
+    if criteria.get('interaction_level'):
+        selection = selection.where(Relationship.interaction_level == criteria['interaction_level'])
+    if criteria.get('tag'):
+        selection = selection.where(Relationship.id.in_(
+            select(RelationshipTag.relationship_id).join(Tag).where(Tag.name == criteria['tag'].strip().lower())
+        ))
+    if criteria.get('tag_id'):
+        selection = selection.where(Relationship.id.in_(
+            select(RelationshipTag.relationship_id).where(RelationshipTag.tag_id == int(criteria['tag_id']))
+        ))
+    if criteria.get('connection_type_id'):
+        selection = selection.where(Relationship.id.in_(
+            select(RelationshipConnectionType.relationship_id)
+            .where(RelationshipConnectionType.connection_type_id == int(criteria['connection_type_id']))
+        ))
+    return selection
+
+
+def rating_contributions(selection):
+    """{model: {item_id: score}}: what the selected relationships add to each platform/connection type/tag rating."""
+    multiplier = current_app.config.get('PRIMARY_ITEM_MULTIPLIER', 1.5)
+    contributions = {}
+    for model, association, item_column in RATED_ASSOCIATIONS:
+        weight = case((association.is_primary, multiplier), else_=1.0)
+        contributions[model] = dict(db.session.execute(
+            select(item_column, func.sum(_priority_score(Relationship.priority) * weight))
+            .join(Relationship, Relationship.id == association.relationship_id)
+            .where(association.relationship_id.in_(selection))
+            .group_by(item_column)
+        ).all())
+    return contributions
+
+
+def importance_contributions(selection):
+    """{event_id: score}: what the selected relationships add to each event's importance."""
+    return dict(db.session.execute(
+        select(event_participants.c.event_id, func.sum(_priority_score(Relationship.priority)))
+        .join(Relationship, Relationship.id == event_participants.c.relationship_id)
+        .where(event_participants.c.relationship_id.in_(selection))
+        .group_by(event_participants.c.event_id)
+    ).all())
+
+
+def _add_to_column(table, column, deltas, sign):
+    rows = [{'item_id': item_id, 'delta': sign * delta} for item_id, delta in deltas.items() if delta]
+    if rows:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('item_id'))
+            .values({column: table.c[column] + bindparam('delta')}),
+            rows
+        )
+
+
+def apply_rating_contributions(contributions, sign=1):
+    """Adds (sign=1) or subtracts (sign=-1) rating contributions with one executemany UPDATE per model."""
+    for model, deltas in contributions.items():
+        _add_to_column(model.__table__, 'priority_rating', deltas, sign)
+
+
+def apply_importance_contributions(contributions, sign=1):
+    _add_to_column(Event.__table__, 'importance_score', contributions, sign)
+
+
+def count_relationships(selection):
+    return db.session.execute(select(func.count()).select_from(selection.subquery())).scalar()
+
+
+def delete_relationships(selection):
+    """
+    Deletes the selected relationships. Their interactions, follow-ups, tags,
+    connection types, accounts and event participation go with them through
+    ON DELETE CASCADE. Does not commit. Returns the number deleted.
+    """
+    uncount_relationships(selection)
+    ratings = rating_contributions(selection)
+    importance = importance_contributions(selection)
+    result = db.session.execute(
+        delete(Relationship).where(Relationship.id.in_(selection)).execution_options(synchronize_session=False)
+    )
+    apply_rating_contributions(ratings, sign=-1)
+    apply_importance_contributions(importance, sign=-1)
+    # Loaded instances (and their collections) may belong to deleted rows.
+    db.session.expire_all()
+    return result.rowcount
+
+
+def snapshot_selection(selection):
+    """Copies the ids of `selection` into a temporary table and returns a SELECT over the copy."""
+    connection = db.session.connection()
+    _selection_table.drop(connection, checkfirst=True)
+    _selection_table.create(connection)
+    db.session.execute(insert(_selection_table).from_select(['id'], selection))
+    return select(_selection_table.c.id)
+
+
+def drop_selection_snapshot():
+    _selection_table.drop(db.session.connection(), checkfirst=True)
+
+
+# What each patch field edits, as recorded for the timeline. interaction_level is derived, so it isn't an edit.
+_EDITED_FIELDS = {
+    'priority': 'priority',
+    'follow_up_frequency': 'follow_up_frequency',
+    'add_tags': 'tags',
+    'remove_tags': 'tags',
+    'add_connection_types': 'connection_types',
+    'remove_connection_types': 'connection_types',
+}
+
+
+def _validate_patch(patch):
+    unknown = set(patch) - set(PATCH_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown patch field(s): {', '.join(sorted(unknown))}.")
+    if not any(key in patch for key in PATCH_KEYS):
+        raise ValueError("The patch is empty.")
+    if 'priority' in patch and patch['priority'] not in priority_level_enum.enums:
+        raise ValueError(f"priority must be one of {', '.join(priority_level_enum.enums)}.")
+    if 'interaction_level' in patch and patch['interaction_level'] not in interaction_level_enum.enums:
+        raise ValueError(f"interaction_level must be one of {', '.join(interaction_level_enum.enums)}.")
+    for key in ('add_tags', 'remove_tags'):
+        names = patch.get(key)
+        if names and not isinstance(names, str) and not (
+                isinstance(names, list) and all(isinstance(name, str) for name in names)):
+            raise ValueError(f"{key} must be a comma-separated string or a list of tag names.")
+    frequencies = current_app.config.get('FOLLOW_UP_INTERVAL_DAYS', {})
+    if patch.get('follow_up_frequency') and patch['follow_up_frequency'] not in frequencies:
+        raise ValueError(f"follow_up_frequency must be empty or one of {', '.join(frequencies)}.")
+
+
+def _tag_ids(names, create=False):
+    """{name: id} for the given tag names (a list or a comma-separated string), creating missing tags if asked."""
+    if isinstance(names, str):
+        names = names.split(',')
+    names = {name.strip().lower() for name in names if name and name.strip()}
+    found = dict(db.session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+    if create and names - set(found):
+        db.session.execute(insert(Tag), [{'name': name} for name in sorted(names - set(found))])
+        found = dict(db.session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+    return found
+
+
+def _connection_type_ids(ids):
+    ids = {int(ctype_id) for ctype_id in ids}
+    found = set(db.session.execute(select(ConnectionType.id).where(ConnectionType.id.in_(ids))).scalars())
+    if ids - found:
+        raise ValueError(f"Unknown connection type id(s): {', '.join(map(str, sorted(ids - found)))}.")
+    return found
+
+
+def _link(association, item_column, selection, item_ids):
+    """Links every selected relationship to every item with one INSERT...SELECT, skipping existing links."""
+    if not item_ids:
+        return
+    table = association.__table__
+    selected = selection.subquery()
+    item_table = next(iter(item_column.foreign_keys)).column.table
+    already_linked = exists().where(
+        association.relationship_id == selected.c.id, getattr(association, item_column.key) == item_table.c.id
+    )
+    db.session.execute(insert(table).from_select(
+        ['relationship_id', item_column.key, 'is_primary'],
+        select(selected.c.id, item_table.c.id, false()).select_from(selected)
+        .join(item_table, item_table.c.id.in_(item_ids))
+        .where(~already_linked)
+    ))
+
+
+def _unlink(association, item_column, selection, item_ids):
+    if not item_ids:
+        return
+    db.session.execute(delete(association).where(
+        association.relationship_id.in_(selection), item_column.in_(item_ids)
+    ).execution_options(synchronize_session=False))
+
+
+def _difference(after, before):
+    difference = Counter(after)
+    difference.subtract(before)
+    return dict(difference)
+
+
+def bulk_edit_relationships(selection, patch):
+    """
+    Applies `patch` to every selected relationship: set priority,
+    interaction_level or follow_up_frequency; add_tags/remove_tags (names);
+    add_connection_types/remove_connection_types (ids). Every change is one
+    set-based statement, followed by one delta update of the derived ratings
+    and event importance. Does not commit. Returns (the number of relationships,
+    the ids of the tags added to them).
+    """
+    _validate_patch(patch)
+    selection = snapshot_selection(selection)
+    try:
+        matched = count_relationships(selection)
+        if not matched:
+            return 0, []
+        ratings_before = rating_contributions(selection)
+        importance_before = importance_contributions(selection)
+        now = datetime.now(UTC)
+
+        values = {key: patch[key] or None for key in ('priority', 'interaction_level', 'follow_up_frequency')
+                  if key in patch}
+        if values:
+            if 'priority' in values:
+                move_relationships_priority(selection, values['priority'])
+            db.session.execute(
+                update(Relationship).where(Relationship.id.in_(selection)).values(**values, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+
+        added_tags = _tag_ids(patch.get('add_tags') or [], create=True)
+        _unlink(RelationshipTag, RelationshipTag.tag_id, selection,
+                set(_tag_ids(patch.get('remove_tags') or []).values()) - set(added_tags.values()))
+        _link(RelationshipTag, RelationshipTag.tag_id, selection, set(added_tags.values()))
+        if added_tags:
+            db.session.execute(update(Tag).where(Tag.id.in_(added_tags.values())).values(last_used_at=now)
+                               .execution_options(synchronize_session=False))
+
+        added_ctypes = _connection_type_ids(patch.get('add_connection_types') or [])
+        _unlink(RelationshipConnectionType, RelationshipConnectionType.connection_type_id, selection,
+                _connection_type_ids(patch.get('remove_connection_types') or []) - added_ctypes)
+        _link(RelationshipConnectionType, RelationshipConnectionType.connection_type_id, selection, added_ctypes)
+
+        edited = list(dict.fromkeys(_EDITED_FIELDS[key] for key in _EDITED_FIELDS if key in patch))
+        if edited:
+            selected = selection.subquery()
+            db.session.execute(insert(RelationshipEdit.__table__).from_select(
+                ['relationship_id', 'edited_at', 'fields'],
+                select(selected.c.id, literal(now, UTCDateTime()), literal(', '.join(edited)))
+            ))
+
+        ratings_after = rating_contributions(selection)
+        apply_rating_contributions({model: _difference(ratings_after[model], ratings_before[model])
+                                    for model in ratings_after})
+        apply_importance_contributions(_difference(importance_contributions(selection), importance_before))
+    finally:
+        drop_selection_snapshot()
+    db.session.expire_all()
+    return matched, sorted(added_tags.values())
+
+
+def event_participant_selection(event_id):
+    return select(event_participants.c.relationship_id).where(event_participants.c.event_id == event_id)
+
+
+def sync_event_participants(event_id, participant_ids):
+    """
+    Makes the event's participants exactly `participant_ids` by deleting the
+    removed rows and inserting the added ones; unchanged rows are not touched.
+    Unknown ids are ignored. Returns (added, removed).
+    """
+    try:
+        wanted = {uuid.UUID(str(rel_id)) for rel_id in participant_ids if rel_id}
+    except ValueError:
+        raise ValueError("Participants must be relationship UUIDs.")
+    current = set(db.session.scalars(event_participant_selection(event_id)))
+
+    removed = current - wanted
+    if removed:
+        db.session.execute(delete(event_participants).where(
+            event_participants.c.event_id == event_id, event_participants.c.relationship_id.in_(removed)
+        ).execution_options(**{LIVE_ROWS: ('event', [event_id], ['participants'])}))
+    added = 0
+    if wanted - current:
+        added = db.session.execute(insert(event_participants).from_select(
+            ['event_id', 'relationship_id'],
+            select(literal(event_id, type_=event_participants.c.event_id.type), Relationship.id)
+            .where(Relationship.id.in_(wanted - current))
+        ).execution_options(**{LIVE_ROWS: ('event', [event_id], ['participants'])})).rowcount
+    return added, len(removed)
+
+
+def add_participants_by_rule(event_id, criteria):
+    """
+    Adds every relationship matching the relationship_filter() criteria to the
+    event with one INSERT ... SELECT, skipping current participants. Returns the number added.
+    """
+    return db.session.execute(insert(event_participants).from_select(
+        ['event_id', 'relationship_id'],
+        select(literal(event_id, type_=event_participants.c.event_id.type), Relationship.id).where(
+            Relationship.id.in_(relationship_filter(criteria)),
+            Relationship.id.not_in(event_participant_selection(event_id))
+        )
+    ).execution_options(**{LIVE_ROWS: ('event', [event_id], ['participants'])})).rowcount
+
+
+def log_interactions(selection, title, type_, platform=None, details=None, complete_follow_ups=False, now=None):
+    """
+    Logs the same interaction for every selected relationship: one executemany
+    INSERT (and its search documents), one UPDATE of last_contacted and, if asked, one UPDATE completing
+    each person's nearest pending follow-up plus one INSERT of the next
+    automated follow-ups. Interaction levels are reclassified afterwards.
+    Does not commit. Returns a summary of the counts.
+    """
+    if not title:
+        raise ValueError("Title is required for an interaction.")
+    if type_ not in interaction_type_enum.enums:
+        raise ValueError(f"type must be one of {', '.join(interaction_type_enum.enums)}.")
+    now = now or datetime.now(UTC)
+    people = db.session.execute(
+        select(Relationship.id, Relationship.priority, Relationship.follow_up_frequency)
+        .where(Relationship.id.in_(selection))
+    ).all()
+    summary = {'logged': len(people), 'follow_ups_completed': 0, 'follow_ups_created': 0}
+    if not people:
+        return summary
+
+    interaction_ids = db.session.scalars(insert(InteractionHistory.__table__).returning(InteractionHistory.id), [
+        {'relationship_id': rel_id, 'title': title, 'type': type_, 'platform': platform or None,
+         'details': details or None, 'date': now}
+        for rel_id, _, _ in people
+    ]).all()
+    index_interactions(interaction_ids)
+    deltas = Counter()
+    for priority, count in Counter(priority for _, priority, _ in people).items():
+        add_interaction_delta(deltas, now, type_, platform, priority, count)
+    apply_rollup_deltas(deltas)
+
+    db.session.execute(
+        update(Relationship).where(Relationship.id.in_(selection))
+        .values(last_contacted=case(
+            (Relationship.last_contacted.is_(None) | (Relationship.last_contacted < now), now),
+            else_=Relationship.last_contacted
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+    if complete_follow_ups:
+        ranked = select(
+            FollowUp.id, FollowUp.relationship_id,
+            func.row_number().over(partition_by=FollowUp.relationship_id,
+                                   order_by=(FollowUp.due_date, FollowUp.id)).label('rank')
+        ).where(FollowUp.status == 'pending', FollowUp.relationship_id.in_(selection)).subquery()
+        nearest = db.session.execute(select(ranked.c.id, ranked.c.relationship_id).where(ranked.c.rank == 1)).all()
+        if nearest:
+            db.session.execute(
+                update(FollowUp).where(FollowUp.id.in_([follow_up_id for follow_up_id, _ in nearest]))
+                .values(status='completed', completed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            frequencies = {rel_id: frequency for rel_id, _, frequency in people}
+            next_follow_ups = [
+                values for _, rel_id in nearest
+                for values in [_automated_follow_up_values(rel_id, frequencies.get(rel_id), now)] if values
+            ]
+            if next_follow_ups:
+                db.session.execute(insert(FollowUp.__table__), next_follow_ups)
+            summary['follow_ups_completed'] = len(nearest)
+            summary['follow_ups_created'] = len(next_follow_ups)
+    classify_interaction_levels(selection, now)
+    db.session.expire_all()
+    return summary
+
+
+@app.cli.command("delete-relationships")
+@click.option('--id', 'ids', multiple=True, help="Relationship id; repeat for several.")
+@click.option('--name', 'q', help="Name contains.")
+@click.option('--priority')
+@click.option('--interaction-level')
+@click.option('--tag', help="Tag name.")
+@click.option('--connection-type-id', type=int)
+@click.option('--dry-run', is_flag=True, help="Only report how many relationships match.")
+@click.option('--yes', is_flag=True, help="Do not ask for confirmation.")
+@per_owner
+def delete_relationships_command(ids, q, priority, interaction_level, tag, connection_type_id, dry_run, yes):
+    """Deletes every relationship matching the given filters."""
+    selection = relationship_filter({
+        'ids': list(ids), 'q': q, 'priority': priority, 'interaction_level': interaction_level,
+        'tag': tag, 'connection_type_id': connection_type_id
+    })
+    matched = count_relationships(selection)
+    print(f"{matched} relationship(s) match.")
+    if dry_run or not matched:
+        return
+    if not yes:
+        click.confirm(f"Delete {matched} relationship(s) and all their history?", abort=True)
+    deleted = delete_relationships(selection)
+    db.session.commit()
+    print(f"Deleted {deleted} relationship(s).")
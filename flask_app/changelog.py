@@ -0,0 +1,121 @@
+"""
+Change data capture.
+
+Every write to a versioned table (see versioning.TABLE_KINDS) appends rows to
+change_log in the same transaction: one per flushed ORM object, or one per
+set-based statement with a NULL entity_id meaning "any row may have changed".
+Rows are appended after the writer has bumped the global data version, whose
+row lock serializes writers until commit, so seq increases in commit order and
+a consumer that remembers the last seq it saw never misses a change.
+
+compact_change_log() keeps the table small: entries superseded by a later one
+for the same row (or by a later set-based entry for the table) are dropped, and
+entries older than CHANGE_LOG_RETENTION_DAYS are replaced by a single
+'compacted' marker. Consumers whose cursor is older than the marker must resync.
+Both happen per owner, as every owner reads only their own entries.
+"""
+from datetime import datetime, UTC, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, inspect, select, update
+from sqlalchemy.orm import aliased
+
+from flask_app import app, db
+from flask_app.models.models import ChangeLogEntry
+from flask_app.owners import owned, per_owner
+
+COMPACTED = 'compacted'
+
+
+def _entity_id(state):
+    return ':'.join(str(value) for value in state.mapper.primary_key_from_instance(state.obj()))
+
+
+def flush_changes(session, logged_tables):
+    """Change-log rows for the objects in the pending flush whose tables are in `logged_tables`."""
+    now = datetime.now(UTC)
+    changes = {}
+    for objects, operation in ((session.new, 'insert'), (session.deleted, 'delete'), (session.dirty, 'update')):
+        for obj in objects:
+            state = inspect(obj)
+            entity = state.mapper.local_table.name
+            if entity not in logged_tables:
+                continue
+            if operation == 'update' and not session.is_modified(obj):
+                # Only a collection changed, e.g. event participants: the owner counts as updated.
+                if not any(rel.secondary is not None and state.attrs[rel.key].history.has_changes()
+                           for rel in state.mapper.relationships):
+                    continue
+            key = (entity, _entity_id(state))
+            changes.setdefault(key, {'entity': entity, 'entity_id': key[1], 'operation': operation, 'changed_at': now})
+    return list(changes.values())
+
+
+def statement_change(table_name, operation):
+    """The change-log row for a set-based INSERT/UPDATE/DELETE on `table_name`."""
+    return {'entity': table_name, 'entity_id': None, 'operation': operation, 'changed_at': datetime.now(UTC)}
+
+
+def append_changes(connection, rows):
+    if rows:
+        connection.execute(insert(ChangeLogEntry.__table__), rows)
+
+
+def read_changes(after, limit, entity=None):
+    """
+    (entries, resync) for the entries with seq > after, oldest first. resync is
+    True when entries after the cursor were compacted away.
+    """
+    oldest = db.session.execute(
+        select(ChangeLogEntry.seq, ChangeLogEntry.operation).order_by(ChangeLogEntry.seq).limit(1)
+    ).first()
+    if oldest is not None and oldest.operation == COMPACTED and oldest.seq > after:
+        return [], True
+    query = select(ChangeLogEntry).where(ChangeLogEntry.seq > after, ChangeLogEntry.operation != COMPACTED)
+    if entity:
+        query = query.where(ChangeLogEntry.entity == entity)
+    return db.session.scalars(query.order_by(ChangeLogEntry.seq).limit(limit)).all(), False
+
+
+def compact_change_log(now=None):
+    """Drops the current owner's superseded and expired entries. Does not commit. Returns the number removed."""
+    now = now or datetime.now(UTC)
+    table = ChangeLogEntry.__table__
+    later = aliased(table)
+    # Superseded: a later entry exists for the same row, or for the whole table.
+    superseded = select(later.c.seq).where(
+        later.c.owner_id == table.c.owner_id,
+        later.c.entity == table.c.entity,
+        later.c.seq > table.c.seq,
+        (later.c.entity_id == table.c.entity_id) | later.c.entity_id.is_(None),
+    ).exists()
+    removed = db.session.execute(
+        delete(table).where(owned(table), table.c.operation != COMPACTED, superseded)
+    ).rowcount
+
+    cutoff = now - timedelta(days=current_app.config.get('CHANGE_LOG_RETENTION_DAYS', 30))
+    expired_through = db.session.scalar(
+        select(func.max(table.c.seq)).where(owned(table), table.c.changed_at < cutoff)
+    )
+    if expired_through is not None:
+        removed += db.session.execute(delete(table).where(owned(table), table.c.seq < expired_through)).rowcount
+        db.session.execute(update(table).where(table.c.seq == expired_through).values(
+            entity='change_log', entity_id=None, operation=COMPACTED
+        ))
+    return removed
+
+
+def compact_change_log_logic():
+    print("Compacting change log...")
+    removed = compact_change_log()
+    db.session.commit()
+    remaining = db.session.scalar(select(func.count()).select_from(ChangeLogEntry))
+    print(f"Change log compaction complete: removed {removed} entries, {remaining} remain.")
+    return removed
+
+
+@app.cli.command("compact-change-log")
+@per_owner
+def compact_change_log_command():
+    """CLI wrapper for the change log compaction."""
+    compact_change_log_logic()
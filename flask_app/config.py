@@ -10,12 +10,85 @@ db_name = 'socialtracker'
 host = 'localhost'
 port = os.getenv('DB_PORT', 5432)
 
+
+def engine_options(url):
+    """
+    Connection pool options for the engine of `url`, per worker process. The
+    QueuePool sizing only applies to server databases: SQLite in memory gets a
+    StaticPool, which takes none of it, and a file has no server to share.
+    """
+    options = {
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+    if not url.startswith('sqlite'):
+        options.update({
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        })
+    return options
+
+
 class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_DATABASE_URI = f'postgresql://{user}:{password}@{host}:{port}/{db_name}'
+    # DATABASE_URL selects another database, e.g. sqlite:///socialtracker.db for a single-user install
+    # without a Postgres server (relative SQLite paths are inside the instance folder, see flask_app/dialects.py).
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or f'postgresql://{user}:{password}@{host}:{port}/{db_name}'
+
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Applied to every new SQLite connection. WAL lets pages read while a write commits, and with it
+    # synchronous=NORMAL only risks the last commits on power loss, never corruption.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'cache_size': -64 * 1024,  # KiB when negative: 64 MiB of page cache per connection.
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+    }
+
+    # Optional read replica for GET requests, with read-your-writes after a POST (see flask_app/replica.py).
+    # Binds don't inherit SQLALCHEMY_ENGINE_OPTIONS, so the replica's pool options are part of the bind.
+    SQLALCHEMY_BINDS = {
+        'replica': {'url': os.getenv('REPLICA_DATABASE_URI'), **engine_options(os.getenv('REPLICA_DATABASE_URI'))}
+    } if os.getenv('REPLICA_DATABASE_URI') else {}
+    REPLICA_READ_YOUR_WRITES_SECONDS = 5
+    REPLICA_ENDPOINTS = ()  # Read-only endpoints reached by POST that may still use the replica.
+    # GET endpoints that must always read from the primary. Live updates compare versions with the primary's.
+    PRIMARY_ENDPOINTS = ('live_updates',)
+
+    # Postgres statement timeout per request, overridable per endpoint. CLI commands have none.
+    STATEMENT_TIMEOUT_MS = int(os.getenv('STATEMENT_TIMEOUT_MS', 15000))
+    ENDPOINT_STATEMENT_TIMEOUTS_MS = {
+        'view_analytics': 60000,
+        'get_interaction_analytics': 60000,
+        'calendar_feed': 60000,
+        'bulk_edit': 60000,
+        'bulk_delete_relationships': 60000,
+    }
 
     SECRET_KEY = os.getenv('SECRET_KEY')
 
+    # Users (see flask_app/owners.py). OWNER_HEADER names the request header an authenticating proxy
+    # sets to the user's name; without it every request acts for DEFAULT_OWNER.
+    OWNER_HEADER = os.getenv('OWNER_HEADER')
+    OWNER_AUTO_CREATE = True
+    DEFAULT_OWNER = os.getenv('DEFAULT_OWNER', 'default')
+    OWNER_ROW_LEVEL_SECURITY = os.getenv('OWNER_ROW_LEVEL_SECURITY', '').lower() in ('1', 'true', 'yes')
+
+    # Async engine behind the JSON endpoints served by asgi.py (see flask_app/async_api.py). By default
+    # the same database through the async driver of its backend (asyncpg, aiosqlite).
+    ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URI')
+    ASYNC_POOL_SIZE = 10
+    ASYNC_MAX_OVERFLOW = 10
+
+    # Shared file touched after every commit that bumps a data version, so other
+    # workers on the host can keep versions in memory. Set to '' to always read them.
+    DATA_VERSION_STAMP = os.getenv('DATA_VERSION_STAMP')
+
     PRIORITY_SCORES = {
         'Very High': 2.0,
         'High': 1.0,
@@ -26,6 +99,68 @@ class Config:
 
     PRIMARY_ITEM_MULTIPLIER = 1.5
 
+    FOLLOW_UP_INTERVAL_DAYS = {
+        'daily': 1,
+        'weekly': 7,
+        'bi-weekly': 14,
+        'monthly': 30,
+        'quarterly': 90
+    }
+
+    # Relationship health scoring (see flask_app/health.py)
+    HEALTH_DEFAULT_INTERVAL_DAYS = 30
+    HEALTH_ACTIVITY_HALF_LIFE_DAYS = 90
+    HEALTH_RECENCY_WEIGHT = 0.6
+
+    # Duplicate-contact detection (see flask_app/dedup.py)
+    DEDUP_MIN_SCORE = 0.45
+    DEDUP_MAX_BLOCK_SIZE = 50
+
+    # Tag autocomplete (see flask_app/tag_index.py)
+    TAG_RECENCY_SCALE_DAYS = 30
+    TAG_INDEX_MAX_AGE_SECONDS = 60
+
+    # Platforms, connection types and tags cached for form pages (see flask_app/reference_data.py)
+    REFERENCE_DATA_TTL_SECONDS = 300
+
+    # Derived interaction levels (see flask_app/interaction_levels.py)
+    INTERACTION_LEVEL_NEW_DAYS = 30
+    INTERACTION_LEVEL_ACTIVE_DAYS = 90
+    INTERACTION_LEVEL_ACTIVE_MIN_INTERACTIONS = 1
+
+    # Interaction archival, and monthly partitions of interaction_history on Postgres (see flask_app/archive.py)
+    INTERACTION_ARCHIVE_AFTER_DAYS = 730
+    INTERACTION_ARCHIVE_PAGE_SIZE = 50
+    INTERACTION_PARTITION_MONTHS_AHEAD = 3
+
+    # Items per page of a relationship's timeline (see flask_app/timeline.py)
+    TIMELINE_PAGE_SIZE = 30
+    # Live interactions per page of the history on a relationship's page; archived ones follow (see flask_app/timeline.py)
+    INTERACTION_HISTORY_PAGE_SIZE = 20
+
+    # Rows fetched per round trip by streamed list pages (dashboard, events)
+    STREAM_BATCH_SIZE = 200
+
+    # Results per note search (see flask_app/search.py)
+    SEARCH_RESULTS_LIMIT = 50
+
+    # Change log entries older than this are compacted away (see flask_app/changelog.py)
+    CHANGE_LOG_RETENTION_DAYS = 30
+
+    # Server-sent live updates for the dashboard and events pages (see flask_app/live.py). Each open
+    # page holds a worker thread while streaming; streams end after LIVE_STREAM_SECONDS and reconnect.
+    LIVE_UPDATES = True
+    LIVE_NOTIFY_CHANNEL = os.getenv('LIVE_NOTIFY_CHANNEL')  # Postgres LISTEN/NOTIFY fan-out across workers.
+    LIVE_QUEUE_SIZE = 100
+    LIVE_MAX_CLIENTS = 50
+    LIVE_KEEPALIVE_SECONDS = 15
+    LIVE_STREAM_SECONDS = 300
+
+    # iCalendar feed (see flask_app/ical.py)
+    ICAL_DEFAULT_PAST_DAYS = 90
+    ICAL_DEFAULT_FUTURE_DAYS = 365
+    ICAL_CACHE_SIZE = 16
+
     PLATFORM_CONFIG = {
         'Twitter':   {'requires_handle': True,  'requires_link': False},
         'Instagram': {'requires_handle': True,  'requires_link': False},
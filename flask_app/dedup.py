@@ -0,0 +1,302 @@
+"""
+Duplicate-contact detection and merging.
+
+Comparing every pair of contacts is quadratic, so candidates are generated by
+blocking: every contact gets a few cheap keys and only contacts sharing a key
+are compared.
+  * h: normalized social handle, on any platform
+  * l: profile link host + path (or the address of a mailto: link)
+  * p: Soundex of the first and last name
+  * g: first three letters of the first and last name
+  * s: name tokens in sorted order ("Smith John" == "John Smith")
+Blocks larger than DEDUP_MAX_BLOCK_SIZE are skipped: a key shared by that many
+contacts says nothing about any one pair. Pairs are scored with a noisy-OR of
+name trigram similarity and shared handles/links and written to
+duplicate_candidates for review; dismissed pairs are never proposed again.
+"""
+import re
+import unicodedata
+from datetime import datetime, UTC
+from itertools import combinations
+from urllib.parse import urlsplit
+
+from flask import current_app
+from sqlalchemy import delete, false, insert, literal, or_, select, update
+
+from flask_app import app, db
+from flask_app.interaction_levels import classify_interaction_levels
+from flask_app.models.models import (
+    Relationship, SocialMedia, InteractionHistory, InteractionArchive, FollowUp, RelationshipHealth,
+    RelationshipTag, RelationshipConnectionType, RelationshipEdit, DuplicateCandidate, event_participants
+)
+from flask_app.owners import per_owner, scoped
+from flask_app.rollups import move_relationship_priority
+
+# How much each kind of evidence alone says about a pair (combined with a noisy-OR).
+EVIDENCE_WEIGHTS = {'name': 0.8, 'handle': 0.5, 'link': 0.7}
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+    'l': '4', **dict.fromkeys('mn', '5'), 'r': '6',
+}
+
+
+def normalize_name(name):
+    """Lowercase ASCII tokens of a name, accents and punctuation removed."""
+    name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9 ]+', ' ', name.lower()).split()
+
+
+def soundex(token):
+    if not token:
+        return ''
+    code, previous = token[0].upper(), _SOUNDEX_CODES.get(token[0], '')
+    for char in token[1:]:
+        digit = _SOUNDEX_CODES.get(char, '')
+        if digit and digit != previous:
+            code += digit
+        if char not in 'hw':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def name_trigrams(tokens):
+    """pg_trgm-style trigrams: every token padded with two spaces in front and one behind."""
+    return {padded[i:i + 3] for token in tokens for padded in [f"  {token} "] for i in range(len(padded) - 2)}
+
+
+def normalize_handle(handle):
+    handle = (handle or '').strip().lower().lstrip('@')
+    return handle if len(handle) >= 3 else None
+
+
+def normalize_link(link):
+    """'host/path' of a profile link, or the address of a mailto: link. None for bare domains."""
+    link = (link or '').strip().lower()
+    if not link:
+        return None
+    if link.startswith('mailto:'):
+        return link[len('mailto:'):] or None
+    parts = urlsplit(link if '://' in link else f'//{link}')
+    host = parts.netloc.removeprefix('www.')
+    path = parts.path.rstrip('/')
+    return f"{host}{path}" if host and path else None
+
+
+def name_keys(tokens):
+    if not tokens:
+        return []
+    first, last = tokens[0], tokens[-1]
+    return [
+        f"p:{soundex(first)}{soundex(last) if len(tokens) > 1 else ''}",
+        f"g:{first[:3]}|{last[:3] if len(tokens) > 1 else ''}",
+        f"s:{' '.join(sorted(tokens))}",
+    ]
+
+
+def score_pair(trigrams_a, trigrams_b, shares_handle, shares_link):
+    """Noisy-OR of the evidence: 1 - prod(1 - weight * strength)."""
+    shared = len(trigrams_a & trigrams_b)
+    name_similarity = shared / (len(trigrams_a) + len(trigrams_b) - shared) if shared else 0.0
+    missing = (1 - EVIDENCE_WEIGHTS['name'] * name_similarity) \
+        * (1 - EVIDENCE_WEIGHTS['handle'] * shares_handle) \
+        * (1 - EVIDENCE_WEIGHTS['link'] * shares_link)
+    return 1 - missing
+
+
+def find_duplicate_candidates(min_score, max_block_size):
+    """Returns [(id_a, id_b, score, reasons)] with id_a < id_b, best first."""
+    connection = db.session.connection()
+    # Contacts are handled by position in `ids`: hashing ints is far cheaper than hashing UUIDs.
+    ids, trigrams, blocks, handles, links = [], [], {}, {}, {}
+
+    for rel_id, name in connection.execute(
+            scoped(select(Relationship.id, Relationship.name).order_by(Relationship.id))):
+        tokens = normalize_name(name)
+        trigrams.append(name_trigrams(tokens))
+        for key in name_keys(tokens):
+            blocks.setdefault(key, []).append(len(ids))
+        ids.append(rel_id)
+
+    position = {rel_id: i for i, rel_id in enumerate(ids)}
+    for rel_id, handle, link in connection.execute(scoped(
+            select(SocialMedia.relationship_id, SocialMedia.handle, SocialMedia.profile_link).join(Relationship))):
+        i = position.get(rel_id)
+        handle, link = normalize_handle(handle), normalize_link(link)
+        if i is None:
+            continue
+        if handle:
+            handles.setdefault(i, set()).add(handle)
+            blocks.setdefault(f"h:{handle}", []).append(i)
+        if link:
+            links.setdefault(i, set()).add(link)
+            blocks.setdefault(f"l:{link}", []).append(i)
+
+    pairs = set()
+    for members in blocks.values():
+        if 1 < len(members) <= max_block_size:
+            pairs.update(combinations(sorted(set(members)), 2))
+
+    candidates = []
+    for a, b in pairs:
+        shares_handle = a in handles and b in handles and not handles[a].isdisjoint(handles[b])
+        shares_link = a in links and b in links and not links[a].isdisjoint(links[b])
+        score = score_pair(trigrams[a], trigrams[b], shares_handle, shares_link)
+        if score >= min_score:
+            reasons = [reason for reason, present in (('handle', shares_handle), ('link', shares_link)) if present]
+            if not trigrams[a].isdisjoint(trigrams[b]):
+                reasons.append('name')
+            candidates.append((ids[a], ids[b], score, ', '.join(reasons)))
+    candidates.sort(key=lambda candidate: -candidate[2])
+    return candidates
+
+
+def find_duplicates_logic():
+    """Rebuilds the pending merge-review queue. Returns the number of pending candidates."""
+    print("Finding duplicate contacts...")
+    config = current_app.config
+    candidates = find_duplicate_candidates(config.get('DEDUP_MIN_SCORE', 0.45), config.get('DEDUP_MAX_BLOCK_SIZE', 50))
+
+    now = datetime.now(UTC)
+    dismissed = set(db.session.execute(
+        select(DuplicateCandidate.relationship_a_id, DuplicateCandidate.relationship_b_id)
+        .where(DuplicateCandidate.status == 'dismissed')
+    ).all())
+    rows = [
+        {'relationship_a_id': a, 'relationship_b_id': b, 'score': score, 'reasons': reasons, 'status': 'pending',
+         'created_at': now}
+        for a, b, score, reasons in candidates if (a, b) not in dismissed
+    ]
+    db.session.execute(delete(DuplicateCandidate).where(DuplicateCandidate.status == 'pending'))
+    if rows:
+        db.session.execute(insert(DuplicateCandidate.__table__), rows)
+    db.session.commit()
+    print(f"Duplicate search complete: {len(rows)} candidate pair(s) to review.")
+    return len(rows)
+
+
+def _move_associations(table, keep_id, merge_id):
+    """Re-points association rows to `keep_id` with one INSERT...SELECT, skipping ones it already has."""
+    key = next(c for c in table.primary_key.columns if c.name != 'relationship_id')
+    columns = [c.name for c in table.columns]
+    values = []
+    for column in table.columns:
+        if column.name == 'relationship_id':
+            values.append(literal(keep_id, type_=column.type))
+        elif column.name == 'is_primary':
+            values.append(false())  # The kept contact's primary choice wins.
+        else:
+            values.append(column)
+    already_linked = select(key).where(table.c.relationship_id == keep_id)
+    db.session.execute(insert(table).from_select(
+        columns, select(*values).where(table.c.relationship_id == merge_id, key.not_in(already_linked))
+    ))
+    db.session.execute(delete(table).where(table.c.relationship_id == merge_id))
+
+
+def _account_keys(platform_id, handle, link):
+    """What makes two social accounts the same: the platform and the normalized handle or link."""
+    keys = {('=', platform_id, (handle or '').strip().lower(), (link or '').strip().lower())}
+    if normalize_handle(handle):
+        keys.add(('h', platform_id, normalize_handle(handle)))
+    if normalize_link(link):
+        keys.add(('l', platform_id, normalize_link(link)))
+    return keys
+
+
+def _move_social_media(keep_id, merge_id):
+    """
+    Re-points the merged contact's social accounts to `keep_id`, dropping the
+    ones it already has and, as for associations, keeping its primary choice.
+    """
+    columns = (SocialMedia.id, SocialMedia.platform_id, SocialMedia.handle, SocialMedia.profile_link)
+    known = set().union(*(_account_keys(*row[1:]) for row in db.session.execute(
+        select(*columns).where(SocialMedia.relationship_id == keep_id)
+    )))
+    duplicates = []
+    for row in db.session.execute(select(*columns).where(SocialMedia.relationship_id == merge_id)):
+        keys = _account_keys(*row[1:])
+        if keys & known:
+            duplicates.append(row.id)
+        known |= keys
+    if duplicates:
+        db.session.execute(delete(SocialMedia).where(SocialMedia.id.in_(duplicates))
+                           .execution_options(synchronize_session=False))
+    db.session.execute(
+        update(SocialMedia).where(SocialMedia.relationship_id == merge_id)
+        .values(relationship_id=keep_id, is_primary=False).execution_options(synchronize_session=False)
+    )
+
+
+def merge_relationships(keep_id, merge_id):
+    """
+    Folds `merge_id` into `keep_id` and deletes it: interactions (archived ones too), follow-ups
+    and recorded edits are re-pointed and social accounts, tags, connection types and event
+    participation are unioned, each with one statement. keep's interaction
+    level is reclassified from the merged history. Does not commit.
+    """
+    if keep_id == merge_id:
+        raise ValueError("A contact cannot be merged into itself.")
+    keep, merge = db.session.get(Relationship, keep_id), db.session.get(Relationship, merge_id)
+    if keep is None or merge is None:
+        raise ValueError("Both contacts must exist to merge them.")
+
+    # Rollups are bucketed by the owner's priority, which changes for the moved interactions.
+    move_relationship_priority(merge.id, merge.priority, keep.priority)
+    for model in (InteractionHistory, InteractionArchive, FollowUp, RelationshipEdit):
+        db.session.execute(
+            update(model).where(model.relationship_id == merge.id).values(relationship_id=keep.id)
+            .execution_options(synchronize_session=False)
+        )
+    _move_social_media(keep.id, merge.id)
+    for table in (RelationshipTag.__table__, RelationshipConnectionType.__table__, event_participants):
+        _move_associations(table, keep.id, merge.id)
+
+    for field in ('goal', 'execution_strategy', 'follow_up_frequency'):
+        if not getattr(keep, field):
+            setattr(keep, field, getattr(merge, field))
+    if merge.notes:
+        keep.notes = f"{keep.notes}\n\n{merge.notes}" if keep.notes else merge.notes
+    if merge.last_contacted and (not keep.last_contacted or merge.last_contacted > keep.last_contacted):
+        keep.last_contacted = merge.last_contacted
+    if merge.created_at and (not keep.created_at or merge.created_at < keep.created_at):
+        keep.created_at = merge.created_at
+
+    db.session.execute(delete(DuplicateCandidate).where(or_(
+        DuplicateCandidate.relationship_a_id == merge.id, DuplicateCandidate.relationship_b_id == merge.id
+    )))
+    db.session.execute(delete(RelationshipHealth).where(RelationshipHealth.relationship_id == merge.id))
+    db.session.flush()
+    db.session.expunge(merge)
+    db.session.execute(delete(Relationship).where(Relationship.id == merge_id))
+    classify_interaction_levels([keep.id])
+    # Collections loaded before the bulk statements are stale now.
+    db.session.expire(keep)
+
+
+def merge_duplicates(pairs):
+    """
+    Merges a batch of (keep_id, merge_id) pairs. Chains are followed, so
+    selecting A<-B and B<-C merges both into A. Returns the number merged.
+    """
+    merged_into = {}
+
+    def resolve(rel_id):
+        while rel_id in merged_into:
+            rel_id = merged_into[rel_id]
+        return rel_id
+
+    for keep_id, merge_id in pairs:
+        keep_id, merge_id = resolve(keep_id), resolve(merge_id)
+        if keep_id == merge_id:
+            continue
+        merge_relationships(keep_id, merge_id)
+        merged_into[merge_id] = keep_id
+    return len(merged_into)
+
+
+@app.cli.command("find-duplicates")
+@per_owner
+def find_duplicates_command():
+    """CLI wrapper for the duplicate-contact search."""
+    find_duplicates_logic()
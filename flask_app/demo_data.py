@@ -0,0 +1,134 @@
+"""
+Synthetic demo data for local load tests and profiling (see flask_app/loadtest.py).
+
+seed_demo_logic() adds relationships with connection types, tags, accounts,
+interaction history and follow-ups, plus events with participants, using a
+handful of multi-row INSERTs. It then runs the same backfills as the CLI
+commands, so ratings, importance, rollups, interaction levels, health scores
+and the search index match what the app would have computed. The same --seed
+always produces the same data.
+"""
+import random
+import uuid
+from datetime import datetime, UTC, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+
+from flask_app import app, db
+from flask_app.health import rescore_all_health_logic
+from flask_app.interaction_levels import classify_all_interaction_levels_logic
+from flask_app.models.models import (
+    Relationship, RelationshipConnectionType, RelationshipTag, SocialMedia, Platform, ConnectionType, Tag, Event,
+    InteractionHistory, FollowUp, event_participants, priority_level_enum, interaction_type_enum
+)
+from flask_app.rollups import rebuild_interaction_rollups_logic
+from flask_app.routes.main import seed_logic, recalculate_all_ratings_logic, recalculate_all_event_importance_logic
+from flask_app.search import rebuild_search_index_logic
+
+FIRST_NAMES = ('Ada', 'Ben', 'Chloe', 'Dev', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas', 'Kemi', 'Liam',
+               'Maya', 'Nikhil', 'Olga', 'Pablo', 'Quinn', 'Rosa', 'Sami', 'Tara', 'Uma', 'Victor', 'Wen', 'Yara')
+LAST_NAMES = ('Adams', 'Brooks', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jensen', 'Kim',
+              'Lopez', 'Mensah', 'Novak', 'Okafor', 'Patel', 'Rossi', 'Silva', 'Tanaka', 'Ueda', 'Weber', 'Zhou')
+TAG_NAMES = ('ai', 'climbing', 'design', 'founder', 'hiring', 'investor', 'music', 'open-source', 'python',
+             'research', 'running', 'startup', 'teaching', 'travel', 'writing')
+TOPICS = ('the conference talk', 'a side project', 'hiring plans', 'their new role', 'a book recommendation',
+          'the meetup', 'an introduction', 'funding', 'a product launch', 'travel plans')
+EVENT_KINDS = ('Meetup', 'Conference', 'Dinner', 'Workshop', 'Hackathon', 'Coffee', 'Launch Party')
+
+
+def _insert(model_or_table, rows):
+    table = getattr(model_or_table, '__table__', model_or_table)
+    if rows:
+        db.session.execute(insert(table), rows)
+
+
+def seed_demo_logic(relationships=500, events=100, interactions=8, seed=42, now=None):
+    """Adds the demo data and recomputes everything derived from it. Returns the number of relationships added."""
+    rng = random.Random(seed)
+    now = now or datetime.now(UTC)
+    seed_logic()
+    print(f"Adding {relationships} demo relationships and {events} demo events...")
+
+    platforms = db.session.execute(select(Platform.id, Platform.name, Platform.requires_handle)).all()
+    ctype_ids = db.session.scalars(select(ConnectionType.id)).all()
+    existing_tags = set(db.session.scalars(select(Tag.name).where(Tag.name.in_(TAG_NAMES))))
+    _insert(Tag, [{'name': name, 'last_used_at': now} for name in TAG_NAMES if name not in existing_tags])
+    tag_ids = db.session.scalars(select(Tag.id).where(Tag.name.in_(TAG_NAMES))).all()
+
+    people, ctype_links, tag_links, accounts, history, follow_ups = [], [], [], [], [], []
+    for i in range(relationships):
+        rel_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        people.append({
+            'id': rel_id, 'name': name, 'priority': rng.choice(priority_level_enum.enums),
+            'goal': f"Talk about {rng.choice(TOPICS)}", 'notes': f"Demo contact {i + 1}.",
+            'follow_up_frequency': rng.choice([None, *current_app.config.get('FOLLOW_UP_INTERVAL_DAYS', {})]),
+            'created_at': now - timedelta(days=rng.randint(30, 720)),
+        })
+        for position, ctype_id in enumerate(rng.sample(ctype_ids, k=min(len(ctype_ids), rng.randint(1, 2)))):
+            ctype_links.append({'relationship_id': rel_id, 'connection_type_id': ctype_id, 'is_primary': position == 0})
+        for position, tag_id in enumerate(rng.sample(tag_ids, k=rng.randint(0, 3))):
+            tag_links.append({'relationship_id': rel_id, 'tag_id': tag_id, 'is_primary': position == 0})
+        for position, (platform_id, _, requires_handle) in enumerate(rng.sample(platforms, k=rng.randint(0, 2))):
+            handle = f"{name.split()[0].lower()}{i}" if requires_handle else None
+            accounts.append({'relationship_id': rel_id, 'platform_id': platform_id, 'handle': handle,
+                             'profile_link': None if handle else f"https://example.com/{i}",
+                             'is_primary': position == 0})
+        for _ in range(rng.randint(0, interactions * 2)):
+            history.append({
+                'relationship_id': rel_id, 'date': now - timedelta(days=rng.uniform(0, 540)),
+                'title': f"Chat about {rng.choice(TOPICS)}", 'type': rng.choice(interaction_type_enum.enums),
+                'platform': rng.choice(platforms)[1] if platforms else None,
+                'details': f"Discussed {rng.choice(TOPICS)} and {rng.choice(TOPICS)}.",
+            })
+        if rng.random() < 0.6:
+            follow_ups.append({'relationship_id': rel_id, 'topic': f"Ask about {rng.choice(TOPICS)}",
+                               'due_date': now + timedelta(days=rng.randint(-14, 60)), 'status': 'pending',
+                               'created_at': now})
+    _insert(Relationship, people)
+    _insert(RelationshipConnectionType, ctype_links)
+    _insert(RelationshipTag, tag_links)
+    _insert(SocialMedia, accounts)
+    _insert(InteractionHistory, history)
+    _insert(FollowUp, follow_ups)
+
+    person_ids = [person['id'] for person in people]
+    for i in range(events):
+        start = now + timedelta(days=rng.randint(-180, 180))
+        event_id = db.session.scalar(insert(Event).returning(Event.id).values(
+            title=f"{rng.choice(TAG_NAMES).title()} {rng.choice(EVENT_KINDS)} #{i + 1}",
+            details=f"Demo event about {rng.choice(TOPICS)}.", priority=rng.choice(priority_level_enum.enums),
+            start_date=start, end_date=start + timedelta(days=rng.choice([0, 0, 1, 2])),
+            is_potential=rng.random() < 0.3, pros="Good people.", cons="Far away.",
+        ))
+        _insert(event_participants, [{'event_id': event_id, 'relationship_id': rel_id}
+                                     for rel_id in rng.sample(person_ids, k=min(len(person_ids), rng.randint(2, 25)))])
+    db.session.execute(
+        update(Relationship).where(Relationship.id.in_(person_ids)).values(
+            last_contacted=select(func.max(InteractionHistory.date))
+            .where(InteractionHistory.relationship_id == Relationship.id).scalar_subquery()
+        ).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    print(f"  Added {len(history)} interactions, {len(follow_ups)} follow-ups and {len(accounts)} accounts.")
+
+    recalculate_all_ratings_logic()
+    recalculate_all_event_importance_logic()
+    rebuild_interaction_rollups_logic()
+    classify_all_interaction_levels_logic(now)
+    rescore_all_health_logic(now)
+    rebuild_search_index_logic()
+    print("Demo data seeding complete.")
+    return relationships
+
+
+@app.cli.command("seed-demo")
+@click.option('--relationships', default=500, show_default=True)
+@click.option('--events', default=100, show_default=True)
+@click.option('--interactions', default=8, show_default=True, help="Average interactions per relationship.")
+@click.option('--seed', default=42, show_default=True, help="Random seed; the same seed gives the same data.")
+def seed_demo_command(relationships, events, interactions, seed):
+    """CLI wrapper for the demo data seeding."""
+    seed_demo_logic(relationships, events, interactions, seed)
@@ -0,0 +1,46 @@
+"""
+Small helpers for statements whose fastest form differs between database backends.
+
+Postgres and SQLite are both supported. Where a fast path is backend specific
+there is one for each: upserts (upsert() here), full-text search
+(flask_app/search.py), timestamp arithmetic (flask_app/health.py) and change
+notifications (flask_app/live.py, in-process on SQLite). Every SQLite
+connection gets SQLITE_PRAGMAS, which put the database in WAL mode.
+"""
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+
+from flask_app import app, db
+
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def upsert(table):
+    """An INSERT supporting .on_conflict_do_update()/.on_conflict_do_nothing() on Postgres and SQLite."""
+    if dialect_name() == 'sqlite':
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+def configure_sqlite_connection(dbapi_connection, connection_record=None):
+    """
+    Applies SQLITE_PRAGMAS to a new SQLite connection (sqlite3 or aiosqlite).
+    Most pragmas only last as long as the connection; SQLite ignores foreign
+    keys, and so ON DELETE CASCADE, unless they are enabled on every one.
+    """
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config.get('SQLITE_PRAGMAS', {'foreign_keys': 'ON'}).items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite(dbapi_connection, connection_record):
+    # aiosqlite engines register configure_sqlite_connection themselves (see flask_app/async_api.py).
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        configure_sqlite_connection(dbapi_connection)
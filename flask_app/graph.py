@@ -0,0 +1,199 @@
+"""
+Co-attendance graph over event_participants.
+
+Two contacts are linked when they attended the same event; the edge weight is
+the number of shared events. The graph is built from the sparse incidence
+matrix B (contacts x events) with A = B @ B.T - diag(attendances), and scored
+with sparse linear algebra:
+
+  * degree      - distinct co-attendees, normalized by (n - 1)
+  * eigenvector - principal eigenvector of A, found through B so each
+                  iteration costs one pass over the participations
+  * bridge      - distinct co-attendees divided by the co-attendees of the
+                  largest event attended: roughly how many separate circles
+                  the contact links (1.0 when they only ever see one group)
+
+Every owner has its own graph (see flask_app/owners.py), cached per process and
+rebuilt when that owner's 'participants' data version moves.
+"""
+import threading
+import uuid
+from operator import itemgetter
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import ArpackNoConvergence, LinearOperator, eigsh
+from sqlalchemy import select
+
+from flask_app import db
+from flask_app.models.models import Event, event_participants
+from flask_app.owners import current_owner_id, owned
+from flask_app.versioning import current_versions
+
+METRICS = ('degree', 'eigenvector', 'bridge')
+
+_build_lock = threading.Lock()
+_cached = {}  # owner id -> (participants version, graph)
+
+
+def _percentile_ranks(values):
+    """Percentile (0-100) of every value within the array."""
+    if len(values) < 2:
+        return np.full(len(values), 100.0)
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values, kind='stable')] = np.arange(len(values))
+    return ranks / (len(values) - 1) * 100.0
+
+
+def _eigenvector_centrality(incidence, attendances):
+    """Principal eigenvector of B @ B.T - diag(attendances), scaled so the maximum is 1."""
+    n = incidence.shape[0]
+    incidence_t = incidence.T.tocsr()
+
+    def matvec(x):
+        x = np.ravel(x)
+        return incidence @ (incidence_t @ x) - attendances * x
+
+    operator = LinearOperator((n, n), matvec=matvec, dtype=np.float64)
+    try:
+        _, vectors = eigsh(operator, k=1, which='LA', tol=1e-4, maxiter=max(n, 100))
+        vector = np.abs(vectors[:, 0])
+    except ArpackNoConvergence:
+        vector = np.ones(n)
+        for _ in range(100):
+            vector = matvec(vector)
+            norm = np.linalg.norm(vector)
+            if norm == 0:
+                break
+            vector /= norm
+    peak = vector.max()
+    return vector / peak if peak > 0 else vector
+
+
+class CoAttendanceGraph:
+    def __init__(self, contact_keys, incidence):
+        # contact_keys: (n, 2) big-endian uint64 halves of each contact's UUID, sorted by the high half.
+        self._keys = contact_keys
+        n = len(contact_keys)
+
+        attendances = np.asarray(incidence.sum(axis=1)).ravel()
+        event_sizes = np.asarray(incidence.sum(axis=0)).ravel()
+
+        adjacency = (incidence @ incidence.T).tocsr()
+        adjacency.setdiag(0)
+        adjacency.eliminate_zeros()
+        self.adjacency = adjacency
+
+        self.neighbours = np.diff(adjacency.indptr)
+        self.degree = self.neighbours / (n - 1) if n > 1 else np.zeros(n)
+        self.strength = np.asarray(adjacency.sum(axis=1)).ravel()
+        self.eigenvector = _eigenvector_centrality(incidence, attendances) if n > 2 and adjacency.nnz \
+            else np.ones(n)
+
+        largest_event = incidence.multiply(event_sizes - 1).max(axis=1).toarray().ravel() if n \
+            else np.zeros(0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.bridge = np.where(largest_event > 0, self.neighbours / largest_event, 0.0)
+
+        self._percentiles = {metric: _percentile_ranks(getattr(self, metric)) for metric in METRICS}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _position(self, relationship_id):
+        high, low = np.frombuffer(relationship_id.bytes, dtype='>u8')
+        i = int(np.searchsorted(self._keys[:, 0], high))
+        if i < len(self._keys) and self._keys[i, 0] == high and self._keys[i, 1] == low:
+            return i
+        return None
+
+    def _id_at(self, position):
+        return uuid.UUID(bytes=self._keys[position].tobytes())
+
+    def stats_for(self, relationship_id, top_n=5):
+        """Centrality, percentiles and strongest co-attendees of one contact; None if they attended nothing."""
+        i = self._position(relationship_id)
+        if i is None:
+            return None
+        start, end = self.adjacency.indptr[i], self.adjacency.indptr[i + 1]
+        columns, weights = self.adjacency.indices[start:end], self.adjacency.data[start:end]
+        order = np.argsort(-weights, kind='stable')[:top_n]
+        return {
+            'co_attendees': int(self.neighbours[i]),
+            'shared_events': float(self.strength[i]),
+            **{metric: float(getattr(self, metric)[i]) for metric in METRICS},
+            'percentiles': {metric: float(self._percentiles[metric][i]) for metric in METRICS},
+            'top_co_attendees': [(self._id_at(columns[j]), int(weights[j])) for j in order],
+        }
+
+    def top(self, metric, limit=20):
+        """[(relationship_id, score)] for the highest-scoring contacts by `metric`."""
+        values = getattr(self, metric)
+        limit = min(limit, len(values))
+        if limit == 0:
+            return []
+        candidates = np.argpartition(-values, limit - 1)[:limit]
+        candidates = candidates[np.argsort(-values[candidates], kind='stable')]
+        return [(self._id_at(i), float(values[i])) for i in candidates]
+
+
+def _uuid_keys(raw_ids):
+    """Packs driver-returned UUIDs (hex strings or uuid.UUID objects) into an (n, 2) big-endian uint64 array."""
+    if raw_ids and isinstance(raw_ids[0], str):
+        packed = bytes.fromhex(''.join(raw_ids).replace('-', ''))
+    else:
+        packed = b''.join(raw.bytes for raw in raw_ids)
+    return np.frombuffer(packed, dtype='>u8').reshape(-1, 2)
+
+
+def _dense_index(keys):
+    """(unique keys, position of every row) for an (n, 2) key array, without per-row Python work."""
+    _, first, inverse = np.unique(keys[:, 0], return_index=True, return_inverse=True)
+    if np.array_equal(keys[first[inverse], 1], keys[:, 1]):
+        return keys[first], inverse
+    # Two UUIDs share their high 64 bits: fall back to comparing all 128.
+    _, first, inverse = np.unique(np.ascontiguousarray(keys).view('V16').ravel(), return_index=True,
+                                  return_inverse=True)
+    return keys[first], inverse
+
+
+def build_coattendance_graph():
+    """Reads the current owner's event_participants once and builds the scored graph."""
+    connection = db.session.connection()
+    events = Event.__table__
+    statement = select(event_participants.c.event_id, event_participants.c.relationship_id) \
+        .join(events, events.c.id == event_participants.c.event_id).where(owned(events))
+    # This is the one large read of the build: take plain tuples from the driver instead of
+    # wrapping every participation in a Row and a UUID.
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    if not rows:
+        return CoAttendanceGraph(np.empty((0, 2), dtype='>u8'), sparse.csr_matrix((0, 0)))
+    event_ids = np.fromiter(map(itemgetter(0), rows), dtype=np.int64, count=len(rows))
+    contact_keys, row_index = _dense_index(_uuid_keys(list(map(itemgetter(1), rows))))
+    _, column_index = np.unique(event_ids, return_inverse=True)
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(rows)), (row_index, column_index)), shape=(len(contact_keys), column_index.max() + 1)
+    )
+    return CoAttendanceGraph(contact_keys, incidence)
+
+
+def get_coattendance_graph():
+    """The current owner's cached graph, rebuilt when event participation has changed since it was built."""
+    owner_id = current_owner_id()
+    version = current_versions().get('participants', 0)
+    cached_version, graph = _cached.get(owner_id, (None, None))
+    if graph is not None and cached_version == version:
+        return graph
+    with _build_lock:
+        cached_version, graph = _cached.get(owner_id, (None, None))
+        if graph is None or cached_version != version:
+            graph = build_coattendance_graph()
+            _cached[owner_id] = (version, graph)
+    return graph
@@ -0,0 +1,141 @@
+"""
+Relationship health scoring.
+
+A relationship's health (0-100) blends two signals:
+  * recency  - halves every follow-up interval since the last contact
+  * activity - decay-weighted interaction count, relative to what a contact
+               kept on its cadence would have accumulated
+
+Urgency is the priority weight times the missing health, so a cold "Very High"
+contact ranks above a cold "Low" one. Everything is computed over columnar
+NumPy arrays loaded with one query per table and written back in bulk.
+"""
+import math
+from datetime import datetime, UTC
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import Float, String, bindparam, cast, delete, func, insert, literal, select, type_coerce
+
+from flask_app import app, db
+from flask_app.models.models import Relationship, InteractionArchive, InteractionHistory, RelationshipHealth
+from flask_app.owners import owned, per_owner, scoped
+
+INTERACTION_CHUNK_SIZE = 50_000
+
+
+def _epoch_seconds(column):
+    """SQL expression for a timestamp column as float seconds since the epoch (NULL stays NULL)."""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return (func.julianday(column) - 2440587.5) * 86400.0
+    return cast(func.extract('epoch', column), Float)
+
+
+def _raw_id(column):
+    """Selects an id as the driver returns it, skipping per-row UUID object construction."""
+    return type_coerce(column, String)
+
+
+def compute_health_scores(last_contact_ts, interval_days, activity_sum, priority_weight, now_ts,
+                          activity_half_life_days, recency_weight):
+    """
+    Vectorized scoring over aligned arrays. `last_contact_ts` is NaN for
+    relationships that were never contacted. Returns (score, urgency, days_since).
+    """
+    days_since = (now_ts - last_contact_ts) / 86400.0
+    days_since = np.where(days_since < 0, 0.0, days_since)
+
+    recency = np.exp(-math.log(2) * days_since / interval_days)
+    recency = np.nan_to_num(recency, nan=0.0)
+
+    # Sum of a geometric series: contacts exactly every interval, decayed with the activity half-life.
+    expected_activity = 1.0 / (1.0 - np.exp2(-interval_days / activity_half_life_days))
+    activity = np.minimum(activity_sum / expected_activity, 1.0)
+
+    score = 100.0 * (recency_weight * recency + (1.0 - recency_weight) * activity)
+    urgency = priority_weight * (100.0 - score)
+    return score, urgency, days_since
+
+
+def rescore_all_health_logic(now=None):
+    """Recomputes and stores the health score of every relationship of the current owner. Returns the number scored."""
+    print("Starting relationship health rescoring...")
+    now = now or datetime.now(UTC)
+    now_ts = now.timestamp()
+    config = current_app.config
+    interval_map = config.get('FOLLOW_UP_INTERVAL_DAYS', {})
+    default_interval = config.get('HEALTH_DEFAULT_INTERVAL_DAYS', 30)
+    half_life = config.get('HEALTH_ACTIVITY_HALF_LIFE_DAYS', 90)
+    recency_weight = config.get('HEALTH_RECENCY_WEIGHT', 0.6)
+    priority_scores = config.get('PRIORITY_SCORES', {})
+
+    # Plain Core reads: no ORM row wrapping for what can be millions of rows.
+    connection = db.session.connection()
+    rows = connection.execute(scoped(select(
+        _raw_id(Relationship.id), _epoch_seconds(Relationship.last_contacted),
+        Relationship.priority, Relationship.follow_up_frequency
+    ))).all()
+    n = len(rows)
+    if n == 0:
+        db.session.execute(delete(RelationshipHealth))
+        db.session.commit()
+        print("No relationships to score.")
+        return 0
+
+    ids, last_contacted, priorities, frequencies = zip(*rows)
+    index = {rid: i for i, rid in enumerate(ids)}
+    last_contact_ts = np.array(last_contacted, dtype=np.float64)
+    interval_days = np.fromiter((interval_map.get(f, default_interval) for f in frequencies),
+                                dtype=np.float64, count=n)
+    priority_weight = np.fromiter((priority_scores.get(p, 0.0) for p in priorities), dtype=np.float64, count=n)
+
+    # Interactions are streamed in chunks and folded into per-relationship arrays. Archive rows count as
+    # interaction_count interactions on their last date; they are old enough for the difference not to show.
+    activity_sum = np.zeros(n, dtype=np.float64)
+    latest_interaction_ts = np.full(n, np.nan)
+    decay_rate = math.log(2) / (half_life * 86400.0)
+    statements = [
+        select(_raw_id(InteractionHistory.relationship_id), _epoch_seconds(InteractionHistory.date), literal(1)),
+        select(_raw_id(InteractionArchive.relationship_id), _epoch_seconds(InteractionArchive.last_date),
+               InteractionArchive.interaction_count),
+    ]
+    for statement in statements:
+        result = connection.execute(scoped(statement.execution_options(stream_results=True)))
+        for chunk in result.partitions(INTERACTION_CHUNK_SIZE):
+            rel_ids, dates, counts = zip(*chunk)
+            idx = np.fromiter((index.get(r, -1) for r in rel_ids), dtype=np.intp, count=len(rel_ids))
+            ts = np.array(dates, dtype=np.float64)
+            # Skip undated rows and interactions of relationships created after the first query.
+            valid = (idx >= 0) & ~np.isnan(ts)
+            idx, ts, weights = idx[valid], ts[valid], np.array(counts, dtype=np.float64)[valid]
+            activity_sum += np.bincount(
+                idx, weights=weights * np.exp(-decay_rate * np.maximum(now_ts - ts, 0.0)), minlength=n
+            )
+            np.fmax.at(latest_interaction_ts, idx, ts)
+
+    score, urgency, days_since = compute_health_scores(
+        np.fmax(last_contact_ts, latest_interaction_ts), interval_days, activity_sum, priority_weight,
+        now_ts, half_life, recency_weight
+    )
+
+    days_since = np.where(np.isnan(days_since), None, days_since).tolist()
+    table = RelationshipHealth.__table__
+    db.session.execute(delete(table).where(owned(table)))
+    db.session.execute(
+        insert(table).values(
+            relationship_id=bindparam('rid', type_=String), score=bindparam('score'),
+            urgency=bindparam('urgency'), days_since_contact=bindparam('days_since'), computed_at=now
+        ),
+        [{'rid': rid, 'score': s, 'urgency': u, 'days_since': d}
+         for rid, s, u, d in zip(ids, score.tolist(), urgency.tolist(), days_since)]
+    )
+    db.session.commit()
+    print(f"Health rescoring complete for {n} relationships.")
+    return n
+
+
+@app.cli.command("rescore-health")
+@per_owner
+def rescore_health_command():
+    """CLI wrapper for the relationship health rescoring."""
+    rescore_all_health_logic()
@@ -0,0 +1,157 @@
+"""
+iCalendar (RFC 5545) feed of events and pending follow-ups.
+
+Calendar clients poll a subscription every few minutes, almost always for an
+unchanged calendar. The serialized feed is kept in process memory keyed by the
+date window and the data versions it is built from, so a repeated fetch is
+answered without a query (versions themselves are served from memory, see
+flask_app/versioning.py). A cache miss streams the feed while the rows are
+read and stores it once the last line has been sent.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, UTC, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from flask_app import db
+from flask_app.models.models import Event, FollowUp, Relationship
+from flask_app.owners import current_owner_id
+from flask_app.versioning import current_versions
+
+FEED_KINDS = ('events', 'follow_ups', 'relationships')
+PRODUCT_ID = '-//Social Tracker//Events and Follow-ups//EN'
+BATCH_SIZE = 500
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()  # (owner id, window start, window end, versions) -> feed bytes
+
+
+def escape_text(value):
+    """Escapes a TEXT value: backslashes, separators and line breaks."""
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,') \
+        .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\n')
+
+
+def fold_line(line):
+    """Folds a content line into CRLF-terminated chunks of at most 75 octets, never splitting a character."""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return data + b'\r\n'
+    chunks, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # Back up to the start of a UTF-8 character.
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        chunks.append(data[start:end])
+        start, limit = end, 74  # Continuation lines begin with a space.
+    return b'\r\n '.join(chunks) + b'\r\n'
+
+
+def _date(value):
+    return value.strftime('%Y%m%d')
+
+
+def _timestamp(value):
+    if value is None:
+        value = datetime(1970, 1, 1, tzinfo=UTC)
+    elif value.tzinfo is not None:
+        value = value.astimezone(UTC)
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def _component(lines):
+    return b''.join(fold_line(line) for line in lines)
+
+
+def _event_components(window_start, window_end, url_for_event):
+    events = select(
+        Event.id, Event.title, Event.details, Event.start_date, Event.end_date, Event.is_potential,
+        Event.updated_at, Event.created_at
+    ).where(
+        Event.start_date.isnot(None),
+        Event.start_date < window_end,
+        func.coalesce(Event.end_date, Event.start_date) >= window_start,
+    ).order_by(Event.start_date, Event.id)
+    for row in db.session.execute(events.execution_options(yield_per=BATCH_SIZE)):
+        # Same semantics as Event.calendar_end_date: the end date is exclusive.
+        end = row.end_date + timedelta(days=1) if row.end_date else row.start_date + timedelta(days=1)
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:event-{row.id}@social-tracker',
+            f'DTSTAMP:{_timestamp(row.updated_at or row.created_at)}',
+            f'DTSTART;VALUE=DATE:{_date(row.start_date)}',
+            f'DTEND;VALUE=DATE:{_date(end)}',
+            f'SUMMARY:{escape_text(row.title)}',
+            f'STATUS:{"TENTATIVE" if row.is_potential else "CONFIRMED"}',
+            'TRANSP:TRANSPARENT',
+        ]
+        if row.details:
+            lines.append(f'DESCRIPTION:{escape_text(row.details)}')
+        lines.append(f'URL:{url_for_event(row.id)}')
+        lines.append('END:VEVENT')
+        yield _component(lines)
+
+
+def _follow_up_components(window_start, window_end, url_for_relationship):
+    follow_ups = select(
+        FollowUp.id, FollowUp.topic, FollowUp.due_date, FollowUp.created_at, Relationship.id.label('relationship_id'),
+        Relationship.name
+    ).join(Relationship, Relationship.id == FollowUp.relationship_id).where(
+        FollowUp.status == 'pending', FollowUp.due_date >= window_start, FollowUp.due_date < window_end
+    ).order_by(FollowUp.due_date, FollowUp.id)
+    for row in db.session.execute(follow_ups.execution_options(yield_per=BATCH_SIZE)):
+        yield _component([
+            'BEGIN:VEVENT',
+            f'UID:follow-up-{row.id}@social-tracker',
+            f'DTSTAMP:{_timestamp(row.created_at)}',
+            f'DTSTART;VALUE=DATE:{_date(row.due_date)}',
+            f'DTEND;VALUE=DATE:{_date(row.due_date + timedelta(days=1))}',
+            f'SUMMARY:{escape_text(f"Follow up with {row.name}: {row.topic}")}',
+            'TRANSP:TRANSPARENT',
+            f'URL:{url_for_relationship(row.relationship_id)}',
+            'END:VEVENT',
+        ])
+
+
+def generate_feed(window_start, window_end, url_for_event, url_for_relationship):
+    """Yields the feed as byte chunks, one per calendar component."""
+    yield _component(['BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODUCT_ID}', 'CALSCALE:GREGORIAN',
+                      'X-WR-CALNAME:Social Tracker'])
+    yield from _event_components(window_start, window_end, url_for_event)
+    yield from _follow_up_components(window_start, window_end, url_for_relationship)
+    yield _component(['END:VCALENDAR'])
+
+
+def _store(key, feed):
+    with _cache_lock:
+        _cache[key] = feed
+        _cache.move_to_end(key)
+        while len(_cache) > current_app.config.get('ICAL_CACHE_SIZE', 16):
+            _cache.popitem(last=False)
+
+
+def cached_feed(window_start, window_end, url_for_event, url_for_relationship):
+    """
+    The feed for a window as an iterable of bytes: the cached copy if the data
+    has not changed since it was built, otherwise a stream that fills the cache.
+    """
+    versions = current_versions()
+    key = (current_owner_id(), window_start, window_end, tuple(versions.get(kind, 0) for kind in FEED_KINDS))
+    with _cache_lock:
+        feed = _cache.get(key)
+        if feed is not None:
+            _cache.move_to_end(key)
+    if feed is not None:
+        return [feed]
+
+    def stream():
+        chunks = []
+        for chunk in generate_feed(window_start, window_end, url_for_event, url_for_relationship):
+            chunks.append(chunk)
+            yield chunk
+        _store(key, b''.join(chunks))
+
+    return stream()
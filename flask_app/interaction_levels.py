@@ -0,0 +1,94 @@
+"""
+Derived interaction levels.
+
+A relationship's interaction_level follows from its interaction history and
+last_contacted date:
+  * Not Contacted - no interactions and no last_contacted date
+  * New           - first contact within INTERACTION_LEVEL_NEW_DAYS
+  * Active        - at least INTERACTION_LEVEL_ACTIVE_MIN_INTERACTIONS interactions
+                    within INTERACTION_LEVEL_ACTIVE_DAYS, or last_contacted within it
+  * Dormant       - everyone else
+The classification is one statement: interactions are aggregated per
+relationship, joined to relationships and only rows whose level changes are
+updated. The (relationship_id, date) index on interaction_history serves the aggregate.
+Archived interactions (see flask_app/archive.py) are older than both windows, so
+only their first date is read, from the archive rows.
+"""
+from datetime import datetime, UTC, timedelta
+
+from flask import current_app
+from sqlalchemy import case, cast, func, literal, select, union_all, update
+from sqlalchemy.orm import aliased
+
+from flask_app import app, db
+from flask_app.models.models import Relationship, InteractionArchive, InteractionHistory, interaction_level_enum
+from flask_app.owners import per_owner
+
+
+def _classified_levels(relationship_ids, now):
+    config = current_app.config
+    new_since = now - timedelta(days=config.get('INTERACTION_LEVEL_NEW_DAYS', 30))
+    active_since = now - timedelta(days=config.get('INTERACTION_LEVEL_ACTIVE_DAYS', 90))
+    active_min = config.get('INTERACTION_LEVEL_ACTIVE_MIN_INTERACTIONS', 1)
+
+    live = select(
+        InteractionHistory.relationship_id.label('relationship_id'),
+        func.min(InteractionHistory.date).label('first_date'),
+        func.sum(case((InteractionHistory.date >= active_since, 1), else_=0)).label('recent'),
+    ).group_by(InteractionHistory.relationship_id)
+    archived = select(
+        InteractionArchive.relationship_id, func.min(InteractionArchive.first_date), literal(0)
+    ).group_by(InteractionArchive.relationship_id)
+    if relationship_ids is not None:
+        live = live.where(InteractionHistory.relationship_id.in_(relationship_ids))
+        archived = archived.where(InteractionArchive.relationship_id.in_(relationship_ids))
+    both = union_all(live, archived).subquery()
+    history = select(
+        both.c.relationship_id, func.min(both.c.first_date).label('first_date'),
+        func.sum(both.c.recent).label('recent'),
+    ).group_by(both.c.relationship_id).subquery()
+
+    relationship = aliased(Relationship)
+    first_contact = func.coalesce(history.c.first_date, relationship.last_contacted)
+    level = case(
+        (first_contact.is_(None), 'Not Contacted'),
+        (first_contact >= new_since, 'New'),
+        (func.coalesce(history.c.recent, 0) >= active_min, 'Active'),
+        (relationship.last_contacted >= active_since, 'Active'),
+        else_='Dormant',
+    )
+    classified = select(relationship.id.label('id'), cast(level, interaction_level_enum).label('level')) \
+        .outerjoin(history, history.c.relationship_id == relationship.id)
+    if relationship_ids is not None:
+        classified = classified.where(relationship.id.in_(relationship_ids))
+    return classified.subquery()
+
+
+def classify_interaction_levels(relationship_ids=None, now=None):
+    """
+    Updates interaction_level for the given relationship ids (a list or a
+    SELECT of ids), or for everyone. Does not commit. Returns the number changed.
+    """
+    classified = _classified_levels(relationship_ids, now or datetime.now(UTC))
+    return db.session.execute(
+        update(Relationship)
+        .where(Relationship.id == classified.c.id, Relationship.interaction_level != classified.c.level)
+        .values(interaction_level=classified.c.level)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def classify_all_interaction_levels_logic(now=None):
+    """Reclassifies every relationship. Returns the number whose level changed."""
+    print("Classifying interaction levels...")
+    changed = classify_interaction_levels(now=now)
+    db.session.commit()
+    print(f"Interaction level classification complete: {changed} relationship(s) changed.")
+    return changed
+
+
+@app.cli.command("classify-interaction-levels")
+@per_owner
+def classify_interaction_levels_command():
+    """CLI wrapper for the interaction level classification."""
+    classify_all_interaction_levels_logic()
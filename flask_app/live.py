@@ -0,0 +1,323 @@
+"""
+Live updates for pages that stay open, pushed as server-sent events.
+
+Every flush or bulk statement that bumps the data versions (see
+flask_app/versioning.py) produces a notification: the global data version it
+commits with and the cards it changed, each a page element ('relationship' on
+the dashboard, 'event' on the events list) with its id and changed fields. An
+id of None means a set-based statement may have changed any card of that kind.
+Callers that know which rows a bulk statement touches can name them with the
+LIVE_ROWS execution option to keep the notification precise.
+
+Notifications are delivered when the transaction commits. By default they go
+to the subscribers of this process only. With LIVE_NOTIFY_CHANNEL set on
+Postgres, they are sent with NOTIFY inside the transaction instead, and every
+worker process LISTENs on the channel, so clients of all workers see every
+write. Each client has a bounded queue; a client that falls behind gets a
+'resync' event instead of an unbounded backlog.
+
+The client compares the version in the 'hello' event sent on every (re)connect
+with the version it last saw, so changes made while it was disconnected make it
+reload the page rather than going unnoticed.
+
+Versions are per owner (see flask_app/owners.py), so every notification names
+its owner and a client only receives those of the owner it connected as.
+"""
+import json
+import logging
+import queue
+import select as select_module
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, select
+
+from flask_app import app, db
+from flask_app.owners import current_owner_id
+from flask_app.versioning import GLOBAL_KIND, cascaded_tables, current_versions
+
+logger = logging.getLogger(__name__)
+
+# Execution option naming the rows of a bulk statement: (card, ids, fields).
+LIVE_ROWS = 'live_rows'
+
+# Tables whose rows are shown on a relationship card, with their relationship id attribute.
+RELATIONSHIP_CHILDREN = {
+    'follow_ups': 'relationship_id',
+    'interaction_history': 'relationship_id',
+    'relationship_tags': 'relationship_id',
+    'relationship_connection_types': 'relationship_id',
+    'social_media': 'relationship_id',
+}
+
+# Cards whose content a set-based statement on a table may change.
+TABLE_CARDS = {
+    'relationships': ('relationship',),
+    'events': ('event',),
+    'event_participants': ('event',),
+    **{table: ('relationship',) for table in RELATIONSHIP_CHILDREN},
+}
+
+# Postgres drops NOTIFY payloads of 8000 bytes or more.
+_MAX_NOTIFY_PAYLOAD = 7500
+
+RESYNC = object()
+
+
+class Subscriber:
+    def __init__(self, size, owner_id):
+        self.queue = queue.Queue(maxsize=size)
+        self.owner_id = owner_id
+        self.overflowed = False
+
+
+class Broadcaster:
+    """In-process fan-out of notifications to the connected clients."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, size, max_clients, owner_id):
+        """A new Subscriber to the notifications of `owner_id`, or None when max_clients are already connected."""
+        with self._lock:
+            if len(self._subscribers) >= max_clients:
+                return None
+            subscriber = Subscriber(size, owner_id)
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, message):
+        """Queues `message` for the subscribers of its owner; RESYNC goes to everyone."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if message is not RESYNC and message['owner'] != subscriber.owner_id:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                subscriber.overflowed = True
+
+
+broadcaster = Broadcaster()
+
+
+def _card(card, card_id, fields=(), deleted=False):
+    return {'card': card, 'id': None if card_id is None else str(card_id), 'fields': sorted(fields),
+            'deleted': deleted}
+
+
+def _table_cards(table_names):
+    return [_card(card, None) for card in sorted({card for name in table_names for card in TABLE_CARDS.get(name, ())})]
+
+
+def _flush_cards(session):
+    """Cards changed by the objects of the pending flush."""
+    cards = {}
+
+    def add(card, card_id, fields, deleted=False):
+        key = (card, card_id)
+        if key in cards:
+            cards[key]['fields'] = sorted(set(cards[key]['fields']) | set(fields))
+            cards[key]['deleted'] |= deleted
+        else:
+            cards[key] = _card(card, card_id, fields, deleted)
+
+    wide = set()
+    for objects, operation in ((session.new, 'insert'), (session.deleted, 'delete'), (session.dirty, 'update')):
+        for obj in objects:
+            state = inspect(obj)
+            table = state.mapper.local_table.name
+            if operation == 'update':
+                fields = [attr.key for attr in state.attrs if attr.history.has_changes()]
+                if not fields:
+                    continue
+            else:
+                fields = []
+            if table == 'relationships':
+                add('relationship', obj.id, fields, deleted=operation == 'delete')
+                if operation == 'delete':
+                    wide |= cascaded_tables(table) - set(RELATIONSHIP_CHILDREN)
+            elif table == 'events':
+                # Participants are a collection of the event, so they show up as a changed field.
+                add('event', obj.id, fields, deleted=operation == 'delete')
+            elif table in RELATIONSHIP_CHILDREN and getattr(obj, RELATIONSHIP_CHILDREN[table]) is not None:
+                add('relationship', getattr(obj, RELATIONSHIP_CHILDREN[table]), [table])
+    return list(cards.values()) + _table_cards(wide)
+
+
+def _notify(session, cards):
+    """Queues a notification for the commit of `session`, or sends it with NOTIFY inside the transaction."""
+    version = session.info.get('data_version')
+    if version is None or version == session.info.get('live_version') and not cards:
+        return
+    session.info['live_version'] = version
+    owner_id = current_owner_id()
+    message = {'owner': owner_id, 'version': version, 'changes': cards}
+    channel = current_app.config.get('LIVE_NOTIFY_CHANNEL')
+    if channel:
+        payload = json.dumps(message)
+        if len(payload) > _MAX_NOTIFY_PAYLOAD:
+            payload = json.dumps({'owner': owner_id, 'version': version, 'changes': _table_cards(
+                {'relationships' if card['card'] == 'relationship' else 'events' for card in cards}
+            )})
+        session.connection().execute(select(func.pg_notify(channel, payload)))
+    else:
+        session.info.setdefault('live_messages', []).append(message)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _notify_after_flush(session, flush_context):
+    # Registered after versioning's listener, so the flush's version bump has run.
+    if current_app.config.get('LIVE_UPDATES', True):
+        _notify(session, _flush_cards(session))
+
+
+def _notify_after_bulk_statement(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return None
+    # Runs ahead of versioning's listener, which bumps the versions while the statement is invoked here.
+    result = orm_execute_state.invoke_statement()
+    if current_app.config.get('LIVE_UPDATES', True):
+        rows = orm_execute_state.execution_options.get(LIVE_ROWS)
+        if rows is not None:
+            card, ids, fields = rows
+            cards = [_card(card, card_id, fields) for card_id in ids]
+        else:
+            table_name = getattr(getattr(orm_execute_state.statement, 'table', None), 'name', None)
+            tables = {table_name}
+            if orm_execute_state.is_delete:
+                tables |= cascaded_tables(table_name)
+            cards = _table_cards(tables)
+        _notify(orm_execute_state.session, cards)
+    return result
+
+
+event.listen(db.session, 'do_orm_execute', _notify_after_bulk_statement, insert=True)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_after_commit(session):
+    session.info.pop('live_version', None)
+    for message in session.info.pop('live_messages', ()):
+        broadcaster.publish(message)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('live_version', None)
+    session.info.pop('live_messages', None)
+
+
+class NotifyListener(threading.Thread):
+    """LISTENs on the notification channel and hands every payload to the broadcaster. One per process."""
+
+    def __init__(self, engine, channel):
+        super().__init__(name='live-notify-listener', daemon=True)
+        self.engine = engine
+        self.channel = channel
+
+    def run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Live update listener lost its connection; reconnecting.")
+            # Notifications sent while reconnecting are lost, so every client must resync.
+            broadcaster.publish(RESYNC)
+            time.sleep(5)
+
+    def _listen(self):
+        pooled = self.engine.raw_connection()
+        # Detached, so the connection doesn't count against the pool it came from.
+        pooled.detach()
+        connection = pooled.driver_connection
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while True:
+                if select_module.select([connection], [], [], 60) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notification = connection.notifies.pop(0)
+                    broadcaster.publish(json.loads(notification.payload))
+        finally:
+            pooled.close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _ensure_listener():
+    global _listener
+    channel = current_app.config.get('LIVE_NOTIFY_CHANNEL')
+    if not channel or _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = NotifyListener(db.engine, channel)
+            _listener.start()
+
+
+def page_version():
+    """The current owner's global data version a page is rendered at, for its live update client."""
+    return current_versions().get(GLOBAL_KIND, 0)
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream(subscriber, version, keepalive_seconds, stream_seconds):
+    try:
+        yield "retry: 5000\n\n"
+        yield _event('hello', {'version': version})
+        # Streams end after a while and the browser reconnects, so a worker is never held for good.
+        deadline = time.monotonic() + stream_seconds
+        while time.monotonic() < deadline:
+            try:
+                message = subscriber.queue.get(timeout=keepalive_seconds)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if message is RESYNC or subscriber.overflowed:
+                yield _event('resync', {})
+                return
+            yield _event('change', message)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+@app.route('/live')
+def live_updates():
+    """Server-sent events with the changes committed from now on, see the module docstring."""
+    config = current_app.config
+    if not config.get('LIVE_UPDATES', True):
+        return "Live updates are disabled.", 404
+    _ensure_listener()
+    subscriber = broadcaster.subscribe(
+        config.get('LIVE_QUEUE_SIZE', 100), config.get('LIVE_MAX_CLIENTS', 50), current_owner_id()
+    )
+    if subscriber is None:
+        return "Too many live update clients.", 503
+    # Subscribed before reading the version, so a commit in between is sent rather than missed.
+    version = page_version()
+    response = current_app.response_class(
+        _stream(subscriber, version, config.get('LIVE_KEEPALIVE_SECONDS', 15), config.get('LIVE_STREAM_SECONDS', 300)),
+        mimetype='text/event-stream'
+    )
+    # A response that is never iterated (HEAD, or a client gone before the first chunk) never runs the
+    # stream's finally; closing the response releases the slot either way.
+    response.call_on_close(lambda: broadcaster.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,317 @@
+"""
+Local load generator with a mix of realistic traffic.
+
+`flask load-test` drives a running instance of the app (run.py, gunicorn,
+uvicorn asgi:app, ...) with simulated users. Each user repeatedly picks a
+scenario by weight and performs its requests, with its own cookie jar and no
+redirect following, so a POST is timed without the page it redirects to:
+  * dashboard           - GET /
+  * participant_search  - the participant picker: top attendees, then a name and a priority filter
+  * calendar            - GET /calendar, its events JSON and a month of the iCal feed
+  * relationship_edit   - GET the edit form, POST it back with a new goal
+  * log_interaction     - POST an interaction for a relationship
+  * add_follow_up       - POST a follow-up for a relationship
+Every concurrency level runs for the given duration. The report gives
+requests, error rate, throughput and p50/p95/p99 latency per route. Results
+can be written to JSON or CSV and compared with an earlier JSON export.
+
+Relationship ids and form contents are read from the app's database before the
+run starts. Seed it with `flask seed-demo`, and only point the tool at a
+database you can throw away: it writes to it.
+"""
+import csv
+import json
+import random
+import threading
+import time
+from datetime import datetime, UTC, timedelta
+from http.client import HTTPException
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+import click
+from sqlalchemy import select
+
+from flask_app import app, db
+from flask_app.models.models import (
+    Relationship, RelationshipConnectionType, RelationshipTag, SocialMedia, Platform, Tag, Event
+)
+
+DEFAULT_MIX = {'dashboard': 30, 'participant_search': 25, 'calendar': 15, 'relationship_edit': 10,
+               'log_interaction': 10, 'add_follow_up': 10}
+SAMPLE_SIZE = 200  # Relationships whose forms are loaded for the write scenarios.
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))]
+
+
+def _edit_form(row, ctypes, tags, accounts, platforms):
+    """The edit form of a relationship, as the browser would submit it unchanged."""
+    form = [('name', row.name), ('goal', row.goal or ''), ('execution_strategy', row.execution_strategy or ''),
+            ('priority', row.priority), ('interaction_level', row.interaction_level), ('notes', row.notes or ''),
+            ('follow_up_frequency', row.follow_up_frequency or '')]
+    form += [('connection_type_ids', str(ctype_id)) for ctype_id, _ in ctypes]
+    primary_ctype = next((ctype_id for ctype_id, is_primary in ctypes if is_primary), None)
+    if primary_ctype is not None:
+        form.append(('primary_connection_type', str(primary_ctype)))
+    form.append(('tags', ', '.join(name for name, _ in tags)))
+    form.append(('primary_tag_name', next((name for name, is_primary in tags if is_primary), '')))
+    # Handles and links are positional lists holding only the platforms that ask for them.
+    for position, (platform_name, handle, link, is_primary) in enumerate(accounts, start=1):
+        requires_handle, requires_link = platforms[platform_name]
+        form.append(('platform[]', platform_name))
+        if requires_handle:
+            form.append(('handle[]', handle or ''))
+        if requires_link:
+            form.append(('profile_link[]', link or ''))
+        if is_primary:
+            form.append(('is_primary', str(position)))
+    return form
+
+
+def load_dataset(sample_size=SAMPLE_SIZE, seed=0):
+    """Ids, name prefixes and edit forms the scenarios draw from."""
+    rng = random.Random(seed)
+    ids = db.session.scalars(select(Relationship.id)).all()
+    if not ids:
+        raise click.ClickException("The database has no relationships. Run 'flask seed-demo' first.")
+    sample = rng.sample(ids, k=min(sample_size, len(ids)))
+    platforms = {name: (requires_handle, requires_link) for name, requires_handle, requires_link in
+                 db.session.execute(select(Platform.name, Platform.requires_handle, Platform.requires_link))}
+
+    def grouped(statement):
+        groups = {}
+        for rel_id, *values in db.session.execute(statement):
+            groups.setdefault(rel_id, []).append(tuple(values))
+        return groups
+
+    ctypes = grouped(select(
+        RelationshipConnectionType.relationship_id, RelationshipConnectionType.connection_type_id,
+        RelationshipConnectionType.is_primary
+    ).where(RelationshipConnectionType.relationship_id.in_(sample)))
+    tags = grouped(select(RelationshipTag.relationship_id, Tag.name, RelationshipTag.is_primary).join(Tag)
+                   .where(RelationshipTag.relationship_id.in_(sample)))
+    accounts = grouped(select(
+        SocialMedia.relationship_id, Platform.name, SocialMedia.handle, SocialMedia.profile_link, SocialMedia.is_primary
+    ).join(Platform).where(SocialMedia.relationship_id.in_(sample)).order_by(SocialMedia.id))
+    forms = {
+        row.id: _edit_form(row, ctypes.get(row.id, []), tags.get(row.id, []), accounts.get(row.id, []), platforms)
+        for row in db.session.execute(select(
+            Relationship.id, Relationship.name, Relationship.goal, Relationship.execution_strategy,
+            Relationship.priority, Relationship.interaction_level, Relationship.notes, Relationship.follow_up_frequency
+        ).where(Relationship.id.in_(sample)))
+        if ctypes.get(row.id)  # The form requires a connection type.
+    }
+    names = db.session.scalars(select(Relationship.name).where(Relationship.id.in_(sample))).all()
+    event_dates = db.session.scalars(select(Event.start_date).where(Event.start_date.isnot(None))).all()
+    return {
+        'relationship_ids': [str(rel_id) for rel_id in sample],
+        'edit_forms': {str(rel_id): form for rel_id, form in forms.items()},
+        'name_prefixes': sorted({name[:3] for name in names if name}),
+        'months': sorted({(date.year, date.month) for date in event_dates}) or [(datetime.now(UTC).year, 1)],
+    }
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class VirtualUser:
+    """One simulated browser: a cookie jar plus the timings of its requests."""
+
+    def __init__(self, base_url, dataset, rng):
+        self.base_url = base_url.rstrip('/')
+        self.dataset = dataset
+        self.rng = rng
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect)
+        self.samples = []  # (route, seconds, ok)
+
+    def request(self, route, path, form=None):
+        data = urlencode(form).encode() if form is not None else None
+        started = time.perf_counter()
+        try:
+            with self.opener.open(Request(self.base_url + path, data=data), timeout=60) as response:
+                response.read()
+                ok = response.status < 400
+        except HTTPError as e:
+            ok = e.code < 400  # Redirects after a POST arrive here.
+            e.close()
+        except (URLError, OSError, HTTPException):
+            ok = False  # Includes streamed pages that broke off midway.
+        self.samples.append((route, time.perf_counter() - started, ok))
+
+    def relationship_id(self):
+        return self.rng.choice(self.dataset['relationship_ids'])
+
+    def dashboard(self):
+        self.request('GET /', '/')
+
+    def participant_search(self):
+        self.request('GET /api/relationships/search', '/api/relationships/search')
+        prefix = self.rng.choice(self.dataset['name_prefixes'] or ['a'])
+        self.request('GET /api/relationships/search', f'/api/relationships/search?q={quote(prefix)}')
+        priority = self.rng.choice(['Very High', 'High', 'Medium'])
+        self.request('GET /api/relationships/search',
+                     f'/api/relationships/search?q={quote(prefix)}&priority={quote(priority)}')
+
+    def calendar(self):
+        self.request('GET /calendar', '/calendar')
+        self.request('GET /api/calendar-events', '/api/calendar-events')
+        year, month = self.rng.choice(self.dataset['months'])
+        start = datetime(year, month, 1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        self.request('GET /calendar.ics', f'/calendar.ics?start={start:%Y-%m-%d}&end={end:%Y-%m-%d}')
+
+    def relationship_edit(self):
+        if not self.dataset['edit_forms']:
+            return self.dashboard()
+        rel_id, form = self.rng.choice(list(self.dataset['edit_forms'].items()))
+        self.request('GET /relationships/<id>/edit', f'/relationships/{rel_id}/edit')
+        form = [(key, f"Load test goal {self.rng.randint(1, 10 ** 6)}" if key == 'goal' else value)
+                for key, value in form]
+        self.request('POST /relationships/<id>/edit', f'/relationships/{rel_id}/edit', form)
+
+    def log_interaction(self):
+        rel_id = self.relationship_id()
+        self.request('POST /relationships/<id>/add_interaction', f'/relationships/{rel_id}/add_interaction', [
+            ('title', 'Load test check-in'), ('type', self.rng.choice(['comment', 'DM', 'email', 'call'])),
+            ('details', 'Logged by flask load-test.'),
+        ])
+
+    def add_follow_up(self):
+        rel_id = self.relationship_id()
+        due = datetime.now(UTC) + timedelta(days=self.rng.randint(1, 60))
+        self.request('POST /relationships/<id>/add_follow_up', f'/relationships/{rel_id}/add_follow_up',
+                     [('topic', 'Load test follow-up'), ('due_date', f'{due:%Y-%m-%d}')])
+
+    def run(self, mix, deadline, think_time):
+        scenarios, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            getattr(self, self.rng.choices(scenarios, weights)[0])()
+            if think_time:
+                time.sleep(self.rng.uniform(0, 2 * think_time))
+
+
+def summarize(samples, duration):
+    """Per-route and overall statistics of (route, seconds, ok) samples."""
+    by_route = {}
+    for route, seconds, ok in samples:
+        by_route.setdefault(route, []).append((seconds, ok))
+    by_route['ALL'] = [(seconds, ok) for _, seconds, ok in samples]
+    summary = {}
+    for route, timings in sorted(by_route.items()):
+        latencies = sorted(seconds * 1000 for seconds, _ in timings)
+        errors = sum(1 for _, ok in timings if not ok)
+        summary[route] = {
+            'requests': len(timings), 'errors': errors, 'error_rate': errors / len(timings) if timings else 0.0,
+            'throughput_rps': len(timings) / duration, 'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95), 'p99_ms': percentile(latencies, 0.99),
+        }
+    return summary
+
+
+def run_level(base_url, dataset, mix, concurrency, duration, think_time, seed):
+    """Runs `concurrency` users for `duration` seconds. Returns the route statistics."""
+    deadline = time.perf_counter() + duration
+    users = [VirtualUser(base_url, dataset, random.Random(seed * 1000 + i)) for i in range(concurrency)]
+    threads = [threading.Thread(target=user.run, args=(mix, deadline, think_time)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started  # Includes requests still in flight at the deadline.
+    return summarize([sample for user in users for sample in user.samples], elapsed)
+
+
+def _print_level(concurrency, routes):
+    print(f"\nConcurrency {concurrency}:")
+    print(f"  {'route':<44} {'reqs':>6} {'err%':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in routes.items():
+        print(f"  {route:<44} {stats['requests']:>6} {stats['error_rate'] * 100:>6.1f} "
+              f"{stats['throughput_rps']:>8.1f} {stats['p50_ms'] or 0:>8.1f} {stats['p95_ms'] or 0:>8.1f} "
+              f"{stats['p99_ms'] or 0:>8.1f}")
+
+
+def _print_comparison(results, baseline):
+    previous = {(level['concurrency'], route): stats
+                for level in baseline['levels'] for route, stats in level['routes'].items()}
+    print("\nCompared with the baseline (throughput, p95):")
+    for level in results['levels']:
+        for route, stats in level['routes'].items():
+            before = previous.get((level['concurrency'], route))
+            if not before or not before['throughput_rps'] or not before['p95_ms']:
+                continue
+            throughput = (stats['throughput_rps'] / before['throughput_rps'] - 1) * 100
+            p95 = (stats['p95_ms'] / before['p95_ms'] - 1) * 100
+            print(f"  c={level['concurrency']:<4} {route:<44} {throughput:>+7.1f}% req/s {p95:>+7.1f}% p95")
+
+
+def export_results(results, path):
+    """Writes the results as JSON, or as one CSV row per level and route if `path` ends in .csv."""
+    with open(path, 'w', newline='') as f:
+        if not path.endswith('.csv'):
+            json.dump(results, f, indent=2)
+            return
+        writer = csv.writer(f)
+        columns = ['requests', 'errors', 'error_rate', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms']
+        writer.writerow(['concurrency', 'route'] + columns)
+        for level in results['levels']:
+            for route, stats in level['routes'].items():
+                writer.writerow([level['concurrency'], route] + [stats[column] for column in columns])
+
+
+def load_test_logic(base_url, mix, levels, duration, think_time=0.0, seed=0, output=None, baseline=None):
+    print("Loading test data from the database...")
+    dataset = load_dataset(seed=seed)
+    print(f"Load testing {base_url} for {duration}s per level, mix {mix}...")
+    results = {'started_at': datetime.now(UTC).isoformat(), 'base_url': base_url, 'mix': mix,
+               'duration_s': duration, 'think_time_s': think_time, 'levels': []}
+    for concurrency in levels:
+        routes = run_level(base_url, dataset, mix, concurrency, duration, think_time, seed)
+        results['levels'].append({'concurrency': concurrency, 'routes': routes})
+        _print_level(concurrency, routes)
+    if baseline:
+        with open(baseline) as f:
+            _print_comparison(results, json.load(f))
+    if output:
+        export_results(results, output)
+        print(f"\nResults written to {output}.")
+    print("Load test complete.")
+    return results
+
+
+def _parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    if value:
+        mix = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in DEFAULT_MIX:
+                raise click.BadParameter(f"unknown scenario '{name}', choose from {', '.join(DEFAULT_MIX)}")
+            mix[name] = float(weight or 1)
+    return mix
+
+
+@app.cli.command("load-test")
+@click.option('--base-url', default='http://localhost:5001', show_default=True, help="The running app.")
+@click.option('--mix', help="Scenario weights, e.g. 'dashboard=50,calendar=20'. Defaults to "
+                            + ', '.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()) + '.')
+@click.option('--concurrency', default='1,10,25', show_default=True, help="Comma separated concurrency levels.")
+@click.option('--duration', default=30.0, show_default=True, help="Seconds per concurrency level.")
+@click.option('--think-time', default=0.0, show_default=True, help="Mean pause between scenarios, in seconds.")
+@click.option('--seed', default=0, show_default=True)
+@click.option('--output', help="Write the results to this .json or .csv file.")
+@click.option('--baseline', help="Earlier .json results to compare with.")
+def load_test_command(base_url, mix, concurrency, duration, think_time, seed, output, baseline):
+    """CLI wrapper for the load test."""
+    levels = [int(level) for level in concurrency.split(',') if level.strip()]
+    load_test_logic(base_url, _parse_mix(mix), levels, duration, think_time, seed, output, baseline)
@@ -2,38 +2,90 @@ import uuid
 from datetime import datetime, UTC, timedelta
 from flask_app import db
 from sqlalchemy import func
+from sqlalchemy.orm import declared_attr
 
+# Enums are native types on Postgres, created with the tables, and VARCHAR columns with a CHECK constraint on SQLite.
 priority_level_enum = db.Enum(
     'Very High', 'High', 'Medium', 'Low', 'Very Low',
     name='priority_level',
-    create_type=False
+    create_constraint=True
 )
 interaction_type_enum = db.Enum(
     'comment', 'DM', 'email', 'help', 'follow-up', 'meeting', 'call',
     name='interaction_type',
-    create_type=False
+    create_constraint=True
 )
 interaction_level_enum = db.Enum(
     'New', 'Active', 'Dormant', 'Not Contacted',
     name='interaction_level',
-    create_type=False
+    create_constraint=True
 )
 follow_up_status_enum = db.Enum(
     'pending', 'completed', 'cancelled',
     name='follow_up_status',
-    create_type=False
+    create_constraint=True
 )
 
+
+class UTCDateTime(db.TypeDecorator):
+    """
+    A timezone-aware timestamp on every backend. SQLite has no timestamp type, so
+    values are stored there as naive UTC text (which sorts and compares in time
+    order) and read back as aware UTC datetimes, as Postgres returns them.
+    """
+    impl = db.DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name == 'sqlite' and isinstance(value, datetime) and value.tzinfo is not None:
+            return value.astimezone(UTC).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if dialect.name == 'sqlite' and value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=UTC)
+        return value
+
+
+def _current_owner_id():
+    from flask_app.owners import current_owner_id
+    return current_owner_id()
+
+
+class User(db.Model):
+    """A person using the installation; every owned row belongs to one (see flask_app/owners.py)."""
+    __tablename__ = 'users'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(150), unique=True, nullable=False)
+    created_at = db.Column(UTCDateTime, default=lambda: datetime.now(UTC))
+
+    def __repr__(self):
+        return f'<User {self.name}>'
+
+
+class OwnedMixin:
+    """Rows scoped to one user. New rows default to the current owner."""
+
+    @declared_attr
+    def owner_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False,
+                         default=_current_owner_id)
+
+
 event_participants = db.Table('event_participants',
-                              db.Column('event_id', db.Integer, db.ForeignKey('events.id'), primary_key=True),
-                              db.Column('relationship_id', db.Uuid(as_uuid=True), db.ForeignKey('relationships.id'),
-                                        primary_key=True)
+                              db.Column('event_id', db.Integer, db.ForeignKey('events.id', ondelete='CASCADE'),
+                                        primary_key=True),
+                              db.Column('relationship_id', db.Uuid(as_uuid=True),
+                                        db.ForeignKey('relationships.id', ondelete='CASCADE'), primary_key=True),
+                              # The primary key leads with event_id; a relationship's events need their own index.
+                              db.Index('ix_event_participants_relationship_id_event_id', 'relationship_id', 'event_id')
                               )
 
 
 class RelationshipConnectionType(db.Model):
     __tablename__ = 'relationship_connection_types'
-    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id'), primary_key=True)
+    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                primary_key=True)
     connection_type_id = db.Column(db.Integer, db.ForeignKey('connection_types.id'), primary_key=True)
     is_primary = db.Column(db.Boolean, default=False, nullable=False)
     relationship = db.relationship('Relationship', back_populates='connection_type_associations')
@@ -42,22 +94,24 @@ class RelationshipConnectionType(db.Model):
 
 class RelationshipTag(db.Model):
     __tablename__ = 'relationship_tags'
-    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id'), primary_key=True)
+    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                primary_key=True)
     tag_id = db.Column(db.Integer, db.ForeignKey('tags.id'), primary_key=True)
     is_primary = db.Column(db.Boolean, default=False, nullable=False)
     relationship = db.relationship('Relationship', back_populates='tag_associations')
     tag = db.relationship('Tag', back_populates='relationship_associations')
 
 
-class Event(db.Model):
+class Event(OwnedMixin, db.Model):
     __tablename__ = 'events'
+    __table_args__ = (db.Index('ix_events_owner_id_start_date', 'owner_id', 'start_date'),)
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     details = db.Column(db.Text, nullable=True)
-    start_date = db.Column(db.DateTime(timezone=True), nullable=True)
-    end_date = db.Column(db.DateTime(timezone=True), nullable=True)
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(UTC),
+    start_date = db.Column(UTCDateTime, nullable=True)
+    end_date = db.Column(UTCDateTime, nullable=True)
+    created_at = db.Column(UTCDateTime, default=lambda: datetime.now(UTC))
+    updated_at = db.Column(UTCDateTime, default=lambda: datetime.now(UTC),
                            onupdate=lambda: datetime.now(UTC))
     priority = db.Column(priority_level_enum, nullable=False, default='Medium')
 
@@ -70,7 +124,7 @@ class Event(db.Model):
     learnings = db.Column(db.Text, nullable=True)
 
     participants = db.relationship('Relationship', secondary=event_participants, back_populates='events',
-                                   lazy='dynamic')
+                                   lazy='dynamic', passive_deletes=True)
 
     @property
     def calendar_end_date(self):
@@ -90,10 +144,11 @@ class Event(db.Model):
         return f'<Event {self.title}>'
 
 
-class ConnectionType(db.Model):
+class ConnectionType(OwnedMixin, db.Model):
     __tablename__ = 'connection_types'
+    __table_args__ = (db.UniqueConstraint('owner_id', 'name'),)
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
     priority_rating = db.Column(db.Float, default=0.0, nullable=False, server_default='0.0')
     relationship_associations = db.relationship('RelationshipConnectionType', back_populates='connection_type',
                                                 cascade="all, delete-orphan")
@@ -102,26 +157,36 @@ class ConnectionType(db.Model):
         return f'<ConnectionType {self.name}>'
 
 
-class Tag(db.Model):
+class Tag(OwnedMixin, db.Model):
     __tablename__ = 'tags'
+    __table_args__ = (
+        db.UniqueConstraint('owner_id', 'name'),
+        db.Index('ix_tags_owner_id_priority_rating', 'owner_id', 'priority_rating'),
+        db.Index('ix_tags_owner_id_last_used_at', 'owner_id', 'last_used_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
     priority_rating = db.Column(db.Float, default=0.0, nullable=False, server_default='0.0')
+    last_used_at = db.Column(UTCDateTime, nullable=True)
     relationship_associations = db.relationship('RelationshipTag', back_populates='tag', cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<Tag {self.name}>'
 
 
-class Relationship(db.Model):
+class Relationship(OwnedMixin, db.Model):
     __tablename__ = 'relationships'
+    __table_args__ = (
+        db.Index('ix_relationships_owner_id_name', 'owner_id', 'name'),
+        db.Index('ix_relationships_owner_id_priority', 'owner_id', 'priority'),
+    )
     id = db.Column(db.Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = db.Column(db.String(100), nullable=False)
     goal = db.Column(db.String(255))
     execution_strategy = db.Column(db.String(255))
-    last_contacted = db.Column(db.DateTime(timezone=True))
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(UTC))
-    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(UTC),
+    last_contacted = db.Column(UTCDateTime)
+    created_at = db.Column(UTCDateTime, default=lambda: datetime.now(UTC))
+    updated_at = db.Column(UTCDateTime, default=lambda: datetime.now(UTC),
                            onupdate=lambda: datetime.now(UTC))
     notes = db.Column(db.Text)
     follow_up_frequency = db.Column(db.String(50), nullable=True)
@@ -129,15 +194,22 @@ class Relationship(db.Model):
     priority = db.Column(priority_level_enum, nullable=False, default='Medium')
     interaction_level = db.Column(interaction_level_enum, nullable=False, default='Not Contacted')
 
+    # Child rows are removed by ON DELETE CASCADE; passive_deletes keeps the ORM from loading them first.
     connection_type_associations = db.relationship('RelationshipConnectionType', back_populates='relationship',
-                                                   cascade="all, delete-orphan")
-    tag_associations = db.relationship('RelationshipTag', back_populates='relationship', cascade="all, delete-orphan")
+                                                   cascade="all, delete-orphan", passive_deletes=True,
+                                                   order_by="RelationshipConnectionType.connection_type_id")
+    tag_associations = db.relationship('RelationshipTag', back_populates='relationship', cascade="all, delete-orphan",
+                                       passive_deletes=True, order_by="RelationshipTag.tag_id")
     interactions = db.relationship('InteractionHistory', back_populates='relationship', cascade="all, delete-orphan",
-                                   order_by="desc(InteractionHistory.date)")
-    social_media = db.relationship('SocialMedia', back_populates='relationship', cascade="all, delete-orphan")
-    events = db.relationship('Event', secondary=event_participants, back_populates='participants', lazy='dynamic')
+                                   order_by="desc(InteractionHistory.date)", passive_deletes=True)
+    social_media = db.relationship('SocialMedia', back_populates='relationship', cascade="all, delete-orphan",
+                                   passive_deletes=True, order_by="SocialMedia.id")
+    events = db.relationship('Event', secondary=event_participants, back_populates='participants', lazy='dynamic',
+                             passive_deletes=True)
     follow_ups = db.relationship('FollowUp', back_populates='relationship', cascade="all, delete-orphan",
-                                 order_by="FollowUp.due_date")
+                                 order_by="FollowUp.due_date", passive_deletes=True)
+    health = db.relationship('RelationshipHealth', back_populates='relationship', uselist=False,
+                             cascade="all, delete-orphan", passive_deletes=True)
 
     @property
     def connection_type(self):
@@ -158,15 +230,20 @@ class Relationship(db.Model):
         return next_follow_up
 
 
-class FollowUp(db.Model):
+class FollowUp(OwnedMixin, db.Model):
     __tablename__ = 'follow_ups'
+    __table_args__ = (
+        db.Index('ix_follow_ups_owner_id_status_due_date', 'owner_id', 'status', 'due_date'),
+        db.Index('ix_follow_ups_relationship_id_due_date', 'relationship_id', 'due_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id'), nullable=False)
+    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                nullable=False)
     topic = db.Column(db.String(255), nullable=False)
-    due_date = db.Column(db.DateTime(timezone=True), nullable=False)
+    due_date = db.Column(UTCDateTime, nullable=False)
     status = db.Column(follow_up_status_enum, nullable=False, default='pending')
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(UTC))
-    completed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    created_at = db.Column(UTCDateTime, default=lambda: datetime.now(UTC))
+    completed_at = db.Column(UTCDateTime, nullable=True)
 
     relationship = db.relationship('Relationship', back_populates='follow_ups')
 
@@ -174,10 +251,11 @@ class FollowUp(db.Model):
         return f'<FollowUp {self.topic} on {self.due_date}>'
 
 
-class Platform(db.Model):
+class Platform(OwnedMixin, db.Model):
     __tablename__ = 'platforms'
+    __table_args__ = (db.UniqueConstraint('owner_id', 'name'),)
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
     priority_rating = db.Column(db.Float, nullable=False, default=0.0, server_default='0.0')
     requires_handle = db.Column(db.Boolean, nullable=False, default=True, server_default='true')
     requires_link = db.Column(db.Boolean, nullable=False, default=True, server_default='true')
@@ -194,25 +272,188 @@ class Platform(db.Model):
 class SocialMedia(db.Model):
     __tablename__ = 'social_media'
     id = db.Column(db.Integer, primary_key=True)
-    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id'), nullable=False)
+    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                nullable=False)
     platform_id = db.Column(db.Integer, db.ForeignKey('platforms.id'), nullable=False)
     handle = db.Column(db.String(100), nullable=True)
     profile_link = db.Column(db.String(255), nullable=True)
     is_primary = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(UTC))
+    created_at = db.Column(UTCDateTime, default=lambda: datetime.now(UTC))
     relationship = db.relationship('Relationship', back_populates='social_media')
     platform = db.relationship('Platform', back_populates='social_media_accounts')
 
 
-class InteractionHistory(db.Model):
+class InteractionHistory(OwnedMixin, db.Model):
     __tablename__ = 'interaction_history'
+    __table_args__ = (
+        db.Index('ix_interaction_history_relationship_id_date', 'relationship_id', 'date'),
+        db.Index('ix_interaction_history_owner_id_date', 'owner_id', 'date'),
+        # SQLite would otherwise reuse the ids of archived interactions, which then collide on restore.
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
-    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id'), nullable=False)
-    date = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(UTC))
+    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                nullable=False)
+    # The partition key on Postgres (see flask_app/archive.py).
+    date = db.Column(UTCDateTime, nullable=False, default=lambda: datetime.now(UTC))
     title = db.Column(db.String(255), nullable=False, server_default="Untitled Interaction")
     details = db.Column(db.Text, nullable=True)
     platform = db.Column(db.String(50), nullable=True)
 
     type = db.Column(interaction_type_enum, nullable=False)
 
-    relationship = db.relationship('Relationship', back_populates='interactions')
\ No newline at end of file
+    relationship = db.relationship('Relationship', back_populates='interactions')
+
+
+class RelationshipEdit(db.Model):
+    """
+    One change the user made to a contact, with the edit form or a bulk edit,
+    for the relationship timeline (see flask_app/timeline.py). fields names
+    what changed, comma-separated; derived columns such as last_contacted and
+    interaction_level are never recorded.
+    """
+    __tablename__ = 'relationship_edits'
+    __table_args__ = (db.Index('ix_relationship_edits_relationship_id_edited_at', 'relationship_id', 'edited_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                nullable=False)
+    edited_at = db.Column(UTCDateTime, nullable=False, default=lambda: datetime.now(UTC))
+    fields = db.Column(db.String(255), nullable=False)
+
+    def __repr__(self):
+        return f'<RelationshipEdit {self.relationship_id} {self.fields}>'
+
+
+class InteractionArchive(OwnedMixin, db.Model):
+    """
+    The interactions of one relationship in one month, moved out of
+    interaction_history by `flask archive-interactions` (see flask_app/archive.py).
+    payload is their zlib-compressed JSON, newest first.
+    """
+    __tablename__ = 'interaction_archive'
+    __table_args__ = (
+        db.Index('ix_interaction_archive_relationship_id_period_start', 'relationship_id', 'period_start'),
+        db.Index('ix_interaction_archive_owner_id_period_start', 'owner_id', 'period_start'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    first_date = db.Column(UTCDateTime, nullable=False)
+    last_date = db.Column(UTCDateTime, nullable=False)
+    interaction_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(UTCDateTime, nullable=False, default=lambda: datetime.now(UTC))
+
+    def __repr__(self):
+        return f'<InteractionArchive {self.relationship_id} {self.period_start}: {self.interaction_count}>'
+
+
+class RelationshipHealth(OwnedMixin, db.Model):
+    __tablename__ = 'relationship_health'
+    __table_args__ = (db.Index('ix_relationship_health_owner_id_urgency', 'owner_id', 'urgency'),)
+    relationship_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    urgency = db.Column(db.Float, nullable=False)
+    days_since_contact = db.Column(db.Float, nullable=True)
+    computed_at = db.Column(UTCDateTime, nullable=False)
+
+    relationship = db.relationship('Relationship', back_populates='health')
+
+    def __repr__(self):
+        return f'<RelationshipHealth {self.relationship_id}={self.score:.1f}>'
+
+
+class InteractionRollup(OwnedMixin, db.Model):
+    """Interaction counts per owner, day/week bucket, type, platform and the relationship's current priority."""
+    __tablename__ = 'interaction_rollups'
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True,
+                         default=_current_owner_id)
+    bucket = db.Column(db.String(10), primary_key=True)  # 'day' or 'week'
+    bucket_start = db.Column(db.Date, primary_key=True)
+    type = db.Column(interaction_type_enum, primary_key=True)
+    platform = db.Column(db.String(50), primary_key=True, default='', server_default='')
+    priority = db.Column(priority_level_enum, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<InteractionRollup {self.bucket} {self.bucket_start} {self.type}={self.count}>'
+
+
+class DataVersion(OwnedMixin, db.Model):
+    __tablename__ = 'data_versions'
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True,
+                         default=_current_owner_id)
+    kind = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<DataVersion {self.kind}={self.version}>'
+
+
+class DuplicateCandidate(OwnedMixin, db.Model):
+    """A pair of relationships that may be the same person, waiting for review (relationship_a_id < b)."""
+    __tablename__ = 'duplicate_candidates'
+    __table_args__ = (
+        db.UniqueConstraint('relationship_a_id', 'relationship_b_id'),
+        db.Index('ix_duplicate_candidates_owner_id_status_score', 'owner_id', 'status', 'score'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    relationship_a_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                  nullable=False)
+    relationship_b_id = db.Column(db.Uuid(as_uuid=True), db.ForeignKey('relationships.id', ondelete='CASCADE'),
+                                  nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    reasons = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', server_default='pending')  # or 'dismissed'
+    created_at = db.Column(UTCDateTime, default=lambda: datetime.now(UTC))
+
+    relationship_a = db.relationship('Relationship', foreign_keys=[relationship_a_id])
+    relationship_b = db.relationship('Relationship', foreign_keys=[relationship_b_id])
+
+    def __repr__(self):
+        return f'<DuplicateCandidate {self.relationship_a_id}~{self.relationship_b_id}={self.score:.2f}>'
+
+
+class ChangeLogEntry(OwnedMixin, db.Model):
+    """
+    One committed change, in commit order. entity is the table name; a NULL
+    entity_id means a set-based statement may have changed any of its rows.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_entity_entity_id_seq', 'entity', 'entity_id', 'seq'),
+        db.Index('ix_change_log_owner_id_seq', 'owner_id', 'seq'),
+    )
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    entity = db.Column(db.String(50), nullable=False)
+    entity_id = db.Column(db.String(80), nullable=True)
+    operation = db.Column(db.String(10), nullable=False)  # 'insert', 'update', 'delete' or 'compacted'
+    changed_at = db.Column(UTCDateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<ChangeLogEntry {self.seq} {self.operation} {self.entity}:{self.entity_id}>'
+
+
+class SearchDocument(OwnedMixin, db.Model):
+    """
+    The searchable text of one interaction or one event. The full-text index
+    over it is backend specific and created with the table, see flask_app/search.py.
+    """
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        db.CheckConstraint('(interaction_id IS NULL) <> (event_id IS NULL)', name='one_source'),
+        # interaction_history is partitioned on Postgres, where its key includes date and can't be referenced;
+        # a trigger deletes the document there instead (see flask_app/archive.py).
+        db.ForeignKeyConstraint(['interaction_id'], ['interaction_history.id'], ondelete='CASCADE')
+        .ddl_if(callable_=lambda ddl, target, bind, dialect=None, **kw: dialect.name != 'postgresql'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    interaction_id = db.Column(db.Integer, nullable=True, unique=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id', ondelete='CASCADE'), nullable=True, unique=True)
+    title = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False, default='')
+
+    def __repr__(self):
+        return f'<SearchDocument {self.id} interaction={self.interaction_id} event={self.event_id}>'
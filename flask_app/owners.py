@@ -0,0 +1,185 @@
+"""
+Owner scoping for installations shared by several people.
+
+Every row of an owned table (models.OwnedMixin) belongs to one user. A
+request's owner is the user named by the OWNER_HEADER request header, which an
+authenticating proxy in front of the app sets; without OWNER_HEADER every
+request belongs to DEFAULT_OWNER, so single-user installs keep working as
+before. CLI commands decorated with @per_owner run once per user, or only for
+the one given with --owner.
+
+Scoping is applied in one place: every ORM SELECT, INSERT ... SELECT, UPDATE
+and DELETE run through db.session gets a with_loader_criteria() filter on
+owner_id for all owned entities, including aliased ones and subqueries, and
+new rows take the current owner from the column default. Statements that
+bypass it (Core tables, connection.execute) use owned() or scoped() themselves.
+The indexes of owned tables lead with owner_id, so a user's queries stay within
+that user's index ranges no matter how many others share the database.
+
+With OWNER_ROW_LEVEL_SECURITY on Postgres, every transaction also sets
+app.owner_id, and `flask enable-row-level-security` installs policies that
+enforce the same filter in the database.
+"""
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+import click
+from flask import abort, current_app, g, request
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import with_loader_criteria
+
+from flask_app import app, db
+from flask_app.models.models import OwnedMixin, User
+
+OWNER_SETTING = 'app.owner_id'
+
+_lock = threading.Lock()
+_owner_ids = {}  # user name -> id; users are never renamed.
+
+
+def owner_id_for(name, create=False):
+    """The id of the user called `name`, created first if `create` is set. None if there is no such user."""
+    owner_id = _owner_ids.get(name)
+    if owner_id is not None:
+        return owner_id
+    # Own connection on the primary: this can run while db.session is flushing.
+    with _lock, db.engine.begin() as connection:
+        owner_id = connection.scalar(select(User.id).where(User.name == name))
+        if owner_id is None and create:
+            owner_id = connection.scalar(insert(User).values(name=name).returning(User.id))
+    if owner_id is not None:
+        _owner_ids[name] = owner_id
+    return owner_id
+
+
+def current_owner_id():
+    """The id of the user the current request or command acts for."""
+    if 'owner_id' not in g:
+        g.owner_id = owner_id_for(current_app.config.get('DEFAULT_OWNER', 'default'), create=True)
+    return g.owner_id
+
+
+@contextmanager
+def use_owner(owner_id):
+    """Acts for `owner_id` inside the block. Versions and caches read before are for the previous owner."""
+    previous = g.pop('owner_id', None)
+    g.pop('data_versions', None)
+    g.owner_id = owner_id
+    try:
+        yield owner_id
+    finally:
+        g.pop('data_versions', None)
+        g.pop('owner_id', None)
+        if previous is not None:
+            g.owner_id = previous
+
+
+def owner_criteria(owner_id):
+    return with_loader_criteria(OwnedMixin, lambda cls: cls.owner_id == owner_id, include_aliases=True)
+
+
+def scoped(statement, owner_id=None):
+    """`statement` limited to the rows of `owner_id` (default: the current owner), for execution outside db.session."""
+    return statement.options(owner_criteria(current_owner_id() if owner_id is None else owner_id))
+
+
+def owned(table, owner_id=None):
+    """WHERE criterion limiting a Core `table` to the rows of `owner_id` (default: the current owner)."""
+    return table.c.owner_id == (current_owner_id() if owner_id is None else owner_id)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _scope_to_owner(orm_execute_state):
+    if orm_execute_state.execution_options.get('all_owners'):
+        return
+    if orm_execute_state.is_select or orm_execute_state.is_insert or orm_execute_state.is_update \
+            or orm_execute_state.is_delete:
+        orm_execute_state.statement = orm_execute_state.statement.options(owner_criteria(current_owner_id()))
+
+
+@event.listens_for(db.session, 'after_begin')
+def _set_row_level_owner(db_session, transaction, connection):
+    if current_app.config.get('OWNER_ROW_LEVEL_SECURITY') and connection.dialect.name == 'postgresql':
+        # Transaction-local, like SET LOCAL, so a pooled connection never keeps another user's id.
+        connection.exec_driver_sql("SELECT set_config(%s, %s, true)", (OWNER_SETTING, str(current_owner_id())))
+
+
+@app.before_request
+def _resolve_request_owner():
+    header = current_app.config.get('OWNER_HEADER')
+    if not header:
+        # Resolved up front, so no transaction is open if the default user has to be created.
+        current_owner_id()
+        return
+    name = request.headers.get(header, '').strip()
+    if not name:
+        abort(401)
+    owner_id = owner_id_for(name, create=current_app.config.get('OWNER_AUTO_CREATE', True))
+    if owner_id is None:
+        abort(403)
+    g.owner_id = owner_id
+
+
+def per_owner(command):
+    """Runs a CLI command for every user in turn, or with --owner NAME for that user only."""
+    @click.option('--owner', 'owner_name', default=None, help="Run for this user only (default: every user).")
+    @wraps(command)
+    def wrapper(*args, owner_name=None, **kwargs):
+        if owner_name:
+            owner_id = owner_id_for(owner_name)
+            if owner_id is None:
+                raise click.ClickException(f"No user called {owner_name!r}.")
+            owners = [(owner_id, owner_name)]
+        else:
+            owners = db.session.execute(
+                select(User.id, User.name).order_by(User.id).execution_options(all_owners=True)
+            ).all()
+            if not owners:
+                owners = [(current_owner_id(), current_app.config.get('DEFAULT_OWNER', 'default'))]
+        for owner_id, name in owners:
+            if len(owners) > 1:
+                click.echo(f"== {name}")
+            with use_owner(owner_id):
+                command(*args, **kwargs)
+    return wrapper
+
+
+# Tables with an owner_id column get a policy; the others are reached through an owned row.
+def _owned_tables():
+    return sorted(mapper.local_table.name for mapper in db.Model.registry.mappers
+                  if issubclass(mapper.class_, OwnedMixin))
+
+
+def enable_row_level_security_logic():
+    """Creates the owner policy on every owned table (Postgres only)."""
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException("Row-level security needs Postgres.")
+    with db.engine.begin() as connection:
+        for table in _owned_tables():
+            connection.exec_driver_sql(f'ALTER TABLE "{table}" ENABLE ROW LEVEL SECURITY')
+            # FORCE applies the policy to the table owner too, which is usually the app's own role.
+            connection.exec_driver_sql(f'ALTER TABLE "{table}" FORCE ROW LEVEL SECURITY')
+            connection.exec_driver_sql(f'DROP POLICY IF EXISTS owner_isolation ON "{table}"')
+            connection.exec_driver_sql(
+                f'CREATE POLICY owner_isolation ON "{table}" '
+                f"USING (owner_id = nullif(current_setting('{OWNER_SETTING}', true), '')::integer) "
+                f"WITH CHECK (owner_id = nullif(current_setting('{OWNER_SETTING}', true), '')::integer)"
+            )
+            print(f"  Row-level security enabled on {table}")
+    print("Set OWNER_ROW_LEVEL_SECURITY = True so requests set their owner.")
+
+
+@app.cli.command("enable-row-level-security")
+def enable_row_level_security_command():
+    """CLI wrapper for installing the owner policies."""
+    enable_row_level_security_logic()
+
+
+@app.cli.command("create-user")
+@click.argument('name')
+def create_user_command(name):
+    """Adds a user; with OWNER_HEADER set, requests naming them in that header act for them."""
+    if owner_id_for(name) is not None:
+        raise click.ClickException(f"A user called {name!r} already exists.")
+    print(f"Created user {name!r} with id {owner_id_for(name, create=True)}.")
@@ -0,0 +1,237 @@
+"""
+Read models for display-only pages and API responses.
+
+List views only show a few fields, so instead of ORM instances (identity map
+entries, attribute history, lazy collections) they get compact immutable rows
+filled from column-only SELECTs. Values the templates used to derive per row,
+such as the primary connection type, primary tag, next due date, participant
+or user counts, are computed once while the rows are built.
+"""
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+from typing import NamedTuple
+
+from sqlalchemy import case, func, select
+
+from flask_app import db
+from flask_app.models.models import (
+    Relationship, SocialMedia, Platform, ConnectionType, Tag, Event, FollowUp,
+    RelationshipConnectionType, RelationshipTag, event_participants
+)
+
+PRIORITY_ORDER = {'Very High': 5, 'High': 4, 'Medium': 3, 'Low': 2, 'Very Low': 1}
+
+
+class SocialLink(NamedTuple):
+    platform_name: str
+    handle: str
+    profile_link: str
+    is_primary: bool
+
+
+class RelationshipCard(NamedTuple):
+    id: object
+    name: str
+    priority: str
+    interaction_level: str
+    goal: str
+    last_contacted: object
+    next_contact_due: object
+    connection_type: str  # Same rule as Relationship.connection_type.
+    primary_tag: str
+    tags: tuple
+    social_media: tuple
+
+
+class EventCard(NamedTuple):
+    id: int
+    title: str
+    priority: str
+    start_date: object
+    end_date: object
+    is_potential: bool
+    importance_score: float
+    participant_count: int
+
+    @property
+    def calendar_end_date(self):
+        """Exclusive end date, as Event.calendar_end_date."""
+        return self.end_date + timedelta(days=1) if self.end_date else None
+
+
+class PlatformRow(NamedTuple):
+    id: int
+    name: str
+    priority_rating: float
+    registered_users: int
+
+
+def next_due_dates():
+    """Subquery of the earliest pending follow-up due date per relationship."""
+    return select(
+        FollowUp.relationship_id, func.min(FollowUp.due_date).label('next_due_date')
+    ).where(FollowUp.status == 'pending').group_by(FollowUp.relationship_id).subquery()
+
+
+def display_connection_type():
+    """Correlated SQL equivalent of Relationship.connection_type."""
+    return func.coalesce(
+        select(ConnectionType.name).join(RelationshipConnectionType)
+        .where(RelationshipConnectionType.relationship_id == Relationship.id)
+        .order_by(RelationshipConnectionType.is_primary.desc(), RelationshipConnectionType.connection_type_id)
+        .limit(1).scalar_subquery(),
+        'N/A'
+    )
+
+
+def dashboard_stats():
+    """Header counts and connection type filter options, computed before the cards are streamed."""
+    total, active, high_priority = db.session.execute(select(
+        func.count(),
+        func.coalesce(func.sum(case((Relationship.interaction_level == 'Active', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Relationship.priority.in_(['High', 'Very High']), 1), else_=0)), 0),
+    ).select_from(Relationship)).one()
+    connection_types = db.session.scalars(select(display_connection_type()).select_from(Relationship).distinct()).all()
+    return {'total': total, 'active': active, 'high_priority': high_priority, 'connection_types': connection_types}
+
+
+def _grouped(statement):
+    """{relationship_id: [row, ...]} for rows whose first column is the relationship id."""
+    rows = db.session.execute(statement).all()
+    return {rel_id: list(group) for rel_id, group in groupby(rows, key=itemgetter(0))}
+
+
+def _cards(rows):
+    ids = [row.id for row in rows]
+    connection_types = _grouped(
+        select(RelationshipConnectionType.relationship_id, ConnectionType.name, RelationshipConnectionType.is_primary)
+        .join(ConnectionType).where(RelationshipConnectionType.relationship_id.in_(ids))
+        .order_by(RelationshipConnectionType.relationship_id, RelationshipConnectionType.connection_type_id)
+    )
+    tags = _grouped(
+        select(RelationshipTag.relationship_id, Tag.name, RelationshipTag.is_primary)
+        .join(Tag).where(RelationshipTag.relationship_id.in_(ids))
+        .order_by(RelationshipTag.relationship_id, RelationshipTag.tag_id)
+    )
+    social_media = _grouped(
+        select(SocialMedia.relationship_id, Platform.name, SocialMedia.handle, SocialMedia.profile_link,
+               SocialMedia.is_primary)
+        .join(Platform).where(SocialMedia.relationship_id.in_(ids))
+        .order_by(SocialMedia.relationship_id, SocialMedia.id)
+    )
+    for row in rows:
+        types = connection_types.get(row.id, ())
+        primary_type = next((name for _, name, is_primary in types if is_primary), None)
+        row_tags = tags.get(row.id, ())
+        yield RelationshipCard(
+            id=row.id, name=row.name, priority=row.priority, interaction_level=row.interaction_level, goal=row.goal,
+            last_contacted=row.last_contacted, next_contact_due=row.next_due_date,
+            connection_type=primary_type or (types[0][1] if types else "N/A"),
+            primary_tag=next((name for _, name, is_primary in row_tags if is_primary), None),
+            tags=tuple(name for _, name, _ in row_tags),
+            social_media=tuple(SocialLink(*link[1:]) for link in social_media.get(row.id, ())),
+        )
+
+
+def relationship_cards(batch_size=200, ids=None):
+    """
+    Yields a RelationshipCard for every relationship (or those in `ids`),
+    earliest pending follow-up first and then by priority. Rows are read
+    batch_size at a time and each batch's children are fetched with one query
+    per collection. Nothing runs before the first row is requested, so a
+    streamed template can take it as is.
+    """
+    next_due = next_due_dates()
+    priority_ordering = case(PRIORITY_ORDER, value=Relationship.priority, else_=0).desc()
+    criteria = [Relationship.id.in_(ids)] if ids is not None else []
+    result = db.session.execute(
+        select(
+            Relationship.id, Relationship.name, Relationship.priority, Relationship.interaction_level,
+            Relationship.goal, Relationship.last_contacted, next_due.c.next_due_date
+        ).outerjoin(next_due, Relationship.id == next_due.c.relationship_id).where(*criteria)
+        .order_by(next_due.c.next_due_date.asc().nullslast(), priority_ordering)
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        yield from _cards(rows)
+
+
+def event_cards_statement(*criteria, order_by):
+    """The SELECT behind event_cards(), one EventCard per row."""
+    counts = select(
+        event_participants.c.event_id, func.count().label('participant_count')
+    ).group_by(event_participants.c.event_id).subquery()
+    return select(
+        Event.id, Event.title, Event.priority, Event.start_date, Event.end_date, Event.is_potential,
+        Event.importance_score, func.coalesce(counts.c.participant_count, 0)
+    ).outerjoin(counts, counts.c.event_id == Event.id).where(*criteria).order_by(order_by)
+
+
+def event_cards(*criteria, order_by, batch_size=200):
+    """Yields an EventCard, with its participant count, for every event matching `criteria`. Lazy as well."""
+    result = db.session.execute(
+        event_cards_statement(*criteria, order_by=order_by).execution_options(yield_per=batch_size)
+    )
+    for row in result:
+        yield EventCard(*row)
+
+
+def calendar_event(event, url):
+    """An EventCard in the format FullCalendar consumes."""
+    event_data = {
+        'title': event.title,
+        'start': event.start_date.isoformat() if event.start_date else None,
+        'end': event.calendar_end_date.isoformat() if event.calendar_end_date else None,
+        'url': url,
+        'allDay': True  # Assume all-day events for now
+    }
+    if event.is_potential:
+        event_data['className'] = 'event-potential'
+        event_data['color'] = 'var(--color-warning-bg)'
+        event_data['textColor'] = 'var(--color-warning-text)'
+    else:
+        event_data['color'] = 'var(--accent-primary)'
+        event_data['textColor'] = 'var(--text-inverted)'
+    return event_data
+
+
+def relationship_search(search_term=None, priority=None, tag_id=None, ctype_id=None):
+    """
+    SELECT of (id, name) for the participant picker: relationships matching the
+    filters by name, or the 10 most frequent event attendees when none is set.
+    """
+    if not any([search_term, priority, tag_id, ctype_id]):
+        return select(Relationship.id, Relationship.name).outerjoin(event_participants) \
+            .group_by(Relationship.id, Relationship.name) \
+            .order_by(func.count(event_participants.c.event_id).desc()).limit(10)
+
+    query = select(Relationship.id, Relationship.name)
+    if search_term:
+        query = query.where(Relationship.name.ilike(f'%{search_term}%'))
+    if priority:
+        query = query.where(Relationship.priority == priority)
+    if tag_id:
+        query = query.join(RelationshipTag).where(RelationshipTag.tag_id == tag_id)
+    if ctype_id:
+        query = query.join(RelationshipConnectionType).where(RelationshipConnectionType.connection_type_id == ctype_id)
+    return query.order_by(Relationship.name).limit(50)
+
+
+def recent_tags(limit=15):
+    """SELECT of the names of the most recently used tags."""
+    return select(Tag.name).where(Tag.last_used_at.isnot(None)).order_by(Tag.last_used_at.desc()).limit(limit)
+
+
+def popular_tags(limit=15):
+    """SELECT of the names of the best rated tags."""
+    return select(Tag.name).order_by(Tag.priority_rating.desc()).limit(limit)
+
+
+def platform_rows():
+    """Every platform with its number of registered accounts, best rated first."""
+    return [PlatformRow(*row) for row in db.session.execute(
+        select(Platform.id, Platform.name, Platform.priority_rating, func.count(SocialMedia.id))
+        .outerjoin(SocialMedia).group_by(Platform.id, Platform.name, Platform.priority_rating)
+        .order_by(Platform.priority_rating.desc())
+    )]
@@ -0,0 +1,96 @@
+"""
+Process-local cache of reference data: platforms, connection types and tags.
+
+Form pages need these small tables on every GET, and the save paths look rows
+up by name. Each kind is cached as a sorted list plus a name -> row map of
+immutable rows, and rebuilt when its data version has moved (writes from any
+worker, see flask_app/versioning.py) or when it is older than
+REFERENCE_DATA_TTL_SECONDS, which bounds staleness from writes that bypass the
+session. Rows are plain tuples, so a cached row never ends up in a session.
+Every owner has its own lists (see flask_app/owners.py).
+"""
+import threading
+import time
+from typing import NamedTuple
+
+from flask import current_app
+from sqlalchemy import select
+
+from flask_app import db
+from flask_app.models.models import Platform, ConnectionType, Tag
+from flask_app.owners import current_owner_id
+from flask_app.versioning import current_versions
+
+
+class PlatformRef(NamedTuple):
+    id: int
+    name: str
+    requires_handle: bool
+    requires_link: bool
+
+
+class ConnectionTypeRef(NamedTuple):
+    id: int
+    name: str
+
+
+class TagRef(NamedTuple):
+    id: int
+    name: str
+
+
+class ReferenceList(NamedTuple):
+    rows: list  # Sorted by name.
+    by_name: dict
+    by_id: dict
+
+
+_LOADERS = {
+    'platforms': lambda: select(Platform.id, Platform.name, Platform.requires_handle, Platform.requires_link),
+    'connection_types': lambda: select(ConnectionType.id, ConnectionType.name),
+    'tags': lambda: select(Tag.id, Tag.name),
+}
+_ROW_TYPES = {'platforms': PlatformRef, 'connection_types': ConnectionTypeRef, 'tags': TagRef}
+
+_lock = threading.Lock()
+_cache = {}  # (owner id, kind) -> (version, loaded at, ReferenceList)
+
+
+def _load(kind):
+    row_type = _ROW_TYPES[kind]
+    rows = [row_type(*row) for row in db.session.execute(_LOADERS[kind]())]
+    rows.sort(key=lambda row: row.name)
+    return ReferenceList(rows, {row.name: row for row in rows}, {row.id: row for row in rows})
+
+
+def _get(kind):
+    version = current_versions().get(kind, 0)
+    ttl = current_app.config.get('REFERENCE_DATA_TTL_SECONDS', 300)
+    key = (current_owner_id(), kind)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == version and time.monotonic() - cached[1] < ttl:
+        return cached[2]
+    with _lock:
+        cached = _cache.get(key)
+        if cached is None or cached[0] != version or time.monotonic() - cached[1] >= ttl:
+            cached = (version, time.monotonic(), _load(kind))
+            _cache[key] = cached
+    return cached[2]
+
+
+def platforms():
+    return _get('platforms')
+
+
+def connection_types():
+    return _get('connection_types')
+
+
+def tags():
+    return _get('tags')
+
+
+def platforms_data():
+    """The platform rules the relationship forms' JavaScript needs."""
+    return [{"name": p.name, "requires_handle": p.requires_handle, "requires_link": p.requires_link}
+            for p in platforms().rows]
@@ -0,0 +1,119 @@
+"""
+Routes read-only requests to a read replica and applies per-route statement timeouts.
+
+With REPLICA_DATABASE_URI set, the app gets a 'replica' bind next to the primary
+database. RoutingSession sends a request's SELECTs to the replica when the
+request is a GET/HEAD (or its endpoint is listed in REPLICA_ENDPOINTS, for
+read-only POSTs such as exports) and is not listed in PRIMARY_ENDPOINTS.
+Flushes, INSERT/UPDATE/DELETE statements and everything outside a request
+(CLI commands, backfills) always use the primary.
+
+Read-your-writes: a commit made while handling a request marks the browser
+session, and for REPLICA_READ_YOUR_WRITES_SECONDS afterwards its requests read
+from the primary, so the page shown after a POST/redirect includes the write.
+
+Data versions read on the replica are not cached in process memory (see
+flask_app/versioning.py): an ETag must never run ahead of the data the replica
+has served under it.
+
+To try it locally, run two databases (for example a Postgres primary with a
+streaming replica, or two Postgres instances where the second is restored from
+a dump of the first), set REPLICA_DATABASE_URI to the second one and watch
+`flask replica-status`.
+"""
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, event, text
+
+from flask_app import app
+
+REPLICA_BIND = 'replica'
+_PRIMARY_UNTIL = '_primary_until'
+
+
+def _route_to_replica():
+    """Whether the current request may read from the replica. Decided once per request."""
+    if 'use_replica' not in g:
+        config = current_app.config
+        endpoint = request.endpoint
+        g.use_replica = (
+            REPLICA_BIND in config.get('SQLALCHEMY_BINDS', {})
+            and (request.method in ('GET', 'HEAD') or endpoint in config.get('REPLICA_ENDPOINTS', ()))
+            and endpoint not in config.get('PRIMARY_ENDPOINTS', ())
+            and session.get(_PRIMARY_UNTIL, 0) <= time.time()
+        )
+    return g.use_replica
+
+
+def reads_from_replica():
+    """Whether SELECTs in the current context go to the replica."""
+    return has_request_context() and _route_to_replica()
+
+
+class RoutingSession(Session):
+    """db.session: SELECTs of replica-routed requests go to the replica bind, everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            read_only = clause is None or isinstance(clause, Select) and clause._for_update_arg is None
+            if self._flushing or not read_only:
+                # Later reads in the same transaction must see the rows just written.
+                self.info['wrote'] = True
+            elif not self.info.get('wrote') and reads_from_replica():
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _read_your_writes(db_session):
+    # Without a replica there is nothing to pin, and no reason to set a session cookie on every write.
+    wrote = db_session.info.pop('wrote', False)
+    if wrote and has_request_context() and REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        session[_PRIMARY_UNTIL] = time.time() + current_app.config.get('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _unpin_after_rollback(db_session):
+    db_session.info.pop('wrote', None)
+
+
+def statement_timeout_ms():
+    """The statement timeout of the current request's endpoint, in milliseconds, or None."""
+    if not has_request_context():
+        return None
+    config = current_app.config
+    return config.get('ENDPOINT_STATEMENT_TIMEOUTS_MS', {}).get(request.endpoint, config.get('STATEMENT_TIMEOUT_MS'))
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _apply_statement_timeout(db_session, transaction, connection):
+    timeout = statement_timeout_ms()
+    if timeout and connection.dialect.name == 'postgresql':
+        # SET LOCAL ends with the transaction, so pooled connections don't keep it.
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+def replica_status_logic():
+    """Prints the sum of the global data versions of all owners on the primary and the replica. Returns how many
+    writes the replica is behind."""
+    if REPLICA_BIND not in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        print("No replica configured; set REPLICA_DATABASE_URI.")
+        return None
+    engines = current_app.extensions['sqlalchemy'].engines
+    query = text("SELECT coalesce(sum(version), 0) FROM data_versions WHERE kind = 'global'")
+    versions = {}
+    for name, engine in (('primary', engines[None]), ('replica', engines[REPLICA_BIND])):
+        with engine.connect() as connection:
+            versions[name] = connection.scalar(query) or 0
+        print(f"  {name:<8} global data version {versions[name]}")
+    lag = versions['primary'] - versions['replica']
+    print("Replica is up to date." if lag <= 0 else f"Replica is {lag} write(s) behind.")
+    return lag
+
+
+@app.cli.command("replica-status")
+def replica_status_command():
+    """CLI wrapper for the replica lag check."""
+    replica_status_logic()
@@ -0,0 +1,188 @@
+"""
+Interaction analytics rollups.
+
+interaction_rollups holds interaction counts per (day|week bucket, type,
+platform, priority). The interaction routes keep it current with small
+count deltas, so analytics never has to group interaction_history live.
+Priority is the relationship's *current* priority: when it changes, that
+relationship's counts are moved from the old priority to the new one.
+Archived interactions (see flask_app/archive.py) stay counted.
+"""
+from collections import Counter
+from datetime import datetime, UTC, timedelta
+
+from sqlalchemy import delete, func, select
+
+from flask_app import app, db
+from flask_app.archive import iter_archived
+from flask_app.dialects import upsert
+from flask_app.models.models import InteractionArchive, InteractionHistory, InteractionRollup, Relationship
+from flask_app.owners import current_owner_id, per_owner
+
+BUCKETS = ('day', 'week')
+DIMENSIONS = {
+    'type': InteractionRollup.type,
+    'platform': InteractionRollup.platform,
+    'priority': InteractionRollup.priority,
+}
+
+
+def _utc_date(value):
+    if value is None:
+        value = datetime.now(UTC)
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC)
+    return value.date()
+
+
+def bucket_start(value, bucket):
+    """The first day of the bucket containing `value`; weeks start on Monday."""
+    day = _utc_date(value)
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _platform_key(platform):
+    return (platform or '').strip()[:50]
+
+
+def add_interaction_delta(deltas, date, type_, platform, priority, delta):
+    """Adds one interaction's contribution to every bucket of a Counter of pending deltas."""
+    for bucket in BUCKETS:
+        deltas[(bucket, bucket_start(date, bucket), type_, _platform_key(platform), priority)] += delta
+
+
+def apply_rollup_deltas(deltas):
+    """Applies count deltas of the current owner with a single executemany upsert."""
+    owner_id = current_owner_id()
+    rows = [
+        {'owner_id': owner_id, 'bucket': bucket, 'bucket_start': start, 'type': type_, 'platform': platform,
+         'priority': priority, 'count': delta}
+        for (bucket, start, type_, platform, priority), delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+    table = InteractionRollup.__table__
+    stmt = upsert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.name for c in table.primary_key.columns],
+        set_={'count': table.c.count + stmt.excluded['count']}
+    )
+    db.session.execute(stmt, rows)
+
+
+def record_interaction(interaction, priority, delta=1):
+    """Counts (delta=1) or uncounts (delta=-1) one interaction."""
+    deltas = Counter()
+    add_interaction_delta(deltas, interaction.date, interaction.type, interaction.platform, priority, delta)
+    apply_rollup_deltas(deltas)
+
+
+def move_relationship_priority(relationship_id, old_priority, new_priority):
+    """Moves a relationship's interaction counts to its new priority."""
+    if old_priority == new_priority:
+        return
+    rows = db.session.execute(
+        select(InteractionHistory.date, InteractionHistory.type, InteractionHistory.platform)
+        .where(InteractionHistory.relationship_id == relationship_id)
+    ).all()
+    rows += [(i.date, i.type, i.platform)
+             for i, in iter_archived(criteria=[InteractionArchive.relationship_id == relationship_id])]
+    deltas = Counter()
+    for date, type_, platform in rows:
+        add_interaction_delta(deltas, date, type_, platform, old_priority, -1)
+        add_interaction_delta(deltas, date, type_, platform, new_priority, 1)
+    apply_rollup_deltas(deltas)
+
+
+def _with_archived(query, archived_criteria):
+    """
+    (date, type, platform, priority) of the interactions `query` selects, then
+    of the archived ones in the archive rows matching `archived_criteria`.
+    """
+    yield from db.session.execute(query.execution_options(yield_per=10_000))
+    for interaction, priority in iter_archived(Relationship.priority, criteria=archived_criteria):
+        yield interaction.date, interaction.type, interaction.platform, priority
+
+
+def _shift_relationships(selection, new_priority):
+    query = select(
+        InteractionHistory.date, InteractionHistory.type, InteractionHistory.platform, Relationship.priority
+    ).join(Relationship, Relationship.id == InteractionHistory.relationship_id).where(
+        InteractionHistory.relationship_id.in_(selection)
+    )
+    archived_criteria = [Relationship.id == InteractionArchive.relationship_id,
+                         InteractionArchive.relationship_id.in_(selection)]
+    if new_priority is not None:
+        query = query.where(Relationship.priority != new_priority)
+        archived_criteria.append(Relationship.priority != new_priority)
+    deltas = Counter()
+    for date, type_, platform, priority in _with_archived(query, archived_criteria):
+        add_interaction_delta(deltas, date, type_, platform, priority, -1)
+        if new_priority is not None:
+            add_interaction_delta(deltas, date, type_, platform, new_priority, 1)
+    apply_rollup_deltas(deltas)
+
+
+def uncount_relationships(selection):
+    """Removes the interactions of the relationships whose ids `selection` (a SELECT) returns."""
+    _shift_relationships(selection, None)
+
+
+def move_relationships_priority(selection, new_priority):
+    """Moves the interaction counts of the selected relationships to `new_priority`. Call before the UPDATE."""
+    _shift_relationships(selection, new_priority)
+
+
+def query_rollups(bucket='week', dimension=None, since=None):
+    """
+    Reads interaction counts from the rollups only.
+    Returns (bucket_starts, {dimension_value: [count per bucket]}); the key is 'total' without a dimension.
+    """
+    columns = [InteractionRollup.bucket_start]
+    if dimension:
+        columns.append(DIMENSIONS[dimension])
+    query = select(*columns, func.sum(InteractionRollup.count)).where(
+        InteractionRollup.bucket == bucket, InteractionRollup.count != 0
+    )
+    if since:
+        query = query.where(InteractionRollup.bucket_start >= bucket_start(since, bucket))
+    query = query.group_by(*columns).order_by(InteractionRollup.bucket_start)
+
+    starts, series = [], {}
+    for row in db.session.execute(query):
+        start, count = row[0], row[-1]
+        key = (row[1] or 'Unspecified') if dimension else 'total'
+        if not starts or starts[-1] != start:
+            starts.append(start)
+        values = series.setdefault(key, [])
+        values.extend([0] * (len(starts) - len(values)))
+        values[len(starts) - 1] += count
+    for values in series.values():
+        values.extend([0] * (len(starts) - len(values)))
+    return starts, series
+
+
+def rebuild_interaction_rollups_logic():
+    """Recomputes every rollup row of the current owner from interaction_history and the archive."""
+    print("Rebuilding interaction rollups...")
+    db.session.execute(delete(InteractionRollup))
+    rows = _with_archived(
+        select(InteractionHistory.date, InteractionHistory.type, InteractionHistory.platform, Relationship.priority)
+        .join(Relationship, Relationship.id == InteractionHistory.relationship_id),
+        [Relationship.id == InteractionArchive.relationship_id]
+    )
+    deltas = Counter()
+    for date, type_, platform, priority in rows:
+        add_interaction_delta(deltas, date, type_, platform, priority, 1)
+    apply_rollup_deltas(deltas)
+    db.session.commit()
+    print(f"Rollup rebuild complete: {len(deltas)} rows.")
+
+
+@app.cli.command("rebuild-interaction-rollups")
+@per_owner
+def rebuild_interaction_rollups_command():
+    """CLI wrapper for the rollup backfill/rebuild."""
+    rebuild_interaction_rollups_logic()
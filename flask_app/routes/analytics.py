@@ -0,0 +1,34 @@
+from datetime import datetime, UTC, timedelta
+
+from flask import render_template, request
+
+from flask_app import app
+from flask_app.rollups import DIMENSIONS, query_rollups
+from flask_app.versioning import conditional_get
+
+
+@app.route('/analytics')
+@conditional_get('interactions', 'relationships')
+def view_analytics():
+    """Shows weekly interaction volume by type, platform and priority, read from the rollups."""
+    weeks = min(request.args.get('weeks', 12, type=int), 104)
+    since = datetime.now(UTC) - timedelta(weeks=weeks - 1)
+
+    week_starts, totals = query_rollups('week', since=since)
+    breakdowns = {}
+    for dimension in DIMENSIONS:
+        starts, series = query_rollups('week', dimension, since=since)
+        # Align every breakdown to the buckets of the totals.
+        positions = {start: i for i, start in enumerate(starts)}
+        breakdowns[dimension] = {
+            key: [values[positions[start]] if start in positions else 0 for start in week_starts]
+            for key, values in sorted(series.items(), key=lambda item: -sum(item[1]))
+        }
+
+    return render_template(
+        'analytics.html',
+        weeks=weeks,
+        week_starts=week_starts,
+        totals=totals.get('total', []),
+        breakdowns=breakdowns
+    )
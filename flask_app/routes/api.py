@@ -1,89 +1,308 @@
-from flask import jsonify, request, url_for
-from sqlalchemy import func
-from sqlalchemy.orm import joinedload
+from datetime import datetime, UTC
+
+from flask import current_app, jsonify, request, url_for
+from sqlalchemy import func, select
 
 from flask_app import app, db
-from flask_app.models.models import Tag, Relationship, RelationshipTag, RelationshipConnectionType, event_participants, \
-    Event
+from flask_app.models.models import Tag, Relationship, Event, RelationshipHealth, ChangeLogEntry
+from flask_app.bulk import bulk_edit_relationships, count_relationships, delete_relationships, relationship_filter, \
+    event_participant_selection, log_interactions
+from flask_app.changelog import read_changes
+from flask_app.graph import METRICS, get_coattendance_graph
+from flask_app.read_models import calendar_event, event_cards, popular_tags, recent_tags, relationship_search
+from flask_app.rollups import BUCKETS, DIMENSIONS, query_rollups
+from flask_app.search import search
+from flask_app.tag_index import TOP_K, get_tag_index, record_tag_use
+from flask_app.timeline import timeline_page
+from flask_app.versioning import conditional_get
 
 
 @app.route('/api/tags/recent')
+@conditional_get('tags')
 def get_recent_tags():
-    """Returns the 15 most recently used tags based on priority rating."""
-    tags = Tag.query.order_by(Tag.priority_rating.desc()).limit(15).all()
-    return jsonify([{'name': tag.name} for tag in tags])
+    """Returns the 15 most recently used tags."""
+    return jsonify([{'name': name} for name in db.session.scalars(recent_tags())])
 
 
 @app.route('/api/tags/popular')
+@conditional_get('tags')
 def get_popular_tags():
     """Returns the 15 most popular tags based on priority rating."""
-    tags = Tag.query.order_by(Tag.priority_rating.desc()).limit(15).all()
-    return jsonify([{'name': tag.name} for tag in tags])
+    return jsonify([{'name': name} for name in db.session.scalars(popular_tags())])
+
+
+@app.route('/api/tags/autocomplete')
+def autocomplete_tags():
+    """Returns the best tags starting with ?q=, ranked by priority rating and recent use."""
+    prefix = request.args.get('q', '').strip().lower()
+    limit = min(request.args.get('limit', TOP_K, type=int), TOP_K)
+    if not prefix:
+        return jsonify([])
+    return jsonify([{'name': name} for name in get_tag_index().complete(prefix, limit)])
 
 
 @app.route('/api/relationships/search')
+@conditional_get('relationships', 'events')
 def search_relationships():
     """
     Searches and filters relationships.
     If no filters are active, it returns the top 10 most frequent event attendees.
     """
-    query = Relationship.query
-
-    # Get query parameters from the request
-    search_term = request.args.get('q')
-    priority = request.args.get('priority')
-    tag_id = request.args.get('tag_id')
-    ctype_id = request.args.get('ctype_id')
-
-    is_any_filter_active = any([search_term, priority, tag_id, ctype_id])
-
-    if search_term:
-        query = query.filter(Relationship.name.ilike(f'%{search_term}%'))
-    if priority:
-        query = query.filter(Relationship.priority == priority)
-    if tag_id:
-        query = query.join(RelationshipTag).filter(RelationshipTag.tag_id == tag_id)
-    if ctype_id:
-        query = query.join(RelationshipConnectionType).filter(RelationshipConnectionType.connection_type_id == ctype_id)
-
-    if is_any_filter_active:
-        relationships = query.order_by(Relationship.name).limit(50).all()
-    else:
-        # Default to showing the most frequent attendees
-        top_attendees = db.session.query(
-            Relationship,
-            func.count(event_participants.c.event_id).label('event_count')
-        ).outerjoin(event_participants).group_by(Relationship.id).order_by(
-            func.count(event_participants.c.event_id).desc()
-        ).limit(10).all()
-        relationships = [rel for rel, count in top_attendees]
-
+    relationships = db.session.execute(relationship_search(
+        search_term=request.args.get('q'),
+        priority=request.args.get('priority'),
+        tag_id=request.args.get('tag_id'),
+        ctype_id=request.args.get('ctype_id')
+    )).all()
     return jsonify([{'id': str(rel.id), 'name': rel.name} for rel in relationships])
 
 
+@app.route('/api/search')
+@conditional_get('interactions', 'events', 'relationships')
+def search_notes_api():
+    """
+    Full-text search over interaction and event notes. ?q= is the query, ?limit= caps the results.
+    Titles and snippets are HTML with the matched terms in <mark> tags; everything else is escaped.
+    """
+    terms = request.args.get('q', '').strip()
+    if not terms:
+        return jsonify({'error': 'q is required.'}), 400
+    limit = max(1, min(request.args.get('limit', current_app.config.get('SEARCH_RESULTS_LIMIT', 50), type=int), 200))
+    return jsonify([{
+        'kind': result.kind,
+        'id': result.id,
+        'title': str(result.title),
+        'snippet': str(result.snippet),
+        'rank': result.rank,
+        'date': result.date.isoformat() if result.date else None,
+        'relationship': {'id': str(result.relationship_id), 'name': result.relationship_name}
+        if result.relationship_id else None,
+        'url': url_for('get_interaction', interaction_id=result.id) if result.kind == 'interaction'
+        else url_for('get_event', event_id=result.id)
+    } for result in search(terms, limit)])
+
+
 @app.route('/api/calendar-events')
+@conditional_get('events')
 def get_calendar_events():
     """
     Returns all events in a format that FullCalendar can consume.
     """
-    events = Event.query.all()
-    event_list = []
-    for event in events:
-        event_data = {
-            'title': event.title,
-            'start': event.start_date.isoformat() if event.start_date else None,
-            'end': event.calendar_end_date.isoformat() if event.calendar_end_date else None,
-            'url': url_for('get_event', event_id=event.id),
-            'allDay': True  # Assume all-day events for now
-        }
-        if event.is_potential:
-            event_data['className'] = 'event-potential'
-            event_data['color'] = 'var(--color-warning-bg)'
-            event_data['textColor'] = 'var(--color-warning-text)'
-        else:
-            event_data['color'] = 'var(--accent-primary)'
-            event_data['textColor'] = 'var(--text-inverted)'
-
-        event_list.append(event_data)
-
-    return jsonify(event_list)
\ No newline at end of file
+    return jsonify([calendar_event(event, url_for('get_event', event_id=event.id))
+                    for event in event_cards(order_by=Event.id)])
+
+
+@app.route('/api/relationships/health')
+@conditional_get('health', 'relationships')
+def get_relationship_health_ranking():
+    """
+    Returns relationships ranked from the stored health scores.
+    `order=urgency` (default) puts high-priority cold contacts first; `order=coldest` sorts by score alone.
+    """
+    limit = max(1, min(request.args.get('limit', 20, type=int), 500))
+    order = request.args.get('order', 'urgency')
+    ordering = RelationshipHealth.score.asc() if order == 'coldest' else RelationshipHealth.urgency.desc()
+
+    rows = db.session.execute(select(
+        RelationshipHealth.relationship_id, RelationshipHealth.score, RelationshipHealth.urgency,
+        RelationshipHealth.days_since_contact, RelationshipHealth.computed_at, Relationship.name, Relationship.priority
+    ).join(Relationship, Relationship.id == RelationshipHealth.relationship_id).order_by(ordering).limit(limit)).all()
+
+    return jsonify([{
+        'id': str(row.relationship_id),
+        'name': row.name,
+        'priority': row.priority,
+        'score': round(row.score, 1),
+        'urgency': round(row.urgency, 2),
+        'days_since_contact': round(row.days_since_contact, 1) if row.days_since_contact is not None else None,
+        'computed_at': row.computed_at.isoformat(),
+        'url': url_for('get_relationship', relationship_id=row.relationship_id)
+    } for row in rows])
+
+
+@app.route('/api/analytics/interactions')
+@conditional_get('interactions', 'relationships')
+def get_interaction_analytics():
+    """
+    Interaction counts per bucket from the rollup tables.
+    Query params: bucket=day|week, by=type|platform|priority (optional), since=YYYY-MM-DD (optional).
+    """
+    bucket = request.args.get('bucket', 'week')
+    dimension = request.args.get('by') or None
+    since_str = request.args.get('since')
+    if bucket not in BUCKETS or (dimension and dimension not in DIMENSIONS):
+        return jsonify({'error': 'Unsupported bucket or dimension.'}), 400
+    try:
+        since = datetime.strptime(since_str, '%Y-%m-%d').replace(tzinfo=UTC) if since_str else None
+    except ValueError:
+        return jsonify({'error': 'since must be YYYY-MM-DD.'}), 400
+
+    starts, series = query_rollups(bucket, dimension, since=since)
+    return jsonify({
+        'bucket': bucket,
+        'by': dimension,
+        'buckets': [start.isoformat() for start in starts],
+        'series': series
+    })
+
+
+@app.route('/api/relationships/<uuid:relationship_id>/network')
+@conditional_get('participants', 'relationships')
+def get_relationship_network(relationship_id):
+    """Co-attendance centrality of one relationship."""
+    relationship = Relationship.query.get_or_404(relationship_id)
+    stats = get_coattendance_graph().stats_for(relationship.id)
+    if stats is None:
+        return jsonify({'id': str(relationship.id), 'name': relationship.name, 'co_attendees': 0})
+    top_ids = [rel_id for rel_id, _ in stats['top_co_attendees']]
+    names = dict(db.session.query(Relationship.id, Relationship.name).filter(Relationship.id.in_(top_ids)).all())
+    stats['top_co_attendees'] = [
+        {'id': str(rel_id), 'name': names.get(rel_id), 'shared_events': count}
+        for rel_id, count in stats['top_co_attendees']
+    ]
+    return jsonify({'id': str(relationship.id), 'name': relationship.name, **stats})
+
+
+@app.route('/api/relationships/<uuid:relationship_id>/timeline')
+@conditional_get('relationships', 'interactions', 'follow_ups', 'events', 'participants')
+def get_relationship_timeline_api(relationship_id):
+    """
+    One page of a relationship's timeline, newest first. Pass the returned
+    cursor as ?before= for the next page; it is null on the last one.
+    """
+    relationship = Relationship.query.get_or_404(relationship_id)
+    limit = min(request.args.get('limit', current_app.config.get('TIMELINE_PAGE_SIZE', 30), type=int), 200)
+    try:
+        items, cursor = timeline_page(relationship.id, request.args.get('before'), max(limit, 1))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor.'}), 400
+    return jsonify({
+        'items': [{
+            'source': item.source,
+            'id': item.id,
+            'date': item.date.isoformat(),
+            'title': item.title,
+            'detail': item.detail,
+            'notes': item.notes,
+        } for item in items],
+        'cursor': cursor
+    })
+
+
+@app.route('/api/network/top')
+@conditional_get('participants', 'relationships')
+def get_network_top():
+    """Most central relationships of the co-attendance graph; metric=degree|eigenvector|bridge."""
+    metric = request.args.get('metric', 'eigenvector')
+    if metric not in METRICS:
+        return jsonify({'error': f"metric must be one of {', '.join(METRICS)}."}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), 500))
+
+    ranked = get_coattendance_graph().top(metric, limit)
+    names = dict(db.session.query(Relationship.id, Relationship.name).filter(
+        Relationship.id.in_([rel_id for rel_id, _ in ranked])
+    ).all())
+    return jsonify([{
+        'id': str(rel_id),
+        'name': names.get(rel_id),
+        metric: round(score, 6),
+        'url': url_for('get_relationship', relationship_id=rel_id)
+    } for rel_id, score in ranked])
+
+
+@app.route('/api/relationships/bulk-delete', methods=['POST'])
+def bulk_delete_relationships():
+    """
+    Deletes many relationships in one transaction.
+    Body: {"ids": [...]} and/or {"filter": {...}} (see bulk.relationship_filter); "dry_run": true only counts.
+    """
+    payload = request.get_json(silent=True) or {}
+    criteria = dict(payload.get('filter') or {})
+    if payload.get('ids'):
+        criteria['ids'] = payload['ids']
+    try:
+        selection = relationship_filter(criteria)
+        if payload.get('dry_run'):
+            return jsonify({'matched': count_relationships(selection)})
+        deleted = delete_relationships(selection)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'deleted': deleted})
+
+
+@app.route('/api/relationships/bulk-edit', methods=['POST'])
+def bulk_edit():
+    """
+    Applies one patch to many relationships in one transaction.
+    Body: {"ids": [...]} and/or {"filter": {...}}, plus "patch": {"priority", "interaction_level",
+    "follow_up_frequency", "add_tags", "remove_tags", "add_connection_types", "remove_connection_types"}.
+    """
+    payload = request.get_json(silent=True) or {}
+    criteria = dict(payload.get('filter') or {})
+    if payload.get('ids'):
+        criteria['ids'] = payload['ids']
+    patch = payload.get('patch') or {}
+    try:
+        updated, added_tag_ids = bulk_edit_relationships(relationship_filter(criteria), patch)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    if added_tag_ids:
+        record_tag_use(Tag.query.filter(Tag.id.in_(added_tag_ids)).all())
+    return jsonify({'updated': updated})
+
+
+@app.route('/api/events/<int:event_id>/interactions', methods=['POST'])
+def log_event_interactions(event_id):
+    """
+    Logs one interaction for every participant of an event.
+    Body: {"title", "type", "platform", "details", "complete_follow_ups": bool}.
+    """
+    event = Event.query.get_or_404(event_id)
+    payload = request.get_json(silent=True) or {}
+    try:
+        summary = log_interactions(
+            event_participant_selection(event.id),
+            title=payload.get('title'),
+            type_=payload.get('type', 'meeting'),
+            platform=payload.get('platform'),
+            details=payload.get('details'),
+            complete_follow_ups=bool(payload.get('complete_follow_ups'))
+        )
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    return jsonify(summary)
+
+
+@app.route('/api/changes')
+def get_changes():
+    """
+    Tails the change log. ?after=<seq> is the last seq the consumer has seen (0 to start),
+    ?entity= limits it to one table. 410 means entries after the cursor were compacted away:
+    rebuild from the current data and continue from the returned cursor.
+    """
+    after = request.args.get('after', 0, type=int)
+    limit = max(1, min(request.args.get('limit', 500, type=int), 5000))
+    entries, resync = read_changes(after, limit + 1, request.args.get('entity') or None)
+    if resync:
+        latest = db.session.scalar(select(func.max(ChangeLogEntry.seq)))
+        return jsonify({'error': 'Changes after this cursor were compacted away; resync.', 'cursor': latest}), 410
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return jsonify({
+        'changes': [{
+            'seq': entry.seq,
+            'entity': entry.entity,
+            'id': entry.entity_id,
+            'operation': entry.operation,
+            'changed_at': entry.changed_at.isoformat()
+        } for entry in entries],
+        'cursor': entries[-1].seq if entries else after,
+        'has_more': has_more
+    })
@@ -1,11 +1,13 @@
 from flask import request, redirect, url_for, render_template, flash
 from sqlalchemy.exc import IntegrityError
 
-from flask_app import app, db
+from flask_app import app, db, reference_data
+from flask_app.versioning import conditional_get
 from flask_app.models.models import ConnectionType
 
 
 @app.route('/connection-types', methods=['GET', 'POST'])
+@conditional_get('connection_types')
 def manage_connection_types():
     """Page to view and add new Connection Types."""
     if request.method == 'POST':
@@ -21,5 +23,5 @@ def manage_connection_types():
         else:
             flash("Error: Name cannot be empty.", "danger")
         return redirect(url_for('manage_connection_types'))
-    all_types = ConnectionType.query.order_by(ConnectionType.name).all()
+    all_types = reference_data.connection_types().rows
     return render_template('manage_connection_types.html', connection_types=all_types)
\ No newline at end of file
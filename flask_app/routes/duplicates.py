@@ -0,0 +1,64 @@
+import uuid
+
+from flask import render_template, request, redirect, url_for, flash
+from sqlalchemy.orm import joinedload
+
+from flask_app import app, db
+from flask_app.dedup import merge_duplicates
+from flask_app.models.models import DuplicateCandidate
+from flask_app.routes.main import recalculate_all_ratings_logic, recalculate_all_event_importance_logic
+from flask_app.versioning import conditional_get
+
+
+@app.route('/duplicates')
+@conditional_get('duplicates', 'relationships')
+def view_duplicates():
+    """The merge-review queue: likely duplicate contacts, best match first."""
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    candidates = DuplicateCandidate.query.options(
+        joinedload(DuplicateCandidate.relationship_a),
+        joinedload(DuplicateCandidate.relationship_b)
+    ).filter_by(status='pending').order_by(DuplicateCandidate.score.desc()).limit(limit).all()
+    return render_template('duplicates.html', candidates=candidates)
+
+
+@app.route('/duplicates/resolve', methods=['POST'])
+def resolve_duplicates():
+    """Merges or dismisses the selected candidate pairs in one transaction."""
+    action = request.form.get('action')
+    try:
+        candidate_ids = [int(cid) for cid in request.form.getlist('candidate_ids')]
+        if not candidate_ids:
+            flash("Select at least one pair.", "warning")
+            return redirect(url_for('view_duplicates'))
+        candidates = DuplicateCandidate.query.filter(
+            DuplicateCandidate.id.in_(candidate_ids), DuplicateCandidate.status == 'pending'
+        ).order_by(DuplicateCandidate.score.desc()).all()
+
+        if action == 'dismiss':
+            for candidate in candidates:
+                candidate.status = 'dismissed'
+            db.session.commit()
+            flash(f"Dismissed {len(candidates)} pair(s).", "success")
+            return redirect(url_for('view_duplicates'))
+        if action != 'merge':
+            raise ValueError("Unknown action.")
+
+        pairs = []
+        for candidate in candidates:
+            keep_id = uuid.UUID(request.form.get(f'keep_{candidate.id}', str(candidate.relationship_a_id)))
+            if keep_id not in (candidate.relationship_a_id, candidate.relationship_b_id):
+                raise ValueError("The contact to keep must be one of the pair.")
+            merge_id = candidate.relationship_b_id if keep_id == candidate.relationship_a_id \
+                else candidate.relationship_a_id
+            pairs.append((keep_id, merge_id))
+        merged = merge_duplicates(pairs)
+        db.session.commit()
+        recalculate_all_ratings_logic()
+        recalculate_all_event_importance_logic()
+        flash(f"Merged {merged} contact(s).", "success")
+    except ValueError as e:
+        db.session.rollback()
+        print(f"ERROR in resolve_duplicates: {type(e).__name__} - {e}")
+        flash(f"An error occurred: {e}", "danger")
+    return redirect(url_for('view_duplicates'))
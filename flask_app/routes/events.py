@@ -1,9 +1,17 @@
-from datetime import datetime, UTC
-from flask import request, redirect, url_for, render_template, flash, current_app
+from datetime import datetime, UTC, timedelta
+from flask import request, redirect, url_for, render_template, flash, current_app, stream_with_context
 
-from flask_app import app, db
-from flask_app.models.models import Event, Relationship, Tag, ConnectionType
-from flask_app.routes.main import _calculate_single_event_importance
+from flask_app import app, db, reference_data
+from flask_app.bulk import (
+    add_participants_by_rule, event_participant_selection, log_interactions, sync_event_participants
+)
+from flask_app.ical import FEED_KINDS, cached_feed
+from flask_app.live import page_version
+from flask_app.models.models import Event
+from flask_app.read_models import event_cards
+from flask_app.routes.main import render_streamed, update_event_importance
+from flask_app.search import index_events
+from flask_app.versioning import conditional_get
 
 
 def validate_event_dates(start_date, end_date):
@@ -13,33 +21,90 @@ def validate_event_dates(start_date, end_date):
     return True
 
 
+def _save_participants(event, form):
+    """
+    Syncs the hand-picked participants, adds everyone matching the optional
+    rule_* fields and recomputes the importance score. Returns the number added by the rule.
+    """
+    sync_event_participants(event.id, form.getlist('participant_ids'))
+    rule = {key: form.get(f'rule_{key}') for key in ('tag_id', 'connection_type_id', 'priority')
+            if form.get(f'rule_{key}')}
+    added_by_rule = add_participants_by_rule(event.id, rule) if rule else 0
+    update_event_importance([event.id])
+    return added_by_rule
+
+
+def _event_sections(now):
+    """Section of the events list -> (criteria, ordering) of its events."""
+    return {
+        'upcoming': ((Event.is_potential == False, Event.start_date >= now), Event.start_date.asc()),
+        'potential': ((Event.is_potential == True,), Event.start_date.asc()),
+        'past': ((Event.is_potential == False, Event.start_date < now), Event.start_date.desc()),
+    }
+
+
 @app.route('/events')
+@conditional_get('events')
 def view_events():
-    """Displays a dashboard of all upcoming, past, and potential events."""
+    """Displays a dashboard of all upcoming, past, and potential events, streamed as they are read."""
     now = datetime.now(UTC)
-    upcoming_events = Event.query.filter(
-        Event.is_potential == False, Event.start_date >= now
-    ).order_by(Event.start_date.asc()).all()
-    potential_events = Event.query.filter(Event.is_potential == True).order_by(Event.start_date.asc()).all()
-    past_events = Event.query.filter(
-        Event.is_potential == False, Event.start_date < now
-    ).order_by(Event.start_date.desc()).all()
-    return render_template(
-        'events.html',
-        upcoming_events=upcoming_events,
-        potential_events=potential_events,
-        past_events=past_events,
-        now=now
-    )
+    batch_size = current_app.config.get('STREAM_BATCH_SIZE', 200)
+    sections = {
+        f'{section}_events': event_cards(*criteria, order_by=ordering, batch_size=batch_size)
+        for section, (criteria, ordering) in _event_sections(now).items()
+    }
+    return render_streamed('events.html', **sections, now=now, live_version=page_version())
+
+
+@app.route('/events/<int:event_id>/card')
+@conditional_get('events')
+def get_event_card(event_id):
+    """One card of the events list, for pages patched by live updates. 404 when the event is on no list."""
+    for section, (criteria, ordering) in _event_sections(datetime.now(UTC)).items():
+        event = next(event_cards(Event.id == event_id, *criteria, order_by=ordering), None)
+        if event is not None:
+            return render_template('_event_card.html', event=event, section=section)
+    return "Event not found.", 404
 
 
 @app.route('/calendar')
+@conditional_get()
 def calendar_view():
     """Displays the new FullCalendar view of events."""
     return render_template('calendar.html')
 
 
+@app.route('/calendar.ics')
+@conditional_get(*FEED_KINDS)
+def calendar_feed():
+    """
+    iCalendar subscription feed of events and pending follow-ups.
+    ?start= and ?end= (YYYY-MM-DD) bound the window; by default it spans the configured days around today.
+    """
+    config = current_app.config
+    today = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        window_start = datetime.strptime(request.args['start'], '%Y-%m-%d').replace(tzinfo=UTC) \
+            if request.args.get('start') else today - timedelta(days=config.get('ICAL_DEFAULT_PAST_DAYS', 90))
+        window_end = datetime.strptime(request.args['end'], '%Y-%m-%d').replace(tzinfo=UTC) \
+            if request.args.get('end') else today + timedelta(days=config.get('ICAL_DEFAULT_FUTURE_DAYS', 365))
+    except ValueError:
+        return "start and end must be dates formatted YYYY-MM-DD.", 400
+    if window_start >= window_end:
+        return "end must be after start.", 400
+
+    feed = cached_feed(
+        window_start, window_end,
+        lambda event_id: url_for('get_event', event_id=event_id, _external=True),
+        lambda relationship_id: url_for('get_relationship', relationship_id=relationship_id, _external=True),
+    )
+    response = current_app.response_class(stream_with_context(feed), mimetype='text/calendar')
+    response.headers['Content-Disposition'] = 'inline; filename="social-tracker.ics"'
+    return response
+
+
 @app.route('/events/add', methods=['GET', 'POST'])
+@conditional_get('tags', 'connection_types')
 def add_event():
     """Handles creating a new event."""
     if request.method == 'POST':
@@ -64,29 +129,28 @@ def add_event():
                 pros=data.get('pros'),
                 cons=data.get('cons')
             )
-            participant_ids = request.form.getlist('participant_ids')
-            if participant_ids:
-                participants = Relationship.query.filter(Relationship.id.in_(participant_ids)).all()
-                new_event.participants.extend(participants)
-
-            priority_scores = current_app.config.get('PRIORITY_SCORES', {})
-            new_event.importance_score = _calculate_single_event_importance(new_event, priority_scores)
-
             db.session.add(new_event)
+            db.session.flush()
+            index_events([new_event.id])
+            added_by_rule = _save_participants(new_event, data)
+
             db.session.commit()
             flash('Event added successfully!', 'success')
+            if added_by_rule:
+                flash(f'Added {added_by_rule} participant(s) matching the rule.', 'success')
             return redirect(url_for('view_events'))
         except (ValueError, KeyError) as e:
             db.session.rollback()
             flash(f'An error occurred: {e}', 'danger')
 
-    tags = Tag.query.order_by(Tag.name).all()
-    connection_types = ConnectionType.query.order_by(ConnectionType.name).all()
+    tags = reference_data.tags().rows
+    connection_types = reference_data.connection_types().rows
     priorities = ['Very High', 'High', 'Medium', 'Low', 'Very Low']
     return render_template('add_event.html', tags=tags, connection_types=connection_types, priorities=priorities)
 
 
 @app.route('/events/<int:event_id>')
+@conditional_get('events', 'relationships')
 def get_event(event_id):
     """Displays the detail page for a specific event."""
     event = Event.query.get_or_404(event_id)
@@ -94,6 +158,7 @@ def get_event(event_id):
 
 
 @app.route('/events/<int:event_id>/edit', methods=['GET', 'POST'])
+@conditional_get('events', 'relationships', 'tags', 'connection_types')
 def edit_event(event_id):
     """Handles editing an existing event."""
     event = Event.query.get_or_404(event_id)
@@ -124,24 +189,20 @@ def edit_event(event_id):
                 event.outcome = data.get('outcome')
                 event.learnings = data.get('learnings')
 
-            event.participants = []
-            participant_ids = request.form.getlist('participant_ids')
-            if participant_ids:
-                participants = Relationship.query.filter(Relationship.id.in_(participant_ids)).all()
-                event.participants.extend(participants)
-
-            priority_scores = current_app.config.get('PRIORITY_SCORES', {})
-            event.importance_score = _calculate_single_event_importance(event, priority_scores)
+            index_events([event.id])
+            added_by_rule = _save_participants(event, data)
 
             db.session.commit()
             flash('Event updated successfully!', 'success')
+            if added_by_rule:
+                flash(f'Added {added_by_rule} participant(s) matching the rule.', 'success')
             return redirect(url_for('get_event', event_id=event.id))
         except (ValueError, KeyError) as e:
             db.session.rollback()
             flash(f'An error occurred: {e}', 'danger')
 
-    tags = Tag.query.order_by(Tag.name).all()
-    connection_types = ConnectionType.query.order_by(ConnectionType.name).all()
+    tags = reference_data.tags().rows
+    connection_types = reference_data.connection_types().rows
     priorities = ['Very High', 'High', 'Medium', 'Low', 'Very Low']
     selected_participants_data = [{'id': str(p.id), 'name': p.name} for p in event.participants]
 
@@ -156,6 +217,32 @@ def edit_event(event_id):
     )
 
 
+@app.route('/events/<int:event_id>/log_interaction', methods=['POST'])
+def log_event_interaction(event_id):
+    """Logs one interaction for every participant of an event."""
+    event = Event.query.get_or_404(event_id)
+    try:
+        data = request.form
+        summary = log_interactions(
+            event_participant_selection(event.id),
+            title=data.get('title'),
+            type_=data.get('type', 'meeting'),
+            platform=data.get('platform'),
+            details=data.get('details'),
+            complete_follow_ups=data.get('complete_follow_ups') == 'on'
+        )
+        db.session.commit()
+        message = f"Interaction logged for {summary['logged']} participant(s)."
+        if summary['follow_ups_completed']:
+            message += f" Completed {summary['follow_ups_completed']} follow-up(s)."
+        flash(message, "success")
+    except (ValueError, KeyError) as e:
+        db.session.rollback()
+        flash(f"Error logging interaction: {e}", "danger")
+
+    return redirect(url_for('get_event', event_id=event.id))
+
+
 @app.route('/events/<int:event_id>/delete', methods=['POST'])
 def delete_event(event_id):
     """Deletes an event."""
@@ -1,10 +1,15 @@
+from collections import Counter
 from datetime import datetime, UTC
 from flask import request, redirect, url_for, render_template, flash
 from sqlalchemy.orm import joinedload
 
 from flask_app import app, db
+from flask_app.interaction_levels import classify_interaction_levels
 from flask_app.models.models import Relationship, InteractionHistory, FollowUp
+from flask_app.rollups import add_interaction_delta, apply_rollup_deltas, record_interaction
 from flask_app.routes.main import _create_next_automated_follow_up
+from flask_app.search import index_interactions
+from flask_app.versioning import conditional_get
 
 
 @app.route('/relationships/<uuid:relationship_id>/add_interaction', methods=['POST'])
@@ -25,6 +30,9 @@ def add_interaction(relationship_id):
             details=data.get('details')
         )
         db.session.add(interaction)
+        db.session.flush()
+        record_interaction(interaction, relationship.priority)
+        index_interactions([interaction.id])
 
         # Update last contacted date
         relationship.last_contacted = datetime.now(UTC)
@@ -39,6 +47,7 @@ def add_interaction(relationship_id):
                 # If a cadence is set, create the next follow-up
                 _create_next_automated_follow_up(relationship)
 
+        classify_interaction_levels([relationship.id])
         db.session.commit()
         flash("Interaction logged successfully.", "success")
     except (ValueError, KeyError) as e:
@@ -49,6 +58,7 @@ def add_interaction(relationship_id):
 
 
 @app.route('/interactions/<int:interaction_id>')
+@conditional_get('interactions', 'relationships')
 def get_interaction(interaction_id):
     """Displays the details of a single interaction."""
     interaction = InteractionHistory.query.options(
@@ -58,6 +68,7 @@ def get_interaction(interaction_id):
 
 
 @app.route('/interactions/<int:interaction_id>/edit', methods=['GET', 'POST'])
+@conditional_get('interactions')
 def edit_interaction(interaction_id):
     """Handles editing an existing interaction."""
     interaction = InteractionHistory.query.get_or_404(interaction_id)
@@ -68,11 +79,21 @@ def edit_interaction(interaction_id):
             if not data.get('title'):
                 raise ValueError("Title cannot be empty.")
 
+            old_key = (interaction.date, interaction.type, interaction.platform)
             interaction.title = data.get('title')
             interaction.details = data.get('details')
             interaction.type = data.get('type')
             interaction.platform = data.get('platform')
 
+            new_key = (interaction.date, interaction.type, interaction.platform)
+            if new_key != old_key:
+                priority = interaction.relationship.priority
+                deltas = Counter()
+                add_interaction_delta(deltas, *old_key, priority, -1)
+                add_interaction_delta(deltas, *new_key, priority, 1)
+                apply_rollup_deltas(deltas)
+
+            index_interactions([interaction.id])
             db.session.commit()
             flash('Interaction updated successfully!', 'success')
             return redirect(url_for('get_interaction', interaction_id=interaction.id))
@@ -89,7 +110,9 @@ def delete_interaction(interaction_id):
     interaction = InteractionHistory.query.get_or_404(interaction_id)
     relationship_id = interaction.relationship_id
     try:
+        record_interaction(interaction, interaction.relationship.priority, delta=-1)
         db.session.delete(interaction)
+        classify_interaction_levels([relationship_id])
         db.session.commit()
         flash('Interaction deleted successfully.', 'success')
     except Exception as e:
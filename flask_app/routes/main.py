@@ -1,81 +1,97 @@
 from datetime import datetime, UTC, timedelta
 
-from flask import render_template, current_app
-from sqlalchemy import case, func
+from flask import render_template, current_app, request, session, stream_template
+from sqlalchemy import case, func, select, update
 from sqlalchemy.orm import joinedload
 
 from flask_app import app, db
+from flask_app.live import LIVE_ROWS, page_version
+from flask_app.owners import per_owner
+from flask_app.read_models import dashboard_stats, relationship_cards
+from flask_app.search import search
+from flask_app.versioning import conditional_get
 from flask_app.models.models import (
-    Relationship, SocialMedia, Tag, Platform, ConnectionType,
-    RelationshipConnectionType, RelationshipTag, Event, FollowUp
+    Relationship, Tag, Platform, ConnectionType, Event, FollowUp, event_participants
 )
 
 
+def _automated_follow_up_values(relationship_id, follow_up_frequency, now=None):
+    """
+    Column values of the next automated FollowUp for a follow-up frequency, or None if it has no cadence.
+    """
+    if not follow_up_frequency:
+        return None
+
+    interval_days = current_app.config.get('FOLLOW_UP_INTERVAL_DAYS', {})
+
+    days = interval_days.get(follow_up_frequency)
+    if not days:
+        return None
+    return {
+        'relationship_id': relationship_id,
+        'topic': f"Automated Follow-up ({follow_up_frequency.capitalize()})",
+        'due_date': (now or datetime.now(UTC)) + timedelta(days=days),
+        'status': 'pending'
+    }
+
+
 def _create_next_automated_follow_up(relationship: Relationship):
     """
     Creates a new FollowUp record based on the relationship's follow-up frequency.
     """
-    if not relationship.follow_up_frequency:
-        return
-
-    frequency_map = {
-        'daily': timedelta(days=1),
-        'weekly': timedelta(weeks=1),
-        'bi-weekly': timedelta(weeks=2),
-        'monthly': timedelta(days=30),
-        'quarterly': timedelta(days=90)
-    }
+    values = _automated_follow_up_values(relationship.id, relationship.follow_up_frequency)
+    if values:
+        db.session.add(FollowUp(**values))
 
-    delta = frequency_map.get(relationship.follow_up_frequency)
-    if delta:
-        due_date = datetime.now(UTC) + delta
-        new_follow_up = FollowUp(
-            relationship_id=relationship.id,
-            topic=f"Automated Follow-up ({relationship.follow_up_frequency.capitalize()})",
-            due_date=due_date,
-            status='pending'
-        )
-        db.session.add(new_follow_up)
+
+def render_streamed(template_name, **context):
+    """
+    Streams a template so the page head and first rows are sent while later rows
+    are still being read. Falls back to render_template when flash messages are
+    pending: they are popped from the session during rendering, after a streamed
+    response has already sent its cookie.
+    """
+    if session.get('_flashes'):
+        return render_template(template_name, **context)
+    return stream_template(template_name, **context)
 
 
 @app.route('/')
+@conditional_get('relationships', 'follow_ups', 'tags', 'connection_types', 'platforms')
 def index():
-    """Main dashboard showing all relationships, with eager loading for efficiency."""
-    priority_ordering = case(
-        {
-            'Very High': 5,
-            'High': 4,
-            'Medium': 3,
-            'Low': 2,
-            'Very Low': 1
-        },
-        value=Relationship.priority,
-        else_=0
-    ).desc()
-
-    # Subquery to find the earliest pending due date for each relationship
-    subquery = db.session.query(
-        FollowUp.relationship_id,
-        func.min(FollowUp.due_date).label('next_due_date')
-    ).filter(FollowUp.status == 'pending').group_by(FollowUp.relationship_id).subquery()
-
-    relationships = Relationship.query.outerjoin(
-        subquery, Relationship.id == subquery.c.relationship_id
-    ).options(
-        joinedload(Relationship.connection_type_associations).joinedload(RelationshipConnectionType.connection_type),
-        joinedload(Relationship.tag_associations).joinedload(RelationshipTag.tag),
-        joinedload(Relationship.social_media).joinedload(SocialMedia.platform)
-    ).order_by(
-        subquery.c.next_due_date.asc().nullslast(),
-        priority_ordering
-    ).all()
+    """Main dashboard showing all relationships, streamed in batches as they are read."""
+    relationships = relationship_cards(current_app.config.get('STREAM_BATCH_SIZE', 200))
+    return render_streamed('dashboard.html', relationships=relationships, stats=dashboard_stats(),
+                           now=datetime.now(UTC), live_version=page_version())
+
 
-    return render_template('dashboard.html', relationships=relationships, now=datetime.now(UTC))
+@app.route('/relationships/<uuid:relationship_id>/card')
+@conditional_get('relationships', 'follow_ups', 'tags', 'connection_types', 'platforms')
+def get_relationship_card(relationship_id):
+    """One dashboard card, for pages patched by live updates."""
+    card = next(relationship_cards(ids=[relationship_id]), None)
+    if card is None:
+        return "Relationship not found.", 404
+    return render_template('_relationship_card.html', r=card, now=datetime.now(UTC))
+
+
+@app.route('/search')
+@conditional_get('interactions', 'events', 'relationships')
+def search_notes():
+    """Full-text search over interaction and event notes, best matches first."""
+    terms = request.args.get('q', '').strip()
+    results = search(terms, current_app.config.get('SEARCH_RESULTS_LIMIT', 50)) if terms else []
+    return render_template('search.html', terms=terms, results=results)
 
 
 @app.cli.command("seed")
+@per_owner
 def seed_all():
     """Seeds the database with initial platforms and connection types from config."""
+    seed_logic()
+
+
+def seed_logic():
     platform_rules = current_app.config.get('PLATFORM_CONFIG', {})
     print("Seeding platforms...")
     for name, rules in platform_rules.items():
@@ -103,6 +119,7 @@ def seed_all():
 
 
 @app.cli.command("recalculate-all-ratings")
+@per_owner
 def recalculate_all_ratings_command():
     """CLI wrapper for the recalculation logic."""
     recalculate_all_ratings_logic()
@@ -142,35 +159,38 @@ def recalculate_all_ratings_logic():
     print("Recalculation complete.")
 
 
-def _calculate_single_event_importance(event, priority_scores):
-    """Calculates the importance score for a single event based on its participants."""
-    score = 0
-    # Because participants is a 'dynamic' loader, accessing it here returns a query
-    # which we can then iterate over.
-    if not event.participants:
-        return 0
-    for participant in event.participants:
-        score += priority_scores.get(participant.priority, 0)
-    return score
+def _priority_score(priority_column):
+    """SQL expression mapping a priority column to its PRIORITY_SCORES value."""
+    return case(current_app.config.get('PRIORITY_SCORES', {}), value=priority_column, else_=0.0)
+
+
+def update_event_importance(event_ids=None):
+    """
+    Sets importance_score to the summed priority score of the participants with
+    one correlated UPDATE, for the given events or for all of them.
+    """
+    participant_scores = select(func.coalesce(func.sum(_priority_score(Relationship.priority)), 0.0)).select_from(
+        event_participants.join(Relationship, Relationship.id == event_participants.c.relationship_id)
+    ).where(event_participants.c.event_id == Event.id).scalar_subquery()
+    statement = update(Event).values(importance_score=participant_scores)
+    if event_ids is not None:
+        event_ids = list(event_ids)
+        statement = statement.where(Event.id.in_(event_ids)).execution_options(
+            **{LIVE_ROWS: ('event', event_ids, ['importance_score'])}
+        )
+    db.session.execute(statement.execution_options(synchronize_session=False))
 
 
 def recalculate_all_event_importance_logic():
     """Recalculates importance scores for all events."""
     print("Starting importance recalculation for all events...")
-    priority_scores = current_app.config.get('PRIORITY_SCORES', {})
-
-    # MODIFIED: Removed the incompatible .options(joinedload(...))
-    # We will let the 'lazy=dynamic' relationship handle loading participants
-    # inside the loop.
-    events = Event.query.all()
-
-    for event in events:
-        event.importance_score = _calculate_single_event_importance(event, priority_scores)
+    update_event_importance()
     db.session.commit()
     print("Event importance recalculation complete.")
 
 
 @app.cli.command("recalculate-event-importance")
+@per_owner
 def recalculate_event_importance_command():
     """CLI wrapper for the event importance recalculation logic."""
     recalculate_all_event_importance_logic()
\ No newline at end of file
@@ -1,11 +1,13 @@
 from flask import render_template
 
 from flask_app import app
-from flask_app.models.models import Platform
+from flask_app.versioning import conditional_get
+from flask_app.read_models import platform_rows
 
 
 @app.route('/platforms')
+@conditional_get('platforms', 'relationships')
 def view_platforms():
     """Displays a list of all platforms and their calculated priority ratings."""
-    platforms = Platform.query.order_by(Platform.priority_rating.desc()).all()
+    platforms = platform_rows()
     return render_template('platforms.html', platforms=platforms)
\ No newline at end of file
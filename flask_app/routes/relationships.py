@@ -1,23 +1,30 @@
 from datetime import datetime, UTC
 from flask import request, redirect, url_for, render_template, current_app, flash
+from sqlalchemy import exists, select
 from sqlalchemy.orm import joinedload
 
-from flask_app import app, db
+from flask_app import app, db, reference_data
+from flask_app.archive import archived_page
 from flask_app.models.models import (
-    Relationship, SocialMedia, Tag, Platform, ConnectionType,
-    RelationshipConnectionType, RelationshipTag, FollowUp
+    Relationship, SocialMedia, Tag, Platform,
+    RelationshipConnectionType, RelationshipTag, RelationshipEdit, FollowUp, InteractionArchive
 )
+from flask_app.bulk import delete_relationships, relationship_filter
+from flask_app.graph import get_coattendance_graph
+from flask_app.interaction_levels import classify_interaction_levels
+from flask_app.rollups import move_relationship_priority
+from flask_app.tag_index import record_tag_use
+from flask_app.timeline import interaction_page, timeline_page
 from flask_app.routes.main import recalculate_all_ratings_logic, recalculate_all_event_importance_logic
+from flask_app.versioning import conditional_get
 
 
 @app.route('/add-relationship')
+@conditional_get('platforms', 'connection_types')
 def add_relationship_form():
     """Show the added relationship form and pass dynamic data."""
-    platforms = Platform.query.order_by(Platform.name).all()
-    platforms_data = [{"name": p.name, "requires_handle": p.requires_handle, "requires_link": p.requires_link} for p in
-                      platforms]
-    connection_types = ConnectionType.query.order_by(ConnectionType.name).all()
-
+    platforms_data = reference_data.platforms_data()
+    connection_types = reference_data.connection_types().rows
     return render_template(
         'add_relationship.html',
         platforms_data=platforms_data,
@@ -40,7 +47,6 @@ def create_relationship():
             goal=data.get('goal'),
             execution_strategy=data.get('execution_strategy'),
             priority=data.get('priority', 'Medium'),
-            interaction_level=data.get('interaction_level', 'Not Contacted'),
             notes=data.get('notes'),
             follow_up_frequency=data.get('follow_up_frequency') or None
         )
@@ -52,7 +58,7 @@ def create_relationship():
         for ctype_id in selected_ctype_ids:
             db.session.add(RelationshipConnectionType(
                 relationship_id=relationship.id,
-                connection_type_id=int(ctype_id),
+                connection_type_id=_connection_type_id(ctype_id),
                 is_primary=(str(ctype_id) == str(primary_ctype_id))
             ))
 
@@ -62,12 +68,15 @@ def create_relationship():
         if primary_tag_name: all_tag_names.add(primary_tag_name)
         if len(all_tag_names) == 1 and not primary_tag_name: primary_tag_name = list(all_tag_names)[0]
 
-        for tag_name in all_tag_names:
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.session.add(tag)
-                db.session.flush()
+        # Every tag is marked as used below, so load the rows in one query rather than from the cache.
+        found = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(all_tag_names))} if all_tag_names else {}
+        new_tags = [Tag(name=name) for name in sorted(all_tag_names - set(found))]
+        if new_tags:
+            db.session.add_all(new_tags)
+            db.session.flush()
+        used_tags = list(found.values()) + new_tags
+        for tag in used_tags:
+            tag.last_used_at = datetime.now(UTC)
             db.session.add(RelationshipTag(
                 relationship_id=relationship.id,
                 tag_id=tag.id,
@@ -76,9 +85,11 @@ def create_relationship():
 
         _process_social_media_data(relationship, data)
 
+        classify_interaction_levels([relationship.id])
         db.session.commit()
         recalculate_all_ratings_logic()
         recalculate_all_event_importance_logic()
+        record_tag_use(used_tags)
         flash("Relationship added successfully!", "success")
         return redirect(url_for('index'))
 
@@ -90,20 +101,74 @@ def create_relationship():
 
 
 @app.route('/relationships/<uuid:relationship_id>')
+@conditional_get('relationships', 'interactions', 'follow_ups', 'tags', 'platforms', 'connection_types', 'health',
+                 'participants')
 def get_relationship(relationship_id):
     """Get relationship details"""
-    relationship = Relationship.query.options(
-        joinedload(Relationship.interactions),
-        joinedload(Relationship.follow_ups)
-    ).get_or_404(relationship_id)
-    pending_follow_ups = sorted(
-        [f for f in relationship.follow_ups if f.status == 'pending'],
-        key=lambda x: x.due_date
-    )
-    return render_template('relationship_detail.html', relationship=relationship, pending_follow_ups=pending_follow_ups)
+    relationship = Relationship.query.get_or_404(relationship_id)
+    pending_follow_ups = FollowUp.query.filter(
+        FollowUp.relationship_id == relationship.id, FollowUp.status == 'pending'
+    ).order_by(FollowUp.due_date).all()
+    # The newest page of history only; older pages, then the archive, load on demand.
+    interactions, cursor = interaction_page(relationship.id)
+
+    network = get_coattendance_graph().stats_for(relationship.id)
+    if network:
+        top_ids = [rel_id for rel_id, _ in network['top_co_attendees']]
+        names = dict(db.session.query(Relationship.id, Relationship.name).filter(Relationship.id.in_(top_ids)).all())
+        network['top_co_attendees'] = [
+            {'id': rel_id, 'name': names.get(rel_id, 'Unknown'), 'shared_events': count}
+            for rel_id, count in network['top_co_attendees']
+        ]
+
+    return render_template('relationship_detail.html', relationship=relationship,
+                           pending_follow_ups=pending_follow_ups, network=network, interactions=interactions,
+                           cursor=cursor, has_archive=_has_archive(relationship.id))
+
+
+def _has_archive(relationship_id):
+    return db.session.scalar(select(exists().where(InteractionArchive.relationship_id == relationship_id)))
+
+
+@app.route('/relationships/<uuid:relationship_id>/interactions')
+@conditional_get('interactions')
+def get_interaction_history(relationship_id):
+    """A page of live interactions, appended to the detail page's history on demand; the last one leads to the archive."""
+    try:
+        interactions, cursor = interaction_page(relationship_id, request.args.get('before'))
+    except ValueError:
+        return "Invalid cursor.", 400
+    return render_template('_interaction_history.html', relationship_id=relationship_id, interactions=interactions,
+                           cursor=cursor, has_archive=cursor is None and _has_archive(relationship_id))
+
+
+@app.route('/relationships/<uuid:relationship_id>/archived-interactions')
+@conditional_get('interactions')
+def get_archived_interactions(relationship_id):
+    """A page of archived interactions, appended to the detail page's history on demand."""
+    try:
+        interactions, cursor = archived_page(relationship_id, request.args.get('before'))
+    except ValueError:
+        return "Invalid cursor.", 400
+    return render_template('_archived_interactions.html', relationship_id=relationship_id,
+                           interactions=interactions, cursor=cursor)
+
+
+@app.route('/relationships/<uuid:relationship_id>/timeline')
+@conditional_get('relationships', 'interactions', 'follow_ups', 'events', 'participants')
+def get_relationship_timeline(relationship_id):
+    """Everything that happened with a relationship, newest first, a page at a time (?before=<cursor>)."""
+    relationship = Relationship.query.get_or_404(relationship_id)
+    try:
+        items, cursor = timeline_page(relationship.id, request.args.get('before'))
+    except ValueError:
+        return "Invalid cursor.", 400
+    return render_template('timeline.html', relationship=relationship, items=items, cursor=cursor,
+                           is_first_page=not request.args.get('before'))
 
 
 @app.route('/relationships/<uuid:relationship_id>/edit', methods=['GET', 'POST'])
+@conditional_get('relationships', 'tags', 'platforms', 'connection_types')
 def edit_relationship(relationship_id):
     """Handles editing an existing relationship."""
     relationship = Relationship.query.options(
@@ -117,14 +182,18 @@ def edit_relationship(relationship_id):
             data = request.form
             if not data.get('name'): raise ValueError("Full Name is a required field.")
 
+            # What the form can change, to record the save as an edit on the timeline if it changed anything.
+            before = _editable_state(relationship)
+
             # Update basic relationship fields
+            old_priority = relationship.priority
             relationship.name = data.get('name')
             relationship.goal = data.get('goal')
             relationship.execution_strategy = data.get('execution_strategy')
             relationship.priority = data.get('priority', 'Medium')
-            relationship.interaction_level = data.get('interaction_level', 'Not Contacted')
             relationship.notes = data.get('notes')
             relationship.follow_up_frequency = data.get('follow_up_frequency') or None
+            move_relationship_priority(relationship.id, old_priority, relationship.priority)
 
             # Update connection types
             RelationshipConnectionType.query.filter_by(relationship_id=relationship.id).delete()
@@ -135,11 +204,12 @@ def edit_relationship(relationship_id):
             for ctype_id in selected_ctype_ids:
                 db.session.add(RelationshipConnectionType(
                     relationship_id=relationship.id,
-                    connection_type_id=int(ctype_id),
+                    connection_type_id=_connection_type_id(ctype_id),
                     is_primary=(str(ctype_id) == str(primary_ctype_id))
                 ))
 
             # Update tags
+            previous_tag_ids = {assoc.tag_id for assoc in relationship.tag_associations}
             RelationshipTag.query.filter_by(relationship_id=relationship.id).delete()
             tag_names_str = data.get('tags', '')
             primary_tag_name = data.get('primary_tag_name', '').strip().lower()
@@ -147,12 +217,27 @@ def edit_relationship(relationship_id):
             if primary_tag_name: all_tag_names.add(primary_tag_name)
             if len(all_tag_names) == 1 and not primary_tag_name: primary_tag_name = list(all_tag_names)[0]
 
+            used_tags = []
+            known_tags = reference_data.tags().by_name
             for tag_name in all_tag_names:
+                known = known_tags.get(tag_name)
+                if known and known.id in previous_tag_ids:
+                    # Still attached: nothing about the tag itself changes.
+                    db.session.add(RelationshipTag(
+                        relationship_id=relationship.id,
+                        tag_id=known.id,
+                        is_primary=(known.name == primary_tag_name)
+                    ))
+                    continue
                 tag = Tag.query.filter_by(name=tag_name).first()
                 if not tag:
                     tag = Tag(name=tag_name)
                     db.session.add(tag)
                     db.session.flush()
+                # Only a newly attached tag counts as a use; re-saving the form doesn't.
+                if tag.id not in previous_tag_ids:
+                    tag.last_used_at = datetime.now(UTC)
+                    used_tags.append(tag)
                 db.session.add(RelationshipTag(
                     relationship_id=relationship.id,
                     tag_id=tag.id,
@@ -163,9 +248,16 @@ def edit_relationship(relationship_id):
             SocialMedia.query.filter_by(relationship_id=relationship.id).delete()
             _process_social_media_data(relationship, data)
 
+            db.session.flush()
+            after = _editable_state(relationship)
+            edited = [field for field in before if before[field] != after[field]]
+            if edited:
+                db.session.add(RelationshipEdit(relationship_id=relationship.id, fields=', '.join(edited)))
+            classify_interaction_levels([relationship.id])
             db.session.commit()
             recalculate_all_ratings_logic()
             recalculate_all_event_importance_logic()
+            record_tag_use(used_tags)
             flash('Relationship updated successfully!', 'success')
             return redirect(url_for('get_relationship', relationship_id=relationship.id))
 
@@ -175,10 +267,8 @@ def edit_relationship(relationship_id):
             flash(f"An error occurred: {e}", "danger")
             return redirect(url_for('edit_relationship', relationship_id=relationship_id))
 
-    platforms = Platform.query.order_by(Platform.name).all()
-    platforms_data = [{"name": p.name, "requires_handle": p.requires_handle, "requires_link": p.requires_link} for p in
-                      platforms]
-    connection_types = ConnectionType.query.order_by(ConnectionType.name).all()
+    platforms_data = reference_data.platforms_data()
+    connection_types = reference_data.connection_types().rows
 
     social_media_data = [{"platform": {"name": sm.platform.name}, "handle": sm.handle, "profile_link": sm.profile_link,
                           "is_primary": sm.is_primary} for sm in relationship.social_media]
@@ -195,6 +285,48 @@ def edit_relationship(relationship_id):
     )
 
 
+@app.route('/relationships/<uuid:relationship_id>/delete', methods=['POST'])
+def delete_relationship(relationship_id):
+    """Deletes a relationship and its whole history."""
+    relationship = Relationship.query.get_or_404(relationship_id)
+    name = relationship.name
+    try:
+        delete_relationships(relationship_filter({'ids': [relationship.id]}))
+        db.session.commit()
+        flash(f'{name} was deleted.', 'success')
+    except ValueError as e:
+        db.session.rollback()
+        flash(f'Error deleting relationship: {e}', 'danger')
+        return redirect(url_for('get_relationship', relationship_id=relationship_id))
+    return redirect(url_for('index'))
+
+
+# Columns of the edit form; tags, connection types and social media are compared as sets of rows.
+_EDITABLE_FIELDS = ('name', 'goal', 'execution_strategy', 'priority', 'notes', 'follow_up_frequency')
+
+
+def _editable_state(relationship):
+    """Everything the edit form sets, read from the database for the rows it replaces wholesale."""
+    state = {field: getattr(relationship, field) or None for field in _EDITABLE_FIELDS}
+    for field, columns in (
+        ('tags', (RelationshipTag.tag_id, RelationshipTag.is_primary)),
+        ('connection_types', (RelationshipConnectionType.connection_type_id, RelationshipConnectionType.is_primary)),
+        ('social_media', (SocialMedia.platform_id, SocialMedia.handle, SocialMedia.profile_link,
+                          SocialMedia.is_primary)),
+    ):
+        model = columns[0].class_
+        state[field] = set(db.session.execute(select(*columns).where(model.relationship_id == relationship.id)))
+    return state
+
+
+def _connection_type_id(value):
+    """A submitted connection type id, checked against the known types."""
+    ctype_id = int(value)
+    if ctype_id not in reference_data.connection_types().by_id:
+        raise ValueError(f"Unknown connection type: {value}")
+    return ctype_id
+
+
 def _process_social_media_data(relationship, data):
     """Helper function to process and save social media data for a relationship."""
     platforms = data.getlist('platform[]')
@@ -204,11 +336,12 @@ def _process_social_media_data(relationship, data):
     custom_names = iter(data.getlist('custom_platform_name[]'))
     custom_rules = iter(data.getlist('custom_platform_rule[]'))
     handle_idx, link_idx = 0, 0
+    known_platforms = reference_data.platforms().by_name
 
     for i, platform_name in enumerate(platforms):
         if not platform_name: continue
         current_handle, current_link = '', ''
-        platform = Platform.query.filter_by(name=platform_name).first()
+        platform = known_platforms.get(platform_name)
 
         if platform_name == 'Other':
             try:
@@ -0,0 +1,189 @@
+"""
+Full-text search over interaction notes and event notes.
+
+Each interaction and event has one row in search_documents holding its title
+and the concatenation of its free-text fields. The write routes refresh the row
+with index_interactions()/index_events() in the same transaction; deleting the
+source deletes the row through ON DELETE CASCADE.
+
+The index itself depends on the backend and is created with the table:
+  * PostgreSQL: a stored generated tsvector column (title weighted above the
+    body) with a GIN index, ranked with ts_rank_cd and highlighted with ts_headline.
+  * SQLite: an external-content FTS5 table kept in step by triggers, ranked
+    with bm25 and highlighted with highlight()/snippet().
+Highlights come back wrapped in control characters, so the stored text is
+escaped before they are turned into <mark> tags.
+"""
+from datetime import datetime
+from typing import NamedTuple
+
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, column, event, func, literal, literal_column, select, table
+
+from flask_app import app, db
+from flask_app.dialects import dialect_name, upsert
+from flask_app.models.models import SearchDocument, InteractionHistory, Event, Relationship
+from flask_app.owners import owned, per_owner
+
+TEXT_SEARCH_CONFIG = 'english'
+START_MARK, STOP_MARK = '\x02', '\x03'
+
+_POSTGRES_DDL = [
+    f"""ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', title), 'A') ||
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', body), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_search_vector ON search_documents USING GIN (search_vector)",
+]
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5(
+        title, body, content='search_documents', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+for _statement in _POSTGRES_DDL:
+    event.listen(SearchDocument.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+for _statement in _SQLITE_DDL:
+    event.listen(SearchDocument.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(SearchDocument.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS search_documents_fts').execute_if(dialect='sqlite'))
+
+
+class SearchResult(NamedTuple):
+    kind: str  # 'interaction' or 'event'
+    id: int
+    title: Markup
+    snippet: Markup
+    rank: float
+    date: datetime
+    relationship_id: object  # Interactions only.
+    relationship_name: str
+
+
+def _text(*columns):
+    """The columns joined by newlines, in SQL; NULLs count as empty."""
+    joined = None
+    for value in columns:
+        part = func.coalesce(value, '')
+        joined = part if joined is None else joined + literal('\n') + part
+    return joined
+
+
+def _index(key, rows):
+    db.session.flush()
+    statement = upsert(SearchDocument.__table__).from_select([key, 'owner_id', 'title', 'body'], rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[key], set_={'title': statement.excluded.title, 'body': statement.excluded.body}
+    ))
+
+
+def index_interactions(ids):
+    """(Re)indexes the interactions whose ids are given as a list or a SELECT. Does not commit."""
+    _index('interaction_id', select(
+        InteractionHistory.id, InteractionHistory.owner_id, InteractionHistory.title, _text(InteractionHistory.details)
+    ).where(InteractionHistory.id.in_(ids)))
+
+
+def index_events(ids):
+    """(Re)indexes the events whose ids are given as a list or a SELECT. Does not commit."""
+    _index('event_id', select(
+        Event.id, Event.owner_id, Event.title,
+        _text(Event.details, Event.pros, Event.cons, Event.outcome, Event.learnings)
+    ).where(Event.id.in_(ids)))
+
+
+def highlight(text):
+    """Escapes `text` and turns the highlight markers into <mark> tags."""
+    return Markup(str(escape(text or '')).replace(START_MARK, '<mark>').replace(STOP_MARK, '</mark>'))
+
+
+def _fts5_query(terms):
+    """Every term as a quoted FTS5 string, so user input can't be read as query syntax."""
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms.split())
+
+
+def _matches(terms, limit):
+    """(SearchDocument.id, title, snippet, rank) of the best matches, best first."""
+    if dialect_name() == 'postgresql':
+        vector = literal_column('search_documents.search_vector')
+        query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, terms)
+        rank = func.ts_rank_cd(vector, query)
+        options = f'StartSel={START_MARK}, StopSel={STOP_MARK}'
+        return select(
+            SearchDocument.id.label('document_id'),
+            func.ts_headline(TEXT_SEARCH_CONFIG, SearchDocument.title, query,
+                             options + ', HighlightAll=true').label('title'),
+            func.ts_headline(TEXT_SEARCH_CONFIG, SearchDocument.body, query,
+                             options + ', MaxFragments=2, MaxWords=25, MinWords=8').label('snippet'),
+            rank.label('rank'),
+        ).where(vector.op('@@')(query)).order_by(rank.desc(), SearchDocument.id).limit(limit)
+
+    match = _fts5_query(terms)
+    if not match:
+        return None
+    fts = table('search_documents_fts', column('rowid'))
+    fts_name = literal_column(fts.name)  # FTS5 functions and MATCH take the bare table name.
+    # Joined so the owner filter applies before the limit (see flask_app/owners.py).
+    rank = func.bm25(fts_name, 10.0, 1.0)  # Lower is better; title hits count more.
+    return select(
+        fts.c.rowid.label('document_id'),
+        func.highlight(fts_name, 0, START_MARK, STOP_MARK).label('title'),
+        func.snippet(fts_name, 1, START_MARK, STOP_MARK, '…', 24).label('snippet'),
+        (-rank).label('rank'),
+    ).join(SearchDocument, SearchDocument.id == fts.c.rowid) \
+        .where(fts_name.op('MATCH')(match)).order_by(rank, fts.c.rowid).limit(limit)
+
+
+def search(terms, limit=50):
+    """The best matching interactions and events for `terms`, best first."""
+    terms = (terms or '').strip()
+    matches = _matches(terms, limit) if terms else None
+    if matches is None:
+        return []
+    matches = matches.subquery()
+    rows = db.session.execute(
+        select(
+            SearchDocument.interaction_id, SearchDocument.event_id, matches.c.title, matches.c.snippet, matches.c.rank,
+            func.coalesce(InteractionHistory.date, Event.start_date), Relationship.id, Relationship.name
+        ).join(SearchDocument, SearchDocument.id == matches.c.document_id)
+        .outerjoin(InteractionHistory, InteractionHistory.id == SearchDocument.interaction_id)
+        .outerjoin(Relationship, Relationship.id == InteractionHistory.relationship_id)
+        .outerjoin(Event, Event.id == SearchDocument.event_id)
+        .order_by(matches.c.rank.desc(), matches.c.document_id)
+    )
+    return [SearchResult(
+        kind='interaction' if interaction_id else 'event', id=interaction_id or event_id,
+        title=highlight(row_title), snippet=highlight((row_snippet or "").strip()), rank=row_rank, date=date,
+        relationship_id=relationship_id, relationship_name=relationship_name,
+    ) for interaction_id, event_id, row_title, row_snippet, row_rank, date, relationship_id, relationship_name in rows]
+
+
+def rebuild_search_index_logic():
+    """Re-creates every search document of the current owner from the interactions and events tables."""
+    print("Rebuilding search index...")
+    table = SearchDocument.__table__
+    db.session.execute(table.delete().where(owned(table)))
+    index_interactions(select(InteractionHistory.id))
+    index_events(select(Event.id))
+    db.session.commit()
+    count = db.session.scalar(select(func.count()).select_from(SearchDocument))
+    print(f"Search index rebuild complete: {count} documents.")
+    return count
+
+
+@app.cli.command("rebuild-search-index")
+@per_owner
+def rebuild_search_index_command():
+    """CLI wrapper for the search index rebuild."""
+    rebuild_search_index_logic()
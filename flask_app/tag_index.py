@@ -0,0 +1,131 @@
+"""
+In-process prefix index for tag autocomplete.
+
+Every trie node keeps the TOP_K best tags below it, so a lookup is a walk down
+the typed prefix and no sorting at request time. A tag's weight is
+
+    ln(1 + priority_rating) + last_used_at / TAG_RECENCY_SCALE_DAYS
+
+which ranks recently used tags first without depending on the current time
+(a tag used one scale later counts as e-times more popular), so weights never
+go stale by themselves.
+
+The relationship save path updates the index in place for the tags it touches.
+Changes from other workers are picked up by a rebuild once the 'tags' data
+version has moved and the index is older than TAG_INDEX_MAX_AGE_SECONDS.
+Every owner has its own index (see flask_app/owners.py).
+"""
+import math
+import threading
+import time
+
+from flask import current_app
+
+from flask_app import db
+from flask_app.models.models import Tag
+from flask_app.owners import current_owner_id
+from flask_app.versioning import current_versions
+
+TOP_K = 10
+
+_build_lock = threading.Lock()
+_cached = {}  # owner id -> (tags version, index, built at)
+
+
+class _Node:
+    __slots__ = ('children', 'tag', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.tag = None  # Name of the tag ending at this node.
+        self.top = []  # [(weight, name)], best first.
+
+
+class TagIndex:
+    def __init__(self, recency_scale_seconds):
+        self._root = _Node()
+        self._weights = {}
+        self._recency_scale = recency_scale_seconds
+        self._lock = threading.Lock()
+
+    def weight(self, priority_rating, last_used_at):
+        recency = last_used_at.timestamp() / self._recency_scale if last_used_at else 0.0
+        return math.log1p(max(priority_rating or 0.0, 0.0)) + recency
+
+    def _recompute(self, node):
+        candidates = [entry for child in node.children.values() for entry in child.top]
+        if node.tag is not None:
+            candidates.append((self._weights[node.tag], node.tag))
+        candidates.sort(key=lambda entry: (-entry[0], entry[1]))
+        node.top = candidates[:TOP_K]
+
+    def build(self, rows):
+        """Loads [(name, priority_rating, last_used_at)] and computes every node's top list bottom-up."""
+        for name, priority_rating, last_used_at in rows:
+            node = self._root
+            for char in name:
+                node = node.children.setdefault(char, _Node())
+            node.tag = name
+            self._weights[name] = self.weight(priority_rating, last_used_at)
+
+        # Iterative post-order walk: children are finished before their parent.
+        order, stack = [], [self._root]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node.children.values())
+        for node in reversed(order):
+            self._recompute(node)
+        return self
+
+    def update(self, name, priority_rating, last_used_at):
+        """Adds or re-weights one tag, refreshing only the nodes on its path."""
+        with self._lock:
+            path = [self._root]
+            for char in name:
+                path.append(path[-1].children.setdefault(char, _Node()))
+            path[-1].tag = name
+            self._weights[name] = self.weight(priority_rating, last_used_at)
+            for node in reversed(path):
+                self._recompute(node)
+
+    def complete(self, prefix, limit=TOP_K):
+        """Names of the best tags starting with `prefix`."""
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [name for _, name in node.top[:limit]]
+
+
+def _build():
+    config = current_app.config
+    scale = config.get('TAG_RECENCY_SCALE_DAYS', 30) * 86400.0
+    rows = db.session.execute(db.select(Tag.name, Tag.priority_rating, Tag.last_used_at)).all()
+    return TagIndex(scale).build(rows)
+
+
+def get_tag_index():
+    """The current owner's index, rebuilt when tags changed elsewhere and it is older than the configured age."""
+    owner_id = current_owner_id()
+    version = current_versions().get('tags', 0)
+    max_age = current_app.config.get('TAG_INDEX_MAX_AGE_SECONDS', 60)
+    cached_version, index, built_at = _cached.get(owner_id, (None, None, 0.0))
+    if index is not None and (cached_version == version or time.monotonic() - built_at < max_age):
+        return index
+    with _build_lock:
+        cached_version, index, built_at = _cached.get(owner_id, (None, None, 0.0))
+        if index is None or (cached_version != version and time.monotonic() - built_at >= max_age):
+            index = _build()
+            _cached[owner_id] = (version, index, time.monotonic())
+    return index
+
+
+def record_tag_use(tags):
+    """Applies saved tags to the current owner's index in this process, if it has been built."""
+    index = _cached.get(current_owner_id(), (None, None, 0.0))[1]
+    if index is None:
+        return
+    for tag in tags:
+        index.update(tag.name, tag.priority_rating, tag.last_used_at)
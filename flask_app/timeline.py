@@ -0,0 +1,221 @@
+"""
+Unified relationship timeline.
+
+One list, newest first, of everything that happened with a contact:
+interactions (live and archived), follow-ups (at their due date, pending or
+not), events attended, the edits the user made to the contact and when it was
+added. Edits come from relationship_edits, which only the edit form and bulk
+edits write: the change log is compacted, and most of its updates of a contact
+are derived columns changing as interactions are logged. Edits made before
+relationship_edits existed are not listed. Each
+source is a stream already in timeline order, read from an index in batches of
+one page plus one item, and heapq.merge interleaves them lazily. A page
+therefore reads at most page_size + 1 rows per source, however long the
+contact's history is:
+  * interactions  - ix_interaction_history_relationship_id_date
+  * archived      - interaction_archive rows of one month at a time (see flask_app/archive.py)
+  * follow-ups    - ix_follow_ups_relationship_id_due_date
+  * events        - ix_event_participants_relationship_id_event_id, then the events by primary key
+  * edits         - ix_relationship_edits_relationship_id_edited_at
+  * added         - the relationship itself, by primary key
+Events are ordered by a coalesce of two columns, so that stream sorts the
+contact's events rather than read them in index order; a contact has few, and
+the sort is a top-N one.
+Items are ordered by (date, source, id). A page's cursor is the key of its last
+item, and every source continues strictly after it with a keyset condition.
+"""
+import heapq
+from datetime import UTC, datetime, timedelta
+from itertools import islice
+from operator import attrgetter
+from typing import NamedTuple
+
+from flask import current_app
+from sqlalchemy import func, literal, select, true, tuple_
+
+from flask_app import db
+from flask_app.archive import month_start, unpack
+from flask_app.models.models import (
+    Event, FollowUp, InteractionArchive, InteractionHistory, Relationship, RelationshipEdit, event_participants
+)
+
+# Order of items with the same timestamp, lowest last.
+SOURCES = ('added', 'edit', 'event', 'follow_up', 'archived', 'interaction')
+RANK = {source: rank for rank, source in enumerate(SOURCES)}
+
+
+class TimelineItem(NamedTuple):
+    date: datetime
+    source: str
+    id: int  # 0 for 'added'.
+    title: str
+    detail: str  # Interaction type and platform, follow-up status, event kind or the fields edited.
+    notes: str = None
+
+    @property
+    def key(self):
+        return self.date, RANK[self.source], self.id
+
+
+# UTC with a Z rather than +00:00, so cursors need no escaping in a query string.
+_CURSOR_DATE = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def encode_cursor(key):
+    date, rank, item_id = key
+    return f"{date.astimezone(UTC).strftime(_CURSOR_DATE)}~{SOURCES[rank]}~{item_id}"
+
+
+def decode_cursor(cursor):
+    """The key encoded by encode_cursor(). Raises ValueError for anything else."""
+    date, source, item_id = cursor.split('~')
+    if source not in RANK:
+        raise ValueError(f"Unknown timeline source {source!r}.")
+    return datetime.strptime(date, _CURSOR_DATE).replace(tzinfo=UTC), RANK[source], int(item_id)
+
+
+def _after(source, date, item_id, cursor):
+    """Keyset condition for the items of `source` that sort after `cursor` (newest first)."""
+    if cursor is None:
+        return true()
+    cursor_date, cursor_rank, cursor_id = cursor
+    if RANK[source] < cursor_rank:
+        return date <= cursor_date
+    if RANK[source] > cursor_rank:
+        return date < cursor_date
+    return tuple_(date, item_id) < tuple_(cursor_date, cursor_id)
+
+
+def _stream(fetch, cursor, batch_size):
+    """Yields what fetch(cursor, limit) returns, batch by batch, until a batch comes back short."""
+    while True:
+        batch = fetch(cursor, batch_size)
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        cursor = batch[-1].key
+
+
+def _interactions(relationship_id):
+    def fetch(cursor, limit):
+        date = InteractionHistory.date
+        rows = db.session.execute(
+            select(date, InteractionHistory.id, InteractionHistory.title, InteractionHistory.type,
+                   InteractionHistory.platform, InteractionHistory.details)
+            .where(InteractionHistory.relationship_id == relationship_id,
+                   _after('interaction', date, InteractionHistory.id, cursor))
+            .order_by(date.desc(), InteractionHistory.id.desc()).limit(limit)
+        )
+        return [TimelineItem(date_, 'interaction', id_, title, ' · '.join(filter(None, (type_, platform))), details)
+                for date_, id_, title, type_, platform, details in rows]
+    return fetch
+
+
+def _follow_ups(relationship_id):
+    def fetch(cursor, limit):
+        date = FollowUp.due_date
+        rows = db.session.execute(
+            select(date, FollowUp.id, FollowUp.topic, FollowUp.status)
+            .where(FollowUp.relationship_id == relationship_id, _after('follow_up', date, FollowUp.id, cursor))
+            .order_by(date.desc(), FollowUp.id.desc()).limit(limit)
+        )
+        return [TimelineItem(date_, 'follow_up', id_, topic, f"Follow-up {status}")
+                for date_, id_, topic, status in rows]
+    return fetch
+
+
+def _events(relationship_id):
+    def fetch(cursor, limit):
+        # Undated events are placed when they were added.
+        date = func.coalesce(Event.start_date, Event.created_at)
+        rows = db.session.execute(
+            select(date, Event.id, Event.title, Event.is_potential)
+            .join(event_participants, event_participants.c.event_id == Event.id)
+            .where(event_participants.c.relationship_id == relationship_id, date.isnot(None),
+                   _after('event', date, Event.id, cursor))
+            .order_by(date.desc(), Event.id.desc()).limit(limit)
+        )
+        return [TimelineItem(date_, 'event', id_, title, "Potential event" if potential else "Event")
+                for date_, id_, title, potential in rows]
+    return fetch
+
+
+def _edits(relationship_id):
+    def fetch(cursor, limit):
+        date = RelationshipEdit.edited_at
+        rows = db.session.execute(
+            select(date, RelationshipEdit.id, RelationshipEdit.fields)
+            .where(RelationshipEdit.relationship_id == relationship_id,
+                   _after('edit', date, RelationshipEdit.id, cursor))
+            .order_by(date.desc(), RelationshipEdit.id.desc()).limit(limit)
+        )
+        return [TimelineItem(date_, 'edit', id_, "Contact details edited", f"Changed {fields.replace('_', ' ')}")
+                for date_, id_, fields in rows]
+    return fetch
+
+
+def _added(relationship_id):
+    def fetch(cursor, limit):
+        date = Relationship.created_at
+        added = db.session.scalar(select(date).where(
+            Relationship.id == relationship_id, date.isnot(None), _after('added', date, literal(0), cursor)
+        ))
+        return [TimelineItem(added, 'added', 0, "Contact added", None)] if added else []
+    return fetch
+
+
+def _archived(relationship_id, cursor):
+    """
+    Yields archived interactions after `cursor`, reading the archive rows of
+    one month at a time; rows of the same month may overlap, so they are merged.
+    """
+    period = month_start(cursor[0]).date() if cursor is not None else None
+    while True:
+        latest = select(func.max(InteractionArchive.period_start)) \
+            .where(InteractionArchive.relationship_id == relationship_id)
+        if period is not None:
+            latest = latest.where(InteractionArchive.period_start <= period)
+        period = db.session.scalar(latest)
+        if period is None:
+            return
+        payloads = db.session.scalars(select(InteractionArchive.payload).where(
+            InteractionArchive.relationship_id == relationship_id, InteractionArchive.period_start == period
+        ))
+        items = [
+            TimelineItem(i.date, 'archived', i.id, i.title, ' · '.join(filter(None, (i.type, i.platform))), i.details)
+            for payload in payloads for i in unpack(relationship_id, payload)
+        ]
+        items.sort(key=attrgetter('key'), reverse=True)
+        yield from (item for item in items if cursor is None or item.key < cursor)
+        period -= timedelta(days=1)
+
+
+def interaction_page(relationship_id, before=None, page_size=None):
+    """
+    (items, cursor) for one page of the relationship's live interactions alone,
+    newest first, for the history on its page. cursor is None on the last page.
+    Raises ValueError for a malformed cursor.
+    """
+    page_size = page_size or current_app.config.get('INTERACTION_HISTORY_PAGE_SIZE', 20)
+    cursor = decode_cursor(before) if before else None
+    items = _interactions(relationship_id)(cursor, page_size + 1)
+    if len(items) > page_size:
+        return items[:page_size], encode_cursor(items[page_size - 1].key)
+    return items, None
+
+
+def timeline_page(relationship_id, before=None, page_size=None):
+    """
+    (items, cursor) for one page of the relationship's timeline, newest first,
+    continuing after the page whose cursor is `before`. cursor is None on the
+    last page. Raises ValueError for a malformed cursor.
+    """
+    page_size = page_size or current_app.config.get('TIMELINE_PAGE_SIZE', 30)
+    cursor = decode_cursor(before) if before else None
+    streams = [_stream(fetch(relationship_id), cursor, page_size + 1)
+               for fetch in (_interactions, _follow_ups, _events, _edits, _added)]
+    streams.append(_archived(relationship_id, cursor))
+    items = list(islice(heapq.merge(*streams, key=attrgetter('key'), reverse=True), page_size + 1))
+    if len(items) > page_size:
+        return items[:page_size], encode_cursor(items[page_size - 1].key)
+    return items, None
@@ -0,0 +1,249 @@
+"""
+Data versions: a global counter plus one counter per entity kind, bumped in the
+same transaction as every write. GET views use them to build ETags and answer
+If-None-Match with a 304 before running any of their queries.
+
+Every such write is also appended to the change log (see flask_app/changelog.py).
+
+Versions are kept per owner (see flask_app/owners.py): one user's writes
+never invalidate another user's ETags or caches. They are read with one small
+SELECT and then served from process memory until the stamp file next to the
+instance folder changes. Every worker touches that file after a commit that
+bumped a version, so the other workers on the host pick up the change on their
+next request.
+"""
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime, UTC
+from functools import lru_cache, wraps
+
+from flask import current_app, g, has_app_context, request, session
+from sqlalchemy import event, inspect, select, update
+
+from flask_app import db
+from flask_app.changelog import append_changes, flush_changes, statement_change
+from flask_app.models.models import DataVersion
+from flask_app.owners import current_owner_id, owned
+from flask_app.replica import reads_from_replica
+
+# Maps every table whose rows are shown somewhere to the version kinds it bumps.
+TABLE_KINDS = {
+    'relationships': ('relationships',),
+    'relationship_connection_types': ('relationships',),
+    'relationship_tags': ('relationships',),
+    'relationship_edits': ('relationships',),
+    'social_media': ('relationships',),
+    'interaction_history': ('interactions',),
+    'interaction_archive': ('interactions',),
+    'interaction_rollups': ('interactions',),
+    'follow_ups': ('follow_ups',),
+    'events': ('events',),
+    'event_participants': ('events', 'participants'),
+    'platforms': ('platforms',),
+    'connection_types': ('connection_types',),
+    'tags': ('tags',),
+    'relationship_health': ('health',),
+    'duplicate_candidates': ('duplicates',),
+}
+
+GLOBAL_KIND = 'global'
+
+_cache_lock = threading.Lock()
+_cached = (None, {})  # (stamp, {owner id: versions})
+
+
+def stamp_path():
+    path = current_app.config.get('DATA_VERSION_STAMP')
+    if path is None:
+        path = os.path.join(current_app.instance_path, 'data_version.stamp')
+    return path or None
+
+
+def read_stamp(path):
+    """Identity of the stamp file at `path`, or None if there is none."""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _touch_stamp():
+    path = stamp_path()
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(uuid.uuid4().hex)
+    # os.replace gives the stamp a new inode, so readers notice even on coarse mtimes.
+    os.replace(tmp_path, path)
+
+
+def current_versions():
+    """Returns {kind: version} of the current owner, read at most once per request."""
+    global _cached
+    if 'data_versions' in g:
+        return g.data_versions
+
+    owner_id = current_owner_id()
+    # Read the stamp before the table so a concurrent bump can only make us reload too often.
+    stamp = read_stamp(stamp_path())
+    cached_stamp, cached_versions = _cached
+    # A lagging replica may not have the versions of the last stamp yet, see flask_app/replica.py.
+    on_replica = reads_from_replica()
+    versions = cached_versions.get(owner_id) if stamp is not None and stamp == cached_stamp and not on_replica \
+        else None
+    if versions is None:
+        versions = dict(db.session.execute(select(DataVersion.kind, DataVersion.version)).all())
+        if stamp is not None and not on_replica:
+            with _cache_lock:
+                # A new stamp invalidates the versions of every owner.
+                by_owner = _cached[1] if _cached[0] == stamp else {}
+                _cached = (stamp, {**by_owner, owner_id: versions})
+    g.data_versions = versions
+    return versions
+
+
+def bump_versions(session, kinds):
+    """Increments the given kinds and the global counter of the current owner inside the session's transaction."""
+    kinds = set(kinds)
+    if not kinds:
+        return
+    kinds.add(GLOBAL_KIND)
+    kinds = sorted(kinds)  # Fixed lock order across concurrent writers.
+    table = DataVersion.__table__
+    connection = session.connection()
+    bumped = dict(connection.execute(
+        update(table).where(owned(table), table.c.kind.in_(kinds)).values(version=table.c.version + 1)
+        .returning(table.c.kind, table.c.version)
+    ).all())
+    missing = [{'owner_id': current_owner_id(), 'kind': kind, 'version': 1} for kind in kinds if kind not in bumped]
+    if missing:
+        connection.execute(table.insert(), missing)
+        bumped.update((row['kind'], 1) for row in missing)
+    session.info['data_versions_bumped'] = True
+    # The global version this transaction commits with, for live update notifications (see flask_app/live.py).
+    session.info['data_version'] = bumped[GLOBAL_KIND]
+
+
+def _kinds_for_tables(table_names):
+    return {kind for name in table_names for kind in TABLE_KINDS.get(name, ())}
+
+
+@lru_cache(maxsize=None)
+def cascaded_tables(table_name):
+    """Names of the tables whose rows a DELETE on `table_name` can remove through ON DELETE CASCADE."""
+    found, pending = set(), [table_name]
+    while pending:
+        parent = pending.pop()
+        for table in db.metadata.tables.values():
+            if table.name in found:
+                continue
+            if any(fk.ondelete and fk.ondelete.upper() == 'CASCADE' and fk.column.table.name == parent
+                   for fk in table.foreign_keys):
+                found.add(table.name)
+                pending.append(table.name)
+    return frozenset(found)
+
+
+def _flushed_tables(session):
+    """Names of the tables touched by the pending flush, including many-to-many and cascaded tables."""
+    tables = set()
+    for obj, is_delete in [(o, False) for o in session.new] + [(o, True) for o in session.deleted] + \
+                          [(o, False) for o in session.dirty if session.is_modified(o)]:
+        state = inspect(obj)
+        tables.add(state.mapper.local_table.name)
+        if is_delete:
+            tables |= cascaded_tables(state.mapper.local_table.name)
+        for rel in state.mapper.relationships:
+            if rel.secondary is not None and (is_delete or state.attrs[rel.key].history.has_changes()):
+                tables.add(rel.secondary.name)
+    return tables
+
+
+@event.listens_for(db.session, 'after_flush')
+def _bump_after_flush(session, flush_context):
+    bump_versions(session, _kinds_for_tables(_flushed_tables(session)))
+    # Appended only after the bump has locked the global version row, see flask_app/changelog.py.
+    append_changes(session.connection(), flush_changes(session, TABLE_KINDS))
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _bump_after_bulk_statement(orm_execute_state):
+    """Bulk INSERT/UPDATE/DELETE statements bypass the flush, so bump them here."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return None
+    table_name = getattr(getattr(orm_execute_state.statement, 'table', None), 'name', None)
+    tables = {table_name}
+    if orm_execute_state.is_delete:
+        tables |= cascaded_tables(table_name)
+    kinds = _kinds_for_tables(tables)
+    result = orm_execute_state.invoke_statement()
+    bump_versions(orm_execute_state.session, kinds)
+    if table_name in TABLE_KINDS:
+        operation = 'insert' if orm_execute_state.is_insert else 'update' if orm_execute_state.is_update else 'delete'
+        append_changes(orm_execute_state.session.connection(), [statement_change(table_name, operation)])
+    return result
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_after_commit(session):
+    session.info.pop('data_version', None)
+    if session.info.pop('data_versions_bumped', False):
+        _touch_stamp()
+        if has_app_context():
+            g.pop('data_versions', None)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('data_versions_bumped', None)
+    session.info.pop('data_version', None)
+
+
+def etag_for(full_path, owner_id, versions, kinds):
+    """The ETag of the response at `full_path` (path?query) given the owner and their current versions."""
+    parts = [full_path, f"owner={owner_id}"]
+    for kind in sorted(kinds):
+        parts.append(f"{kind}={versions.get(kind, 0)}")
+    # Pages compare dates against "now", so a new day must produce a new tag.
+    parts.append(datetime.now(UTC).date().isoformat())
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def compute_etag(kinds):
+    return etag_for(request.full_path, current_owner_id(), current_versions(), kinds)
+
+
+def conditional_get(*kinds):
+    """
+    Decorates a view so GET requests carry a weak ETag built from the data
+    versions of `kinds`, and a matching If-None-Match returns 304 without
+    calling the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flash messages are part of the page, so those responses can't be reused.
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            etag = compute_etag(kinds)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag, weak=True)
+                response.cache_control.no_cache = True
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag, weak=True)
+                response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
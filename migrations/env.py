@@ -45,6 +45,20 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Leaves out the full-text index objects (see flask_app/search.py) and the interaction_history
+    partitions on Postgres, where search_documents has a trigger instead of its foreign key to it
+    (see flask_app/archive.py). Both are created by DDL rather than the models."""
+    if reflected and compare_to is None and name:
+        return not (name.startswith('search_documents_fts') or name.startswith('search_vector')
+                    or name == 'ix_search_documents_search_vector'
+                    or name.startswith('interaction_history_p') or name == 'interaction_history_default')
+    if not reflected and compare_to is None and type_ == 'foreign_key_constraint' \
+            and object.table.name == 'search_documents' and object.referred_table.name == 'interaction_history':
+        return context.get_context().dialect.name != 'postgresql'
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +79,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +108,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,30 @@
+"""timeline indexes
+
+Indexes a relationship's follow-ups by due date and its event participation,
+so the streams of the relationship timeline (see flask_app/timeline.py) are
+read in order rather than sorted.
+
+Revision ID: 3f6a1c2e9b47
+Revises: 9c2e7d4b1a05
+Create Date: 2026-10-18 14:05:31.902116
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a1c2e9b47'
+down_revision = '9c2e7d4b1a05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_follow_ups_relationship_id_due_date', 'follow_ups', ['relationship_id', 'due_date'])
+    op.create_index('ix_event_participants_relationship_id_event_id', 'event_participants',
+                    ['relationship_id', 'event_id'])
+
+
+def downgrade():
+    op.drop_index('ix_event_participants_relationship_id_event_id', table_name='event_participants')
+    op.drop_index('ix_follow_ups_relationship_id_due_date', table_name='follow_ups')
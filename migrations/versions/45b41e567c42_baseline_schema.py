@@ -0,0 +1,316 @@
+"""baseline schema
+
+The complete schema on Postgres and SQLite. Enums are native types on Postgres
+and CHECK constraints on SQLite; the full-text index differs per backend as in
+flask_app/search.py. Databases created with db.create_all() before migrations
+existed are brought under them with `flask db stamp 45b41e567c42`.
+
+Revision ID: 45b41e567c42
+Revises: 
+Create Date: 2026-10-18 23:29:21.183209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from flask_app.models.models import UTCDateTime
+
+
+# revision identifiers, used by Alembic.
+revision = '45b41e567c42'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+ENUMS = {
+    'priority_level': ('Very High', 'High', 'Medium', 'Low', 'Very Low'),
+    'interaction_type': ('comment', 'DM', 'email', 'help', 'follow-up', 'meeting', 'call'),
+    'interaction_level': ('New', 'Active', 'Dormant', 'Not Contacted'),
+    'follow_up_status': ('pending', 'completed', 'cancelled'),
+}
+
+POSTGRES_SEARCH_DDL = [
+    """ALTER TABLE search_documents ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', title), 'A') ||
+        setweight(to_tsvector('english', body), 'B')
+    ) STORED""",
+    "CREATE INDEX ix_search_documents_search_vector ON search_documents USING GIN (search_vector)",
+]
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE search_documents_fts USING fts5(
+        title, body, content='search_documents', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+
+def _enum(name):
+    """A column type for one of ENUMS: the type created in upgrade() on Postgres, VARCHAR and CHECK on SQLite."""
+    return sa.Enum(*ENUMS[name], name=name, create_constraint=True).with_variant(
+        postgresql.ENUM(*ENUMS[name], name=name, create_type=False), 'postgresql'
+    )
+
+
+def _owner_id():
+    return sa.Column('owner_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for name, values in ENUMS.items():
+            postgresql.ENUM(*values, name=name).create(op.get_bind(), checkfirst=True)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=150), nullable=False),
+    sa.Column('created_at', UTCDateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_users')),
+    sa.UniqueConstraint('name', name=op.f('uq_users_name'))
+    )
+    op.create_table('change_log',
+    sa.Column('seq', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('entity', sa.String(length=50), nullable=False),
+    sa.Column('entity_id', sa.String(length=80), nullable=True),
+    sa.Column('operation', sa.String(length=10), nullable=False),
+    sa.Column('changed_at', UTCDateTime(), nullable=False),
+    _owner_id(),
+    sa.PrimaryKeyConstraint('seq', name=op.f('pk_change_log'))
+    )
+    op.create_index('ix_change_log_entity_entity_id_seq', 'change_log', ['entity', 'entity_id', 'seq'])
+    op.create_index('ix_change_log_owner_id_seq', 'change_log', ['owner_id', 'seq'])
+
+    op.create_table('connection_types',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('priority_rating', sa.Float(), server_default='0.0', nullable=False),
+    _owner_id(),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_connection_types')),
+    sa.UniqueConstraint('owner_id', 'name', name=op.f('uq_connection_types_owner_id_name'))
+    )
+    op.create_table('data_versions',
+    _owner_id(),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('owner_id', 'kind', name=op.f('pk_data_versions'))
+    )
+    op.create_table('events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('details', sa.Text(), nullable=True),
+    sa.Column('start_date', UTCDateTime(), nullable=True),
+    sa.Column('end_date', UTCDateTime(), nullable=True),
+    sa.Column('created_at', UTCDateTime(), nullable=True),
+    sa.Column('updated_at', UTCDateTime(), nullable=True),
+    sa.Column('priority', _enum('priority_level'), nullable=False),
+    sa.Column('is_potential', sa.Boolean(), nullable=False),
+    sa.Column('importance_score', sa.Float(), nullable=False),
+    sa.Column('pros', sa.Text(), nullable=True),
+    sa.Column('cons', sa.Text(), nullable=True),
+    sa.Column('outcome', sa.Text(), nullable=True),
+    sa.Column('learnings', sa.Text(), nullable=True),
+    _owner_id(),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_events'))
+    )
+    op.create_index('ix_events_owner_id_start_date', 'events', ['owner_id', 'start_date'])
+
+    op.create_table('interaction_rollups',
+    _owner_id(),
+    sa.Column('bucket', sa.String(length=10), nullable=False),
+    sa.Column('bucket_start', sa.Date(), nullable=False),
+    sa.Column('type', _enum('interaction_type'), nullable=False),
+    sa.Column('platform', sa.String(length=50), server_default='', nullable=False),
+    sa.Column('priority', _enum('priority_level'), nullable=False),
+    sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('owner_id', 'bucket', 'bucket_start', 'type', 'platform', 'priority',
+                            name=op.f('pk_interaction_rollups'))
+    )
+    op.create_table('platforms',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('priority_rating', sa.Float(), server_default='0.0', nullable=False),
+    sa.Column('requires_handle', sa.Boolean(), server_default='true', nullable=False),
+    sa.Column('requires_link', sa.Boolean(), server_default='true', nullable=False),
+    _owner_id(),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_platforms')),
+    sa.UniqueConstraint('owner_id', 'name', name=op.f('uq_platforms_owner_id_name'))
+    )
+    op.create_table('relationships',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('goal', sa.String(length=255), nullable=True),
+    sa.Column('execution_strategy', sa.String(length=255), nullable=True),
+    sa.Column('last_contacted', UTCDateTime(), nullable=True),
+    sa.Column('created_at', UTCDateTime(), nullable=True),
+    sa.Column('updated_at', UTCDateTime(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('follow_up_frequency', sa.String(length=50), nullable=True),
+    sa.Column('priority', _enum('priority_level'), nullable=False),
+    sa.Column('interaction_level', _enum('interaction_level'), nullable=False),
+    _owner_id(),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_relationships'))
+    )
+    op.create_index('ix_relationships_owner_id_name', 'relationships', ['owner_id', 'name'])
+    op.create_index('ix_relationships_owner_id_priority', 'relationships', ['owner_id', 'priority'])
+
+    op.create_table('tags',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('priority_rating', sa.Float(), server_default='0.0', nullable=False),
+    sa.Column('last_used_at', UTCDateTime(), nullable=True),
+    _owner_id(),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_tags')),
+    sa.UniqueConstraint('owner_id', 'name', name=op.f('uq_tags_owner_id_name'))
+    )
+    op.create_index('ix_tags_owner_id_last_used_at', 'tags', ['owner_id', 'last_used_at'])
+    op.create_index('ix_tags_owner_id_priority_rating', 'tags', ['owner_id', 'priority_rating'])
+
+    op.create_table('duplicate_candidates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('relationship_a_id', sa.Uuid(), nullable=False),
+    sa.Column('relationship_b_id', sa.Uuid(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('reasons', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+    sa.Column('created_at', UTCDateTime(), nullable=True),
+    _owner_id(),
+    sa.ForeignKeyConstraint(['relationship_a_id'], ['relationships.id'],
+                            name=op.f('fk_duplicate_candidates_relationship_a_id_relationships'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['relationship_b_id'], ['relationships.id'],
+                            name=op.f('fk_duplicate_candidates_relationship_b_id_relationships'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_duplicate_candidates')),
+    sa.UniqueConstraint('relationship_a_id', 'relationship_b_id',
+                        name=op.f('uq_duplicate_candidates_relationship_a_id_relationship_b_id'))
+    )
+    op.create_index('ix_duplicate_candidates_owner_id_status_score', 'duplicate_candidates',
+                    ['owner_id', 'status', 'score'])
+
+    op.create_table('event_participants',
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('relationship_id', sa.Uuid(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], name=op.f('fk_event_participants_event_id_events'),
+                            ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['relationship_id'], ['relationships.id'],
+                            name=op.f('fk_event_participants_relationship_id_relationships'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('event_id', 'relationship_id', name=op.f('pk_event_participants'))
+    )
+    op.create_table('follow_ups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('relationship_id', sa.Uuid(), nullable=False),
+    sa.Column('topic', sa.String(length=255), nullable=False),
+    sa.Column('due_date', UTCDateTime(), nullable=False),
+    sa.Column('status', _enum('follow_up_status'), nullable=False),
+    sa.Column('created_at', UTCDateTime(), nullable=True),
+    sa.Column('completed_at', UTCDateTime(), nullable=True),
+    _owner_id(),
+    sa.ForeignKeyConstraint(['relationship_id'], ['relationships.id'],
+                            name=op.f('fk_follow_ups_relationship_id_relationships'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_follow_ups'))
+    )
+    op.create_index('ix_follow_ups_owner_id_status_due_date', 'follow_ups', ['owner_id', 'status', 'due_date'])
+
+    op.create_table('interaction_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('relationship_id', sa.Uuid(), nullable=False),
+    sa.Column('date', UTCDateTime(), nullable=True),
+    sa.Column('title', sa.String(length=255), server_default='Untitled Interaction', nullable=False),
+    sa.Column('details', sa.Text(), nullable=True),
+    sa.Column('platform', sa.String(length=50), nullable=True),
+    sa.Column('type', _enum('interaction_type'), nullable=False),
+    _owner_id(),
+    sa.ForeignKeyConstraint(['relationship_id'], ['relationships.id'],
+                            name=op.f('fk_interaction_history_relationship_id_relationships'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_interaction_history'))
+    )
+    op.create_index('ix_interaction_history_owner_id_date', 'interaction_history', ['owner_id', 'date'])
+    op.create_index('ix_interaction_history_relationship_id_date', 'interaction_history', ['relationship_id', 'date'])
+
+    op.create_table('relationship_connection_types',
+    sa.Column('relationship_id', sa.Uuid(), nullable=False),
+    sa.Column('connection_type_id', sa.Integer(), nullable=False),
+    sa.Column('is_primary', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['connection_type_id'], ['connection_types.id'],
+                            name=op.f('fk_relationship_connection_types_connection_type_id_connection_types')),
+    sa.ForeignKeyConstraint(['relationship_id'], ['relationships.id'],
+                            name=op.f('fk_relationship_connection_types_relationship_id_relationships'),
+                            ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('relationship_id', 'connection_type_id', name=op.f('pk_relationship_connection_types'))
+    )
+    op.create_table('relationship_health',
+    sa.Column('relationship_id', sa.Uuid(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('urgency', sa.Float(), nullable=False),
+    sa.Column('days_since_contact', sa.Float(), nullable=True),
+    sa.Column('computed_at', UTCDateTime(), nullable=False),
+    _owner_id(),
+    sa.ForeignKeyConstraint(['relationship_id'], ['relationships.id'],
+                            name=op.f('fk_relationship_health_relationship_id_relationships'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('relationship_id', name=op.f('pk_relationship_health'))
+    )
+    op.create_index('ix_relationship_health_owner_id_urgency', 'relationship_health', ['owner_id', 'urgency'])
+
+    op.create_table('relationship_tags',
+    sa.Column('relationship_id', sa.Uuid(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('is_primary', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['relationship_id'], ['relationships.id'],
+                            name=op.f('fk_relationship_tags_relationship_id_relationships'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], name=op.f('fk_relationship_tags_tag_id_tags')),
+    sa.PrimaryKeyConstraint('relationship_id', 'tag_id', name=op.f('pk_relationship_tags'))
+    )
+    op.create_table('social_media',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('relationship_id', sa.Uuid(), nullable=False),
+    sa.Column('platform_id', sa.Integer(), nullable=False),
+    sa.Column('handle', sa.String(length=100), nullable=True),
+    sa.Column('profile_link', sa.String(length=255), nullable=True),
+    sa.Column('is_primary', sa.Boolean(), nullable=True),
+    sa.Column('created_at', UTCDateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['platform_id'], ['platforms.id'], name=op.f('fk_social_media_platform_id_platforms')),
+    sa.ForeignKeyConstraint(['relationship_id'], ['relationships.id'],
+                            name=op.f('fk_social_media_relationship_id_relationships'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_social_media'))
+    )
+    op.create_table('search_documents',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('interaction_id', sa.Integer(), nullable=True),
+    sa.Column('event_id', sa.Integer(), nullable=True),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    _owner_id(),
+    sa.CheckConstraint('(interaction_id IS NULL) <> (event_id IS NULL)', name=op.f('ck_search_documents_one_source')),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], name=op.f('fk_search_documents_event_id_events'),
+                            ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['interaction_id'], ['interaction_history.id'],
+                            name=op.f('fk_search_documents_interaction_id_interaction_history'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_search_documents')),
+    sa.UniqueConstraint('event_id', name=op.f('uq_search_documents_event_id')),
+    sa.UniqueConstraint('interaction_id', name=op.f('uq_search_documents_interaction_id'))
+    )
+    for statement in POSTGRES_SEARCH_DDL if dialect == 'postgresql' else SQLITE_SEARCH_DDL:
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS search_documents_fts')
+    for table in ('search_documents', 'social_media', 'relationship_tags', 'relationship_health',
+                  'relationship_connection_types', 'interaction_history', 'follow_ups', 'event_participants',
+                  'duplicate_candidates', 'tags', 'relationships', 'platforms', 'interaction_rollups', 'events',
+                  'data_versions', 'connection_types', 'change_log', 'users'):
+        op.drop_table(table)
+    if op.get_bind().dialect.name == 'postgresql':
+        for name in ENUMS:
+            postgresql.ENUM(name=name).drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,41 @@
+"""relationship edits
+
+Adds relationship_edits, the user's edits of a contact shown on the
+relationship timeline (see flask_app/timeline.py). Edits made before it
+existed aren't recorded anywhere reliable, so it starts empty.
+
+Revision ID: 6b8d3e5f2c19
+Revises: 3f6a1c2e9b47
+Create Date: 2026-10-19 08:12:44.207315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from flask_app.models.models import UTCDateTime
+
+
+# revision identifiers, used by Alembic.
+revision = '6b8d3e5f2c19'
+down_revision = '3f6a1c2e9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('relationship_edits',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('relationship_id', sa.Uuid(), nullable=False),
+    sa.Column('edited_at', UTCDateTime(), nullable=False),
+    sa.Column('fields', sa.String(length=255), nullable=False),
+    sa.ForeignKeyConstraint(['relationship_id'], ['relationships.id'],
+                            name=op.f('fk_relationship_edits_relationship_id_relationships'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_relationship_edits'))
+    )
+    op.create_index('ix_relationship_edits_relationship_id_edited_at', 'relationship_edits',
+                    ['relationship_id', 'edited_at'])
+
+
+def downgrade():
+    op.drop_index('ix_relationship_edits_relationship_id_edited_at', table_name='relationship_edits')
+    op.drop_table('relationship_edits')
@@ -0,0 +1,58 @@
+"""sqlite interaction ids never reused
+
+SQLite hands out max(id) + 1 for a new row, so an interaction added after the
+newest ones are archived would get the id of an archived interaction, and
+restoring it would fail. interaction_history is rebuilt with AUTOINCREMENT
+there, its sequence starting after the highest archived id. Postgres already
+uses a sequence, so nothing changes on it.
+
+Revision ID: 9c2e7d4b1a05
+Revises: d8d289fefd28
+Create Date: 2026-10-18 09:40:12.448310
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+from flask_app.archive import unpack
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2e7d4b1a05'
+down_revision = 'd8d289fefd28'
+branch_labels = None
+depends_on = None
+
+
+def _rebuild(autoincrement):
+    # As in d8d289fefd28: with foreign keys enforced, dropping the old table would cascade to search_documents.
+    op.execute('PRAGMA foreign_keys=OFF')
+    with op.batch_alter_table('interaction_history', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+    op.execute('PRAGMA foreign_keys=ON')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    _rebuild(True)
+    if context.is_offline_mode():
+        return
+    archived = max((item.id for relationship_id, payload in bind.execute(sa.text(
+        "SELECT relationship_id, payload FROM interaction_archive"
+    )) for item in unpack(relationship_id, payload)), default=0)
+    # The rebuild's copy already started the sequence at the highest live id.
+    op.execute(sa.text(
+        "UPDATE sqlite_sequence SET seq = max(seq, :archived) WHERE name = 'interaction_history'"
+    ).bindparams(archived=archived))
+    op.execute(sa.text(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'interaction_history', :archived "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'interaction_history')"
+    ).bindparams(archived=archived))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        _rebuild(False)
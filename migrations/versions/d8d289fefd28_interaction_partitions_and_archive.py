@@ -0,0 +1,109 @@
+"""interaction history partitions and archive
+
+Adds interaction_archive and makes interaction_history.date NOT NULL (undated
+rows get the migration time). On Postgres, interaction_history is converted to
+monthly range partitions by flask_app.archive.partition_interaction_history();
+with --sql only the default partition is created, and
+`flask maintain-interaction-partitions` splits it into months afterwards.
+
+Revision ID: d8d289fefd28
+Revises: 45b41e567c42
+Create Date: 2026-10-18 09:12:40.513274
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+from flask_app.archive import PARTITION_DDL, partition_interaction_history
+from flask_app.models.models import UTCDateTime
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8d289fefd28'
+down_revision = '45b41e567c42'
+branch_labels = None
+depends_on = None
+
+UNPARTITION_DDL = [
+    "DROP TRIGGER IF EXISTS interaction_history_search_document ON interaction_history",
+    "DROP FUNCTION IF EXISTS interaction_history_delete_search_document()",
+    "ALTER TABLE interaction_history RENAME TO interaction_history_partitioned",
+    "ALTER TABLE interaction_history_partitioned DISABLE ROW LEVEL SECURITY",
+    """CREATE TABLE interaction_history (LIKE interaction_history_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)""",
+    "INSERT INTO interaction_history SELECT * FROM interaction_history_partitioned",
+    """DO $$ BEGIN
+        EXECUTE 'ALTER SEQUENCE ' || pg_get_serial_sequence('interaction_history_partitioned', 'id') || ' OWNED BY interaction_history.id';
+    END $$""",
+    "DROP TABLE interaction_history_partitioned",
+    "ALTER TABLE interaction_history ADD CONSTRAINT pk_interaction_history PRIMARY KEY (id)",
+    "CREATE INDEX ix_interaction_history_relationship_id_date ON interaction_history (relationship_id, date)",
+    "CREATE INDEX ix_interaction_history_owner_id_date ON interaction_history (owner_id, date)",
+    """ALTER TABLE interaction_history ADD CONSTRAINT fk_interaction_history_relationship_id_relationships
+        FOREIGN KEY (relationship_id) REFERENCES relationships (id) ON DELETE CASCADE""",
+    """ALTER TABLE interaction_history ADD CONSTRAINT fk_interaction_history_owner_id_users
+        FOREIGN KEY (owner_id) REFERENCES users (id) ON DELETE CASCADE""",
+    """ALTER TABLE search_documents ADD CONSTRAINT fk_search_documents_interaction_id_interaction_history
+        FOREIGN KEY (interaction_id) REFERENCES interaction_history (id) ON DELETE CASCADE""",
+]
+
+
+def _alter_date_nullable(nullable):
+    # SQLite rebuilds the table; with foreign keys enforced, dropping the old one would cascade to search_documents.
+    # The pragma only takes effect outside a transaction, so this runs before any other statement.
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        op.execute('PRAGMA foreign_keys=OFF')
+    if not nullable:
+        op.execute(sa.text("UPDATE interaction_history SET date = CURRENT_TIMESTAMP WHERE date IS NULL"))
+    with op.batch_alter_table('interaction_history', schema=None) as batch_op:
+        batch_op.alter_column('date', existing_type=UTCDateTime(), nullable=nullable)
+    if sqlite:
+        op.execute('PRAGMA foreign_keys=ON')
+
+
+def upgrade():
+    _alter_date_nullable(False)
+
+    op.create_table('interaction_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('relationship_id', sa.Uuid(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('first_date', UTCDateTime(), nullable=False),
+    sa.Column('last_date', UTCDateTime(), nullable=False),
+    sa.Column('interaction_count', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('archived_at', UTCDateTime(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], name=op.f('fk_interaction_archive_owner_id_users'),
+                            ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['relationship_id'], ['relationships.id'],
+                            name=op.f('fk_interaction_archive_relationship_id_relationships'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_interaction_archive'))
+    )
+    op.create_index('ix_interaction_archive_owner_id_period_start', 'interaction_archive', ['owner_id', 'period_start'])
+    op.create_index('ix_interaction_archive_relationship_id_period_start', 'interaction_archive',
+                    ['relationship_id', 'period_start'])
+
+    if op.get_bind().dialect.name == 'postgresql':
+        if context.is_offline_mode():
+            for statement in PARTITION_DDL:
+                op.execute(statement)
+        else:
+            partition_interaction_history(op.get_bind())
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # Owner policies would hide the other users' archived rows from the check below.
+        op.execute("ALTER TABLE interaction_archive DISABLE ROW LEVEL SECURITY")
+    if not context.is_offline_mode() and bind.scalar(sa.text("SELECT count(*) FROM interaction_archive")):
+        raise RuntimeError("interaction_archive holds archived interactions; "
+                           "run `flask restore-archived-interactions` before downgrading.")
+    if bind.dialect.name == 'postgresql':
+        for statement in UNPARTITION_DDL:
+            op.execute(statement)
+    op.drop_index('ix_interaction_archive_relationship_id_period_start', table_name='interaction_archive')
+    op.drop_index('ix_interaction_archive_owner_id_period_start', table_name='interaction_archive')
+    op.drop_table('interaction_archive')
+    _alter_date_nullable(True)